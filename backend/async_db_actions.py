@@ -0,0 +1,202 @@
+import uuid
+import psycopg
+from psycopg.rows import dict_row
+from database import get_async_connection, pin_to_primary, DB_PREPARE_WRITES
+from cache import invalidate_principal
+from typing import Dict, Any
+import queries as q
+
+# Async mirror of db_actions on psycopg 3. Every function here has the same name,
+# arguments and return shape as its db_actions counterpart, so routes can await
+# either implementation (see data_access.py). Writes run in autocommit with
+# prepare=DB_PREPARE_WRITES, psycopg 3's own per-connection prepared statements.
+
+# --- AUTH FUNCTIONS ---
+async def get_user_by_email(email: str):
+    """Fetches a single user by their email address."""
+    async with get_async_connection() as conn, conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(q.GET_USER_BY_EMAIL, (email,))
+        return await cur.fetchone()
+
+async def get_user_by_id(user_id: uuid.UUID):
+    """Fetches a user's profile by id, without the password hash."""
+    async with get_async_connection() as conn, conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(q.GET_USER_BY_ID, (str(user_id),))
+        return await cur.fetchone()
+
+async def create_new_user(full_name: str, email: str, hashed_password: str, role: str = 'patient'):
+    """Creates a new user in the database with a *pre-hashed* password."""
+    async with get_async_connection(autocommit=True) as conn:
+        try:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(q.CREATE_NEW_USER, (full_name, email, role, hashed_password), prepare=DB_PREPARE_WRITES)
+                new_user = await cur.fetchone()
+                invalidate_principal(new_user)
+                return new_user
+        except psycopg.errors.UniqueViolation:
+            return None
+
+# --- PATIENT-SPECIFIC (PROTECTED) FUNCTIONS ---
+
+async def get_patient_profile(user_id: uuid.UUID):
+    """Fetches the profile details for a patient from the users table."""
+    async with get_async_connection() as conn, conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(q.GET_PATIENT_PROFILE, (str(user_id),))
+        return await cur.fetchone()
+
+async def update_patient_profile(user_id: uuid.UUID, profile_data: Dict[str, Any]):
+    """Updates a patient's profile details in the users table."""
+    async with get_async_connection(autocommit=True) as conn, conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(q.UPDATE_PATIENT_PROFILE, q.profile_update_params(user_id, profile_data), prepare=DB_PREPARE_WRITES)
+        updated_profile = await cur.fetchone()
+        invalidate_principal(updated_profile)
+        pin_to_primary(user_id)
+        return updated_profile
+
+async def book_new_appointment(patient: Dict[str, Any], doctor_id: uuid.UUID, slot):
+    """
+    Claims one of the doctor's open slots and creates a 'scheduled' appointment in it.
+    Returns None if the doctor has no such open slot (unknown, past or already taken).
+    """
+    async with get_async_connection(autocommit=True) as conn, conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(q.BOOK_APPOINTMENT, q.booking_params(patient, doctor_id, slot), prepare=DB_PREPARE_WRITES)
+        new_appt = await cur.fetchone()
+        if new_appt:
+            pin_to_primary(patient['id'])
+        return new_appt
+
+async def get_patient_appointments(user_id: uuid.UUID, limit: int = 50, after=None, when=None, start=None, end=None):
+    """Gets a page of the logged-in patient's appointments (see queries.patient_appointments)."""
+    async with get_async_connection(read_only=True, user_id=user_id) as conn, conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(*q.patient_appointments(user_id, limit, after, when, start, end))
+        return await cur.fetchall()
+
+async def cancel_appointment(appointment_id: uuid.UUID, user_id: uuid.UUID):
+    """Cancels one of the patient's own appointments and frees its slot."""
+    async with get_async_connection(autocommit=True) as conn, conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(q.CANCEL_APPOINTMENT, (str(appointment_id), str(user_id)), prepare=DB_PREPARE_WRITES)
+        result = await cur.fetchone()
+        if result:
+            pin_to_primary(user_id)
+        return result
+
+async def get_patient_medical_records(user_id: uuid.UUID, limit: int = 20, after=None, start=None, end=None):
+    """Gets a page of the logged-in patient's past prescriptions, newest first."""
+    async with get_async_connection(read_only=True, user_id=user_id) as conn, conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(*q.patient_medical_records(user_id, limit, after, start, end))
+        return await cur.fetchall()
+
+async def iter_patient_medical_records(user_id: uuid.UUID, batch_size: int = 500):
+    """
+    Yields every one of the patient's prescriptions, newest first, in lists of up
+    to `batch_size`. Rows are read through a server-side cursor, so only one batch
+    is ever in memory; the connection is held until the generator is exhausted or closed.
+    """
+    async with get_async_connection(read_only=True, user_id=user_id) as conn:
+        async with conn.cursor(name="export_medical_records", row_factory=dict_row) as cur:
+            await cur.execute(q.EXPORT_PATIENT_MEDICAL_RECORDS, (str(user_id),))
+            while True:
+                rows = await cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+async def get_pending_reviews(user_id: uuid.UUID, limit: int = 5):
+    """Gets the patient's latest completed appointments that have no review yet."""
+    async with get_async_connection(read_only=True, user_id=user_id) as conn, conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(q.GET_PENDING_REVIEWS, (str(user_id), limit))
+        return await cur.fetchall()
+
+async def add_doctor_review(user_id: uuid.UUID, review_data: Dict[str, Any]):
+    """
+    Submits (or updates) the patient's review of one of their completed appointments.
+    Returns None if the appointment isn't theirs, isn't with that doctor or isn't completed.
+    """
+    async with get_async_connection(autocommit=True) as conn, conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(q.UPSERT_DOCTOR_REVIEW, q.review_params(user_id, review_data), prepare=DB_PREPARE_WRITES)
+        new_review = await cur.fetchone()
+        if new_review:
+            pin_to_primary(user_id)
+        return new_review
+
+# --- IDEMPOTENCY KEYS ---
+
+async def store_idempotent_response(user_id: uuid.UUID, key: str, route: str, request_hash: str,
+                                    status_code: int, response: str):
+    """
+    Records a keyed write's response in its write_transaction, whose commit
+    raises UniqueViolation if the key is already taken.
+    """
+    async with get_async_connection(autocommit=True) as conn, conn.cursor() as cur:
+        await cur.execute(q.STORE_IDEMPOTENT_RESPONSE, {
+            "user_id": str(user_id), "key": key, "route": route, "request_hash": request_hash,
+            "status_code": status_code, "response": response,
+        }, prepare=DB_PREPARE_WRITES)
+
+async def get_idempotent_response(user_id: uuid.UUID, key: str, expire_after: float):
+    """The key's stored response, or None if it has none (see queries.GET_IDEMPOTENT_RESPONSE)."""
+    async with get_async_connection(autocommit=True) as conn, conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(q.GET_IDEMPOTENT_RESPONSE, {"user_id": str(user_id), "key": key, "expire_after": expire_after},
+                          prepare=DB_PREPARE_WRITES)
+        return await cur.fetchone()
+
+async def purge_idempotency_keys(older_than: float):
+    """Deletes keys stored more than `older_than` seconds ago. Returns how many."""
+    async with get_async_connection(autocommit=True) as conn, conn.cursor() as cur:
+        await cur.execute(q.PURGE_IDEMPOTENCY_KEYS, (older_than,))
+        return cur.rowcount
+
+# --- PUBLIC FUNCTIONS ---
+
+async def search_doctors(query: str, limit: int = 20, offset: int = 0, after=None):
+    """
+    Searches for doctors by name or specialty, best matches first, and includes average rating.
+    Page with `offset`, or with `after` = (rank, id) of the last row already returned.
+    """
+    async with get_async_connection(read_only=True) as conn, conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(*q.search_doctors(query, limit, offset, after))
+        results = await cur.fetchall()
+        return [
+            {**row, "average_rating": float(row["average_rating"])}
+            for row in results
+        ]
+
+async def get_doctor(doctor_id: uuid.UUID):
+    """Fetches one doctor's public profile with precomputed rating stats."""
+    async with get_async_connection(read_only=True) as conn, conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(q.GET_DOCTOR, (str(doctor_id),))
+        row = await cur.fetchone()
+        return {**row, "average_rating": float(row["average_rating"])} if row else None
+
+async def get_doctor_index_rows(since=None):
+    """Fetches doctor names for the typeahead index, optionally only those changed after `since`."""
+    async with get_async_connection(read_only=True) as conn, conn.cursor(row_factory=dict_row) as cur:
+        if since is None:
+            await cur.execute(q.GET_DOCTOR_INDEX_ROWS)
+        else:
+            await cur.execute(q.GET_DOCTOR_INDEX_ROWS_SINCE, (since,))
+        return await cur.fetchall()
+
+async def get_article_summaries(limit: int = 20, after=None):
+    """Gets a page of published article summaries, newest first."""
+    async with get_async_connection(read_only=True) as conn, conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(*q.article_summaries(limit, after))
+        return await cur.fetchall()
+
+async def get_article(article_id: uuid.UUID):
+    """Gets one published article with its full content."""
+    async with get_async_connection(read_only=True) as conn, conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(q.GET_ARTICLE, (str(article_id),))
+        return await cur.fetchone()
+
+async def search_pharmacies(query: str, limit: int = 10):
+    """Active pharmacies whose name contains the query, best matches first, with their `rank`."""
+    async with get_async_connection(read_only=True) as conn, conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(q.SEARCH_PHARMACIES, q.name_search_params(query, limit))
+        return await cur.fetchall()
+
+async def search_labs(query: str, limit: int = 10):
+    """Active labs whose name contains the query, best matches first, with their `rank`."""
+    async with get_async_connection(read_only=True) as conn, conn.cursor(row_factory=dict_row) as cur:
+        await cur.execute(q.SEARCH_LABS, q.name_search_params(query, limit))
+        return await cur.fetchall()
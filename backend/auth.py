@@ -3,11 +3,12 @@ from datetime import datetime, timedelta, timezone
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from jose import JWTError
 from dotenv import load_dotenv
-import db_actions as db 
-from models import User 
+from data_access import db
+from models import User
+import cache
+import hashing
 
 load_dotenv()
 
@@ -15,53 +16,98 @@ load_dotenv()
 SECRET_KEY = os.environ.get("SECRET_KEY", "a-very-secret-key-for-opd-nexus-patient-jwt")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+# When true, protected routes build the User from the signed token claims instead of
+# looking it up. Role or name changes then only show up once the user logs in again.
+AUTH_TRUST_TOKEN_CLAIMS = os.environ.get("AUTH_TRUST_TOKEN_CLAIMS", "false").lower() == "true"
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
 # --- Core Authentication Functions ---
 
 def verify_password(plain_password, hashed_password):
     """Checks if a plain password matches a hashed one."""
-    return pwd_context.verify(plain_password, hashed_password)
+    return hashing.verify_password(plain_password, hashed_password)
 
 def get_password_hash(password):
     """Generates a secure hash from a plain password."""
-    return pwd_context.hash(password)
+    return hashing.hash_password(password)
 
 def create_access_token(data: dict):
     """Creates a new internal JWT access token for our application."""
+    from jose import jwt  # loads its crypto backends; deferred to keep startup fast
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def token_claims_for(user: dict) -> dict:
+    """The claims we sign into every access token for a user row."""
+    return {
+        "sub": user['email'],
+        "user_id": str(user['id']),
+        "full_name": user['full_name'],
+        "role": user['role'],
+        "created_at": user['created_at'].isoformat(),
+    }
+
 # --- Security Dependencies ---
 
-async def get_current_user_email(token: str = Depends(oauth2_scheme)) -> str:
-    """Dependency 1: Validates token and returns the email (sub)."""
+async def get_current_token_claims(token: str = Depends(oauth2_scheme)) -> dict:
+    """Validates the token and returns its claims."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    from jose import jwt
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+        if payload.get("sub") is None:
             raise credentials_exception
-        return email
+        return payload
     except JWTError:
         raise credentials_exception
 
-async def get_current_user_from_db(current_user_email: str = Depends(get_current_user_email)) -> User:
+async def get_current_user_email(claims: dict = Depends(get_current_token_claims)) -> str:
+    """Dependency 1: Validates token and returns the email (sub)."""
+    return claims["sub"]
+
+async def get_current_principal(claims: dict = Depends(get_current_token_claims)) -> dict:
+    """
+    Returns the logged-in user's row (without hashed_password), served from the
+    in-process principal cache when possible and from the database otherwise.
+    """
+    key = claims.get("user_id") or claims["sub"]
+    principal = cache.principals.get(key)
+    if principal is None:
+        if claims.get("user_id"):
+            principal = await db.get_user_by_id(claims["user_id"])
+        else:
+            # Tokens issued before user_id was added to the claims.
+            principal = await db.get_user_by_email(claims["sub"])
+            if principal:
+                principal = {k: v for k, v in principal.items() if k != 'hashed_password'}
+        if not principal:
+            raise HTTPException(status_code=404, detail="User not found")
+        cache.principals.set(key, principal)
+    return principal
+
+def _user_from_claims(claims: dict) -> Optional[User]:
+    if not all(claims.get(k) for k in ("user_id", "full_name", "role", "created_at")):
+        return None
+    return User(id=claims["user_id"], full_name=claims["full_name"], email=claims["sub"],
+                role=claims["role"], created_at=claims["created_at"])
+
+async def get_current_user_from_db(claims: dict = Depends(get_current_token_claims)) -> User:
     """
-    Dependency 2: Depends on the first one, takes the email,
-    fetches the full user object from the database, and returns it.
+    Dependency 2: Depends on the token claims and returns the full user object,
+    built from the claims when AUTH_TRUST_TOKEN_CLAIMS is on and otherwise
+    from the cached or freshly fetched principal.
     """
-    user = db.get_user_by_email(current_user_email)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    return User.model_validate(user)
+    if AUTH_TRUST_TOKEN_CLAIMS:
+        user = _user_from_claims(claims)
+        if user:
+            return user
+    return User.model_validate(await get_current_principal(claims))
 
@@ -0,0 +1,2 @@
+# Benchmarks against a real database. Run from the backend directory, e.g.
+#   python -m benchmarks.booking_race --help
@@ -0,0 +1,130 @@
+"""
+Booking race: N parallel bookers fight over one doctor's open slots.
+
+Creates a throwaway doctor with --slots future slots and one patient per booker,
+lets every booker try every slot in its own random order, then checks that each
+slot was booked exactly once and reports bookings/sec per booker count. Everything
+it creates is deleted afterwards. Needs DATABASE_URL and migrations/005 applied.
+
+    python -m benchmarks.booking_race --bookers 1,4,16,32 --slots 500
+    python -m benchmarks.booking_race --driver async
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--bookers", default="1,4,16,32", help="comma-separated numbers of concurrent bookers")
+    parser.add_argument("--slots", type=int, default=500, help="open slots per round")
+    parser.add_argument("--driver", choices=["sync", "async"], default="sync")
+    return parser.parse_args()
+
+args = parse_args()
+BOOKERS = [int(n) for n in args.bookers.split(",")]
+# Give every booker its own connection so the pool is not what we measure.
+os.environ["DB_DRIVER"] = args.driver
+os.environ.setdefault("DB_POOL_MAX_SIZE", str(max(BOOKERS)))
+
+import psycopg2
+import db_actions
+import async_db_actions
+from database import DATABASE_URL, close_pool, close_async_pool
+
+def setup(conn, bookers, slots):
+    start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    times = [(start + timedelta(minutes=15 * i)).isoformat() for i in range(slots)]
+    run = uuid.uuid4().hex[:8]
+    with conn.cursor() as cur:
+        cur.execute(
+            "INSERT INTO doctors (name, specialty, experience, available_slots) VALUES (%s, 'Benchmark', 0, %s) RETURNING id;",
+            (f"Booking Race {run}", times),
+        )
+        doctor_id = cur.fetchone()[0]
+        patients = []
+        for i in range(bookers):
+            cur.execute(
+                "INSERT INTO users (full_name, email, role, hashed_password) VALUES (%s, %s, 'patient', '!') RETURNING id, full_name;",
+                (f"Booker {i}", f"booking-race-{run}-{i}@example.invalid"),
+            )
+            patients.append(dict(zip(("id", "full_name"), cur.fetchone())))
+    conn.commit()
+    return doctor_id, patients, [datetime.fromisoformat(t) for t in times]
+
+def teardown(conn, doctor_id, patients):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM appointments WHERE doctor_id = %s;", (doctor_id,))
+        cur.execute("DELETE FROM doctors WHERE id = %s;", (doctor_id,))
+        cur.execute("DELETE FROM users WHERE id = ANY(%s::uuid[]);", ([str(p['id']) for p in patients],))
+    conn.commit()
+
+def double_bookings(conn, doctor_id):
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT count(*) FROM (
+                SELECT slot FROM appointments WHERE doctor_id = %s AND status = 'scheduled'
+                GROUP BY slot HAVING count(*) > 1
+            ) dup;
+        """, (doctor_id,))
+        return cur.fetchone()[0]
+
+def race_sync(doctor_id, patients, times):
+    def booker(patient):
+        won = 0
+        for slot in random.sample(times, len(times)):
+            if db_actions.book_new_appointment(patient, doctor_id, slot):
+                won += 1
+        return won
+    with ThreadPoolExecutor(max_workers=len(patients)) as executor:
+        return sum(executor.map(booker, patients))
+
+async def race_async(doctor_id, patients, times):
+    async def booker(patient):
+        won = 0
+        for slot in random.sample(times, len(times)):
+            if await async_db_actions.book_new_appointment(patient, doctor_id, slot):
+                won += 1
+        return won
+    try:
+        return sum(await asyncio.gather(*(booker(p) for p in patients)))
+    finally:
+        await close_async_pool()
+
+def main():
+    conn = psycopg2.connect(DATABASE_URL)
+    print(f"driver={args.driver} slots={args.slots}")
+    print(f"{'bookers':>8} {'attempts':>9} {'booked':>7} {'doubles':>8} {'seconds':>8} {'bookings/s':>11} {'attempts/s':>11}")
+    failed = False
+    try:
+        for bookers in BOOKERS:
+            doctor_id, patients, times = setup(conn, bookers, args.slots)
+            try:
+                started = time.perf_counter()
+                if args.driver == "async":
+                    booked = asyncio.run(race_async(doctor_id, patients, times))
+                else:
+                    booked = race_sync(doctor_id, patients, times)
+                elapsed = time.perf_counter() - started
+                doubles = double_bookings(conn, doctor_id)
+            finally:
+                teardown(conn, doctor_id, patients)
+            attempts = bookers * args.slots
+            print(f"{bookers:>8} {attempts:>9} {booked:>7} {doubles:>8} {elapsed:>8.2f} "
+                  f"{booked / elapsed:>11.1f} {attempts / elapsed:>11.1f}")
+            if booked != args.slots or doubles:
+                failed = True
+    finally:
+        conn.close()
+        close_pool()
+    if failed:
+        print("FAILED: every slot must be booked exactly once.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Bulk import: COPY into staging plus set-based upserts, against row-by-row inserts.
+
+Writes --rows generated pharmacies to a temporary CSV, loads them with
+bulk.import_table (twice: the second run updates every row), then inserts the
+same rows one INSERT per row, as a hand-written loader would, and reports rows/sec
+for each. Everything it creates is deleted afterwards. Needs DATABASE_URL.
+
+    python -m benchmarks.bulk_import --rows 20000
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+import uuid
+import psycopg2
+
+from database import DATABASE_URL
+import bulk
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    args = parser.parse_args()
+
+    prefix = f"Bulk bench {uuid.uuid4().hex[:8]}"
+    rows = [(f"{prefix} {i}", f"{i} Market Road, Pune", f"+91 80000 {i:05d}") for i in range(args.rows)]
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    with os.fdopen(fd, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["name", "address", "phone_number"])
+        writer.writerows(rows)
+
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        results = []
+        for label in ("COPY + upsert (new rows)", "COPY + upsert (all updates)"):
+            result = bulk.import_table(conn, "pharmacies", path)
+            results.append((label, result["rows"], result["seconds"]))
+
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM pharmacies WHERE name LIKE %s;", (prefix + " %",))
+        conn.commit()
+        start = time.perf_counter()
+        with conn.cursor() as cur:
+            for row in rows:
+                cur.execute("INSERT INTO pharmacies (name, address, phone_number) VALUES (%s, %s, %s);", row)
+        conn.commit()
+        results.append(("INSERT per row", len(rows), time.perf_counter() - start))
+
+        print(f"{'method':<30} {'rows':>8} {'seconds':>8} {'rows/s':>10}")
+        for label, count, seconds in results:
+            print(f"{label:<30} {count:>8} {seconds:>8.2f} {count / seconds:>10,.0f}")
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM pharmacies WHERE name LIKE %s;", (prefix + " %",))
+        conn.commit()
+        conn.close()
+        os.remove(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Google ID-token verification against a local stand-in key server, fully offline.
+
+Starts an HTTP server on localhost that serves signing certs the way Google does
+({kid: PEM} with a Cache-Control max-age), mints ID tokens signed with its keys,
+and checks google_tokens.GoogleCertCache: one fetch for many verifications, one
+refetch when the signing key rotates, none for made-up key ids. Then compares
+per-token latency with google-auth's verify_token, which fetches the certs on
+every call.
+
+    python -m benchmarks.google_tokens --tokens 500
+"""
+import argparse
+import datetime
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+from google.auth import crypt, jwt
+
+import google_tokens
+
+AUDIENCE = "bench-client.apps.googleusercontent.com"
+
+def make_key(kid):
+    """A signer and its self-signed certificate PEM, like one entry of Google's certs."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "bench.invalid")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now - datetime.timedelta(days=1)).not_valid_after(now + datetime.timedelta(days=1))
+            .sign(key, hashes.SHA256()))
+    private_pem = key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption())
+    signer = crypt.RSASigner.from_string(private_pem, key_id=kid)
+    return signer, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+def mint(signer, email="patient@bench.invalid", audience=AUDIENCE):
+    now = int(time.time())
+    return jwt.encode(signer, {
+        "iss": "https://accounts.google.com", "aud": audience, "sub": "1234567890",
+        "email": email, "name": "Bench Patient", "iat": now, "exp": now + 3600,
+    }).decode()
+
+class KeyServer:
+    """Serves `certs` on http://127.0.0.1:<port>/certs and counts the requests."""
+
+    def __init__(self, max_age):
+        self.certs = {}
+        self.max_age = max_age
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                body = json.dumps(server.certs).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Cache-Control", f"public, max-age={server.max_age}, must-revalidate, no-transform")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/certs"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+
+def check(label, ok):
+    print(f"  {'ok  ' if ok else 'FAIL'} {label}")
+    return ok
+
+def per_token_microseconds(verify, tokens):
+    start = time.perf_counter()
+    for token in tokens:
+        verify(token)
+    return (time.perf_counter() - start) / len(tokens) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--max-age", type=int, default=3600, help="Cache-Control max-age the key server sends")
+    args = parser.parse_args()
+
+    server = KeyServer(args.max_age)
+    old_signer, old_cert = make_key("key-1")
+    new_signer, new_cert = make_key("key-2")
+    server.certs = {"key-1": old_cert}
+    cache = google_tokens.GoogleCertCache(url=server.url)
+    verify = lambda token: google_tokens.verify_id_token(token, audience=AUDIENCE, cert_cache=cache)
+    results = []
+    try:
+        print("cert cache behaviour")
+        tokens = [mint(old_signer) for _ in range(args.tokens)]
+        cached_us = per_token_microseconds(verify, tokens)
+        results.append(check(f"{args.tokens} verifications, {server.requests} cert fetch(es)", server.requests == 1))
+        results.append(check("expiry follows Cache-Control max-age",
+                             abs(cache._expires_at - cache._fetched_at - args.max_age) < 1))
+
+        server.certs = {"key-1": old_cert, "key-2": new_cert}
+        cache._fetched_at -= google_tokens.MIN_FORCED_REFRESH_INTERVAL  # as if the last fetch was a while ago
+        claims = verify(mint(new_signer))
+        results.append(check(f"rotated key accepted after one refetch ({server.requests} fetches)",
+                             claims["email"] == "patient@bench.invalid" and server.requests == 2))
+
+        stranger, _ = make_key("key-unknown")
+        try:
+            verify(mint(stranger))
+            rejected = False
+        except ValueError:
+            rejected = True
+        results.append(check(f"unknown kid rejected without another fetch ({server.requests} fetches)",
+                             rejected and server.requests == 2))
+        try:
+            verify(mint(new_signer, audience="someone-else"))
+            rejected = False
+        except ValueError:
+            rejected = True
+        results.append(check("wrong audience rejected", rejected))
+
+        print("latency per token")
+        from google.auth.transport import requests as google_requests
+        from google.oauth2 import id_token
+        fetching = lambda token: id_token.verify_token(token, google_requests.Request(), AUDIENCE, certs_url=server.url)
+        sample = tokens[:max(1, args.tokens // 10)]
+        fetching_us = per_token_microseconds(fetching, sample)
+        print(f"  cached certs        {cached_us:>9.1f} us")
+        print(f"  fetch on every call {fetching_us:>9.1f} us  (local key server; Google is a WAN round trip away)")
+    finally:
+        cache.close()
+        server.close()
+    if not all(results):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+"""
+Endpoint load test: every route in main.py under a weighted, concurrent mix.
+
+By default the app runs in-process and is driven through an ASGI client, so no
+server is needed; --url targets a running server instead (e.g. uvicorn with
+several --workers). --processes starts that many load generator processes, each
+with --concurrency workers (and, in-process, its own copy of the app, much like
+a multi-worker server). Reports throughput, p50/p95/p99 latency and, in-process,
+database statements per request for each scenario.
+
+Needs httpx and a database seeded with `python -m benchmarks.seed`.
+
+    python -m benchmarks.load --duration 30 --concurrency 16 --save before
+    python -m benchmarks.load --duration 30 --concurrency 16 --compare before
+
+/auth/google is not driven, since it needs a Google-signed token.
+"""
+import argparse
+import asyncio
+import contextvars
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import httpx
+import psycopg2
+
+from benchmarks.seed import BENCH_PASSWORD, BENCH_EMAIL_DOMAIN
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINES = os.path.join(HERE, "baselines")
+
+SEARCH_TERMS = [
+    "cardio", "cardiology", "derma", "neuro", "ortho", "pediatric", "psych", "ent", "general",
+    "mehta", "sharma", "iyer", "asha", "rohan", "priya", "kardio", "dermatolgy", "neurolgy",
+]
+PHARMACY_TERMS = ["apollo", "medplus", "wellness", "netmeds", "care", "pune", "mumbai"]
+LAB_TERMS = ["metro", "thyrocare", "lal", "srl", "suburban", "delhi"]
+
+# --- Fixtures ---
+
+def load_fixtures(dsn, patients):
+    """Ids and open slots the scenarios pick from, read straight from the seeded database."""
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM doctors ORDER BY random() LIMIT 500;")
+            doctors = [r[0] for r in cur.fetchall()]
+            cur.execute("SELECT id FROM articles WHERE published_at IS NOT NULL ORDER BY random() LIMIT 200;")
+            articles = [r[0] for r in cur.fetchall()]
+            cur.execute("""
+                SELECT doctor_id, to_char(slot AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS"Z"')
+                FROM doctor_slots WHERE appointment_id IS NULL AND slot > now() + interval '1 hour'
+                ORDER BY random() LIMIT 5000;
+            """)
+            slots = cur.fetchall()
+            cur.execute("""
+                SELECT u.email, array_agg(a.id::text || ',' || a.doctor_id::text)
+                FROM users u JOIN appointments a ON a.patient_id = u.id AND a.status = 'completed'
+                WHERE u.email LIKE %s
+                GROUP BY u.email ORDER BY random() LIMIT %s;
+            """, (f"patient-%@{BENCH_EMAIL_DOMAIN}", patients))
+            accounts = [{"email": email, "completed": [p.split(",") for p in pairs]} for email, pairs in cur.fetchall()]
+    finally:
+        conn.close()
+    if not doctors or not accounts:
+        raise SystemExit("No benchmark data found; run `python -m benchmarks.seed` first.")
+    return {"doctors": doctors, "articles": articles, "slots": slots, "accounts": accounts}
+
+# --- Scenarios ---
+# Each scenario takes (client, session) and returns a response. `session` is the
+# worker's logged-in patient plus whatever it has booked so far.
+
+async def root(client, s):
+    return await client.get("/")
+
+async def search_doctors(client, s):
+    return await client.get("/doctors/search", params={"q": random.choice(SEARCH_TERMS)})
+
+async def suggest_doctors(client, s):
+    return await client.get("/doctors/suggest", params={"q": random.choice(SEARCH_TERMS)[:3]})
+
+async def get_doctor(client, s):
+    return await client.get(f"/doctors/{random.choice(s['fixtures']['doctors'])}")
+
+async def articles_feed(client, s):
+    return await client.get("/articles")
+
+async def get_article(client, s):
+    return await client.get(f"/articles/{random.choice(s['fixtures']['articles'])}")
+
+async def search_pharmacies(client, s):
+    return await client.get("/pharmacies/search", params={"q": random.choice(PHARMACY_TERMS)})
+
+async def search_labs(client, s):
+    return await client.get("/labs/search", params={"q": random.choice(LAB_TERMS)})
+
+async def unified_search(client, s):
+    terms = random.choice((SEARCH_TERMS, PHARMACY_TERMS, LAB_TERMS))
+    return await client.get("/search", params={"q": random.choice(terms)})
+
+async def register(client, s):
+    email = f"load-{uuid.uuid4().hex}@{BENCH_EMAIL_DOMAIN}"
+    return await client.post("/auth/register", json={"fullName": "Load Test", "email": email, "password": BENCH_PASSWORD})
+
+async def login(client, s):
+    return await client.post("/auth/login", json={"email": s["email"], "password": BENCH_PASSWORD})
+
+async def get_profile(client, s):
+    return await client.get("/patient/profile", headers=s["headers"])
+
+async def update_profile(client, s):
+    return await client.put("/patient/profile", headers=s["headers"],
+                            json={"full_name": s["full_name"], "phone_number": "+91 90000 00000", "sex": "F"})
+
+async def my_appointments(client, s):
+    return await client.get("/patient/my-appointments", headers=s["headers"])
+
+async def my_records(client, s):
+    return await client.get("/patient/my-records", headers=s["headers"])
+
+async def dashboard(client, s):
+    return await client.get("/patient/dashboard", headers=s["headers"])
+
+async def book_appointment(client, s):
+    slots = s["fixtures"]["slots"]
+    doctor_id, slot = slots.pop() if slots else (random.choice(s["fixtures"]["doctors"]), "2000-01-01T00:00:00Z")
+    response = await client.post("/patient/book-appointment", headers=s["headers"], json={"doctor_id": doctor_id, "slot": slot})
+    if response.status_code == 200:
+        s["booked"].append((response.json()["id"], doctor_id, slot))
+    return response
+
+async def cancel_appointment(client, s):
+    if not s["booked"]:
+        return await book_appointment(client, s)
+    appointment_id, doctor_id, slot = s["booked"].pop()
+    response = await client.put(f"/patient/appointments/{appointment_id}/cancel", headers=s["headers"])
+    if response.status_code == 200:
+        s["fixtures"]["slots"].insert(0, (doctor_id, slot))
+    return response
+
+async def post_review(client, s):
+    appointment_id, doctor_id = random.choice(s["completed"])
+    return await client.post("/patient/reviews", headers=s["headers"], json={
+        "doctor_id": doctor_id, "appointment_id": appointment_id, "rating": random.randint(1, 5), "comment": "Load test",
+    })
+
+# name -> (scenario, weight, acceptable status codes). 409 is a lost booking race, not an error.
+SCENARIOS = {
+    "root": (root, 1, {200}),
+    "search_doctors": (search_doctors, 25, {200}),
+    "suggest_doctors": (suggest_doctors, 10, {200}),
+    "get_doctor": (get_doctor, 10, {200}),
+    "articles_feed": (articles_feed, 8, {200}),
+    "get_article": (get_article, 5, {200}),
+    "search_pharmacies": (search_pharmacies, 5, {200}),
+    "search_labs": (search_labs, 5, {200}),
+    "unified_search": (unified_search, 10, {200}),
+    "register": (register, 1, {200}),
+    "login": (login, 1, {200}),
+    "get_profile": (get_profile, 8, {200}),
+    "update_profile": (update_profile, 2, {200}),
+    "my_appointments": (my_appointments, 8, {200}),
+    "my_records": (my_records, 6, {200}),
+    "dashboard": (dashboard, 6, {200}),
+    "book_appointment": (book_appointment, 3, {200, 409}),
+    "cancel_appointment": (cancel_appointment, 2, {200, 409}),
+    "post_review": (post_review, 2, {201}),
+}
+
+# --- Query counting (in-process only) ---
+
+_statements = contextvars.ContextVar("bench_statements", default=None)
+
+def _count_statement(query, params, seconds, rowcount):
+    box = _statements.get()
+    if box is not None:
+        box[0] += 1
+
+# --- Load generator ---
+
+async def _log_in(client, account, fixtures):
+    response = await client.post("/auth/login", json={"email": account["email"], "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    profile = (await client.get("/patient/profile", headers=headers)).json()
+    return {"email": account["email"], "full_name": profile["full_name"], "headers": headers,
+            "completed": account["completed"], "booked": [], "fixtures": fixtures}
+
+async def _worker(client, session, names, weights, deadline, record_after, samples):
+    while time.monotonic() < deadline:
+        name = random.choices(names, weights)[0]
+        box = [0]
+        token = _statements.set(box)
+        start = time.perf_counter()
+        try:
+            response = await SCENARIOS[name][0](client, session)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 0
+        finally:
+            _statements.reset(token)
+        elapsed = time.perf_counter() - start
+        if time.monotonic() >= record_after:
+            samples.append((name, elapsed, status, box[0]))
+
+async def _run(config, fixtures):
+    names = [n for n in config["scenarios"]]
+    weights = [SCENARIOS[n][1] for n in names]
+    if config["url"]:
+        client = httpx.AsyncClient(base_url=config["url"], timeout=30)
+        lifespan = None
+    else:
+        # Every session comes from the one in-process client address.
+        os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+        import main
+        import database
+        database.statement_observers.append(_count_statement)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench", timeout=30)
+        lifespan = main.app.router.lifespan_context(main.app)
+    samples = []
+    async with client:
+        if lifespan:
+            await lifespan.__aenter__()
+        try:
+            accounts = fixtures["accounts"]
+            sessions = [await _log_in(client, accounts[i % len(accounts)], fixtures) for i in range(config["concurrency"])]
+            record_after = time.monotonic() + config["warmup"]
+            deadline = record_after + config["duration"]
+            await asyncio.gather(*(
+                _worker(client, session, names, weights, deadline, record_after, samples) for session in sessions
+            ))
+        finally:
+            if lifespan:
+                await lifespan.__aexit__(None, None, None)
+    return samples
+
+def _process(config, fixtures, index):
+    random.seed(config["seed"] + index)
+    # Each process books from its own share of the open slots.
+    fixtures = dict(fixtures, slots=fixtures["slots"][index::config["processes"]])
+    return asyncio.run(_run(config, fixtures))
+
+# --- Reporting ---
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+def summarize(samples, duration, in_process):
+    by_name = defaultdict(list)
+    for sample in samples:
+        by_name[sample[0]].append(sample)
+    by_name["TOTAL"] = samples
+    results = {}
+    for name, rows in sorted(by_name.items(), key=lambda kv: (kv[0] == "TOTAL", kv[0])):
+        latencies = sorted(r[1] for r in rows)
+        errors = sum(1 for r in rows if r[2] not in SCENARIOS[r[0]][2])
+        results[name] = {
+            "requests": len(rows),
+            "errors": errors,
+            "rps": len(rows) / duration,
+            "p50_ms": percentile(latencies, 50) * 1000,
+            "p95_ms": percentile(latencies, 95) * 1000,
+            "p99_ms": percentile(latencies, 99) * 1000,
+            "queries_per_request": sum(r[3] for r in rows) / len(rows) if in_process and rows else None,
+        }
+    return results
+
+def print_results(results, baseline=None):
+    print(f"{'scenario':<20} {'reqs':>7} {'errs':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'q/req':>6}"
+          + ("  vs baseline (req/s, p95)" if baseline else ""))
+    for name, r in results.items():
+        queries = f"{r['queries_per_request']:.1f}" if r["queries_per_request"] is not None else "-"
+        line = (f"{name:<20} {r['requests']:>7} {r['errors']:>5} {r['rps']:>8.1f} "
+                f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {queries:>6}")
+        if baseline and name in baseline:
+            b = baseline[name]
+            line += f"  {_change(r['rps'], b['rps']):>7} {_change(r['p95_ms'], b['p95_ms']):>7}"
+        print(line)
+
+def _change(new, old):
+    return f"{(new - old) / old * 100:+.0f}%" if old else "-"
+
+def regressions(results, baseline, tolerance):
+    """Scenarios whose throughput fell or whose p95 rose by more than `tolerance`."""
+    found = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if not b or not b["rps"] or not b["p95_ms"]:
+            continue
+        if r["rps"] < b["rps"] * (1 - tolerance) or r["p95_ms"] > b["p95_ms"] * (1 + tolerance):
+            found.append(name)
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="unmeasured seconds before that")
+    parser.add_argument("--concurrency", type=int, default=8, help="workers per process, each a logged-in patient")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--url", help="target a running server instead of the in-process app")
+    parser.add_argument("--scenarios", help=f"comma-separated subset of: {', '.join(SCENARIOS)}")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", metavar="NAME", help="save the results as baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", help="compare with baselines/NAME.json; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed throughput/p95 change for --compare")
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    config = {
+        "duration": args.duration, "warmup": args.warmup, "concurrency": args.concurrency,
+        "processes": args.processes, "url": args.url, "scenarios": scenarios, "seed": args.seed,
+    }
+    from database import DATABASE_URL, DB_DRIVER
+    fixtures = load_fixtures(DATABASE_URL, args.concurrency * args.processes)
+
+    if args.processes == 1:
+        samples = _process(config, fixtures, 0)
+    else:
+        # Not multiprocessing.Pool: its daemonic workers couldn't start the app's bcrypt processes.
+        with ProcessPoolExecutor(args.processes, mp_context=multiprocessing.get_context("spawn")) as executor:
+            parts = list(executor.map(_process, [config] * args.processes, [fixtures] * args.processes, range(args.processes)))
+        samples = [s for part in parts for s in part]
+
+    results = summarize(samples, args.duration, in_process=not args.url)
+    baseline = None
+    if args.compare:
+        with open(os.path.join(BASELINES, f"{args.compare}.json")) as f:
+            baseline = json.load(f)["results"]
+    meta = {
+        "at": datetime.now(timezone.utc).isoformat(), "target": args.url or "in-process",
+        "driver": DB_DRIVER, "python": platform.python_version(), "cpus": os.cpu_count(),
+        **{k: v for k, v in config.items() if k != "seed"},
+    }
+    print(json.dumps(meta))
+    print_results(results, baseline)
+
+    if args.save:
+        os.makedirs(BASELINES, exist_ok=True)
+        path = os.path.join(BASELINES, f"{args.save}.json")
+        with open(path, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+        print(f"saved {path}")
+    if baseline:
+        worse = regressions(results, baseline, args.tolerance)
+        if worse:
+            print(f"REGRESSED beyond {args.tolerance:.0%}: {', '.join(worse)}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
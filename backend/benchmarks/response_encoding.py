@@ -0,0 +1,90 @@
+"""
+Per-row cost of encoding API responses, for every model in models.py.
+
+Compares the default path (copy the driver row into a dict, validate it against
+the response model, dump it to JSON-ready Python, then json.dumps, which is what
+FastAPI does for a response_model) with the FAST_RESPONSES path in serialization.py
+(project the row onto the model's fields, then orjson). Rows are synthesized from
+the model annotations, so no database is needed.
+
+    python -m benchmarks.response_encoding --rows 200 --repeat 50
+"""
+import argparse
+import json
+import time
+import typing
+import uuid
+from datetime import date, datetime, timezone
+from pydantic import BaseModel, TypeAdapter
+
+import models
+import serialization
+
+def sample_value(annotation, name):
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Union:
+        return sample_value(next(a for a in args if a is not type(None)), name)
+    if origin in (list, typing.List):
+        return [sample_value(args[0], name) for _ in range(3)]
+    if origin in (dict, typing.Dict):
+        return {"bp": "120/80", "pulse": 72, "temperature": 98.6}
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return sample_row(annotation)
+    if annotation is uuid.UUID:
+        return uuid.uuid4()
+    if annotation is datetime:
+        return datetime.now(timezone.utc)
+    if annotation is date:
+        return date.today()
+    if annotation is int:
+        return 42
+    if annotation is float:
+        return 4.5
+    if annotation is bool:
+        return True
+    return f"sample {name} text"
+
+def sample_row(model):
+    row = {name: sample_value(field.annotation, name) for name, field in model.model_fields.items()}
+    # Database rows usually carry a few columns the response model drops.
+    row.update(internal_note="not part of the response", updated_at=datetime.now(timezone.utc))
+    return row
+
+def default_path(adapter, rows):
+    copied = [dict(row) for row in rows]
+    return json.dumps(adapter.dump_python(adapter.validate_python(copied), mode="json")).encode()
+
+def fast_path(model, rows):
+    project = serialization.projection(model)
+    return serialization.dumps([project(row) for row in rows])
+
+def per_row_microseconds(func, rows, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(rows)
+        best = min(best, time.perf_counter() - start)
+    return best / len(rows) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=50, help="runs per model; the fastest is reported")
+    args = parser.parse_args()
+
+    model_classes = [
+        value for value in vars(models).values()
+        if isinstance(value, type) and issubclass(value, BaseModel) and value.__module__ == models.__name__
+    ]
+    print(f"rows={args.rows}, best of {args.repeat} runs, microseconds per row")
+    print(f"{'model':<22} {'default':>9} {'fast':>9} {'speedup':>8}")
+    for model in model_classes:
+        rows = [sample_row(model) for _ in range(args.rows)]
+        adapter = TypeAdapter(typing.List[model])
+        default_us = per_row_microseconds(lambda r: default_path(adapter, r), rows, args.repeat)
+        fast_us = per_row_microseconds(lambda r: fast_path(model, r), rows, args.repeat)
+        print(f"{model.__name__:<22} {default_us:>9.2f} {fast_us:>9.2f} {default_us / fast_us:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
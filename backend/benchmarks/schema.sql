@@ -0,0 +1,93 @@
+-- The base tables the API reads and writes, for creating a throwaway benchmark
+-- database from scratch. benchmarks/seed.py applies this (if the tables are
+-- missing) followed by every file in migrations/.
+
+CREATE TABLE IF NOT EXISTS users (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    full_name text NOT NULL,
+    email text UNIQUE,
+    role text NOT NULL DEFAULT 'patient',
+    hashed_password text,
+    phone_number text,
+    date_of_birth date,
+    sex text,
+    created_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS clinics (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    name text NOT NULL,
+    address text
+);
+
+CREATE TABLE IF NOT EXISTS doctors (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id uuid REFERENCES users(id),
+    clinic_id uuid REFERENCES clinics(id),
+    name text NOT NULL,
+    specialty text NOT NULL,
+    experience int NOT NULL DEFAULT 0,
+    bio text,
+    available_slots text[] DEFAULT '{}'
+);
+
+CREATE TABLE IF NOT EXISTS appointments (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    doctor_id uuid REFERENCES doctors(id),
+    patient_id uuid REFERENCES users(id),
+    patient_name text,
+    slot timestamptz NOT NULL,
+    status text NOT NULL DEFAULT 'scheduled',
+    doctor_user_id uuid,
+    created_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE TABLE IF NOT EXISTS prescriptions (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    appointment_id uuid REFERENCES appointments(id),
+    patient_id uuid REFERENCES users(id),
+    doctor_id uuid REFERENCES doctors(id),
+    created_at timestamptz NOT NULL DEFAULT now(),
+    complaint text,
+    diagnosis text,
+    medicines jsonb DEFAULT '[]',
+    tests jsonb DEFAULT '[]',
+    advice text,
+    follow_up_date date,
+    vitals jsonb
+);
+
+CREATE TABLE IF NOT EXISTS doctor_reviews (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    doctor_id uuid REFERENCES doctors(id),
+    patient_id uuid REFERENCES users(id),
+    appointment_id uuid REFERENCES appointments(id),
+    rating int NOT NULL,
+    comment text,
+    created_at timestamptz NOT NULL DEFAULT now(),
+    UNIQUE (patient_id, appointment_id)
+);
+
+CREATE TABLE IF NOT EXISTS articles (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    title text NOT NULL,
+    content text NOT NULL,
+    author text,
+    published_at timestamptz
+);
+
+CREATE TABLE IF NOT EXISTS pharmacies (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    name text NOT NULL,
+    address text NOT NULL,
+    phone_number text,
+    is_active boolean NOT NULL DEFAULT true
+);
+
+CREATE TABLE IF NOT EXISTS labs (
+    id uuid PRIMARY KEY DEFAULT gen_random_uuid(),
+    name text NOT NULL,
+    address text NOT NULL,
+    phone_number text,
+    is_active boolean NOT NULL DEFAULT true
+);
@@ -0,0 +1,205 @@
+"""
+Fills a throwaway database with realistic volumes of benchmark data.
+
+Point DATABASE_URL at a database you can wipe. If its tables don't exist yet they
+are created from benchmarks/schema.sql plus every migration. --reset empties all
+the API's tables first; without it, seeding refuses to touch a database that
+already has doctors. Every seeded patient's password is BENCH_PASSWORD.
+
+    python -m benchmarks.seed --scale 0.1 --reset
+"""
+import argparse
+import os
+import time
+import psycopg2
+
+from database import DATABASE_URL
+import hashing
+import migrate
+
+BENCH_PASSWORD = "bench-password"
+BENCH_EMAIL_DOMAIN = "bench.invalid"
+
+# Row counts at --scale 1.
+VOLUMES = {
+    "clinics": 200,
+    "doctors": 5000,
+    "patients": 20000,
+    "appointments": 200000,
+    "prescriptions": 100000,
+    "reviews": 50000,
+    "articles": 2000,
+    "pharmacies": 2000,
+    "labs": 1000,
+}
+SLOTS_PER_DOCTOR = 20
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def _text_array(values):
+    return "ARRAY[" + ",".join("'" + v.replace("'", "''") + "'" for v in values) + "]"
+
+FIRST_NAMES = _text_array([
+    "Asha", "Rohan", "Priya", "Vikram", "Neha", "Arjun", "Kavya", "Rahul", "Sneha", "Aditya",
+    "Meera", "Karan", "Pooja", "Sanjay", "Ananya", "Nikhil", "Divya", "Amit", "Isha", "Varun",
+])
+LAST_NAMES = _text_array([
+    "Mehta", "Sharma", "Iyer", "Patil", "Reddy", "Nair", "Gupta", "Kulkarni", "Joshi", "Desai",
+    "Rao", "Singh", "Bose", "Menon", "Chopra", "Pillai", "Shah", "Verma", "Kapoor", "Das",
+])
+SPECIALTIES = _text_array([
+    "Cardiology", "Dermatology", "Neurology", "Orthopedics", "Pediatrics", "Psychiatry",
+    "Gynecology", "Ophthalmology", "ENT", "General Medicine", "Endocrinology", "Gastroenterology",
+])
+CITIES = _text_array(["Pune", "Mumbai", "Delhi", "Bengaluru", "Chennai", "Hyderabad", "Kolkata"])
+
+# Statements run in order; {name} fields are filled in from the scaled volumes.
+SEED_STATEMENTS = [
+    """
+    INSERT INTO clinics (name, address)
+    SELECT 'Clinic ' || i, i || ' Main Road, ' || ({cities})[1 + mod(i, 7)]
+    FROM generate_series(1, {clinics}) i;
+    """,
+    """
+    INSERT INTO users (full_name, email, role, hashed_password)
+    SELECT 'Dr. ' || ({first})[1 + mod(i, 20)] || ' ' || ({last})[1 + mod(i / 20, 20)],
+           'doctor-' || i || '@{domain}', 'doctor', %(unusable)s
+    FROM generate_series(1, {doctors}) i;
+    """,
+    """
+    CREATE TEMP TABLE bench_clinics AS
+    SELECT row_number() OVER (ORDER BY id) - 1 AS n, id FROM clinics;
+    """,
+    """
+    INSERT INTO doctors (user_id, clinic_id, name, specialty, experience, bio, available_slots)
+    SELECT u.id, c.id, u.full_name, ({specialties})[1 + mod(i, 12)], mod(i, 35),
+           'Practising ' || lower(({specialties})[1 + mod(i, 12)]) || ' for ' || mod(i, 35) || ' years.',
+           ARRAY(
+               SELECT to_char(date_trunc('day', now()) + s * interval '1 day'
+                              + interval '9 hours' + mod(i, 16) * interval '30 minutes',
+                              'YYYY-MM-DD"T"HH24:MI:SS"Z"')
+               FROM generate_series(1, {slots_per_doctor}) s
+           )
+    FROM (SELECT split_part(split_part(email, '@', 1), '-', 2)::int AS i, id, full_name
+          FROM users WHERE role = 'doctor' AND email LIKE '%%@{domain}') u
+    JOIN bench_clinics c ON c.n = mod(u.i, {clinics});
+    """,
+    """
+    INSERT INTO users (full_name, email, role, hashed_password, phone_number, date_of_birth, sex)
+    SELECT ({first})[1 + mod(i * 7, 20)] || ' ' || ({last})[1 + mod(i * 13, 20)],
+           'patient-' || i || '@{domain}', 'patient', %(password_hash)s,
+           '+91 90000 ' || lpad(mod(i, 100000)::text, 5, '0'),
+           date '1950-01-01' + mod(i * 37, 20000), (ARRAY['F', 'M'])[1 + mod(i, 2)]
+    FROM generate_series(1, {patients}) i;
+    """,
+    """
+    CREATE TEMP TABLE bench_doctors AS
+    SELECT row_number() OVER (ORDER BY id) - 1 AS n, id, user_id FROM doctors;
+    CREATE TEMP TABLE bench_patients AS
+    SELECT row_number() OVER (ORDER BY id) - 1 AS n, id, full_name FROM users WHERE role = 'patient';
+    """,
+    # Past appointments only: one per (doctor, slot), so the slot inventory is untouched.
+    """
+    INSERT INTO appointments (doctor_id, patient_id, patient_name, slot, status, doctor_user_id, created_at)
+    SELECT d.id, p.id, p.full_name,
+           date_trunc('minute', now()) - interval '1 day' - i * interval '17 minutes',
+           CASE WHEN mod(i, 5) = 0 THEN 'cancelled' ELSE 'completed' END,
+           d.user_id, now() - interval '1 day' - i * interval '17 minutes' - interval '3 days'
+    FROM generate_series(1, {appointments}) i
+    JOIN bench_doctors d ON d.n = mod(i, {doctors})
+    JOIN bench_patients p ON p.n = mod(i * 7919, {patients});
+    """,
+    """
+    INSERT INTO prescriptions (appointment_id, patient_id, doctor_id, created_at, complaint, diagnosis,
+                               medicines, tests, advice, follow_up_date, vitals)
+    SELECT a.id, a.patient_id, a.doctor_id, a.slot + interval '20 minutes',
+           'Fever and headache for ' || (1 + mod(n, 6)) || ' days', 'Viral fever',
+           jsonb_build_array(
+               jsonb_build_object('name', 'Paracetamol 650', 'dosage', '1 tab', 'frequency', 'TDS', 'duration', '5 days'),
+               jsonb_build_object('name', 'Cetirizine 10', 'dosage', '1 tab', 'frequency', 'HS', 'duration', '3 days')
+           ),
+           '["CBC", "CRP"]'::jsonb, 'Rest and fluids.', (a.slot + interval '7 days')::date,
+           jsonb_build_object('bp', '120/80', 'pulse', 70 + mod(n, 30), 'temperature', 98.6)
+    FROM (SELECT *, row_number() OVER (ORDER BY slot DESC) AS n FROM appointments WHERE status = 'completed') a
+    WHERE a.n <= {prescriptions};
+    """,
+    """
+    INSERT INTO doctor_reviews (doctor_id, patient_id, appointment_id, rating, comment, created_at)
+    SELECT a.doctor_id, a.patient_id, a.id, 1 + mod(a.n * 31, 5), 'Seen on ' || to_char(a.slot, 'DD Mon'), a.slot + interval '1 day'
+    FROM (SELECT *, row_number() OVER (ORDER BY slot) AS n FROM appointments WHERE status = 'completed') a
+    WHERE a.n <= {reviews};
+    """,
+    """
+    INSERT INTO articles (title, content, author, published_at)
+    SELECT 'Health tip #' || i || ': ' || lower(({specialties})[1 + mod(i, 12)]),
+           repeat('Regular check-ups catch problems early. Sleep, water and a short walk every day help more than most supplements. ', 12),
+           'Dr. ' || ({last})[1 + mod(i, 20)],
+           CASE WHEN mod(i, 10) = 0 THEN NULL ELSE now() - i * interval '3 hours' END
+    FROM generate_series(1, {articles}) i;
+    """,
+    """
+    INSERT INTO pharmacies (name, address, phone_number, is_active)
+    SELECT (ARRAY['Apollo Pharmacy', 'MedPlus', 'Wellness Forever', 'Netmeds Store', 'Care Chemists'])[1 + mod(i, 5)] || ' ' || i,
+           i || ' Market Road, ' || ({cities})[1 + mod(i, 7)], '+91 80000 ' || lpad(i::text, 5, '0'), mod(i, 20) <> 0
+    FROM generate_series(1, {pharmacies}) i;
+    """,
+    """
+    INSERT INTO labs (name, address, phone_number, is_active)
+    SELECT (ARRAY['Metro Labs', 'Thyrocare', 'Dr Lal PathLabs', 'SRL Diagnostics', 'Suburban Diagnostics'])[1 + mod(i, 5)] || ' ' || i,
+           i || ' Station Road, ' || ({cities})[1 + mod(i, 7)], '+91 70000 ' || lpad(i::text, 5, '0'), mod(i, 20) <> 0
+    FROM generate_series(1, {labs}) i;
+    """,
+]
+
+RESET = "TRUNCATE users, clinics, doctors, appointments, prescriptions, doctor_reviews, articles, pharmacies, labs CASCADE;"
+
+def ensure_schema(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('public.users') IS NOT NULL;")
+        if cur.fetchone()[0]:
+            return
+        print("creating schema and applying migrations")
+        with open(os.path.join(HERE, "schema.sql")) as f:
+            cur.execute(f.read())
+    conn.commit()
+    migrate.migrate(conn)
+
+def seed(conn, scale, reset):
+    volumes = {name: max(1, int(count * scale)) for name, count in VOLUMES.items()}
+    with conn.cursor() as cur:
+        if reset:
+            cur.execute(RESET)
+        else:
+            cur.execute("SELECT EXISTS (SELECT 1 FROM doctors);")
+            if cur.fetchone()[0]:
+                raise SystemExit("The database already has doctors; pass --reset to wipe it first.")
+        params = {"password_hash": hashing.hash_password(BENCH_PASSWORD), "unusable": hashing.UNUSABLE_PASSWORD}
+        fields = dict(volumes, first=FIRST_NAMES, last=LAST_NAMES, specialties=SPECIALTIES, cities=CITIES,
+                      domain=BENCH_EMAIL_DOMAIN, slots_per_doctor=SLOTS_PER_DOCTOR)
+        for statement in SEED_STATEMENTS:
+            start = time.perf_counter()
+            cur.execute(statement.format(**fields), params)
+            print(f"  {cur.rowcount:>8} rows  {time.perf_counter() - start:6.2f}s  {' '.join(statement.split()[:3])}")
+    conn.commit()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("ANALYZE;")
+    return volumes
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplier for the row counts in VOLUMES")
+    parser.add_argument("--reset", action="store_true", help="empty every API table before seeding")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        ensure_schema(conn)
+        start = time.perf_counter()
+        volumes = seed(conn, args.scale, args.reset)
+        print(f"seeded {volumes} in {time.perf_counter() - start:.1f}s")
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Cold start: how long a fresh API process takes to import, to accept connections
+and to answer its first requests, with each WARM_UP mode (see warmup.py).
+
+For every mode in --modes the server (`uvicorn main:app`) is started --runs
+times. Each run reports:
+- listening: the time from process start until the port accepts connections. This
+  includes the lifespan, and so a blocking warm-up.
+- the latency of the first and second call to each route below, called in order
+  as soon as the port is open: the articles feed, a doctor search, a login by a
+  seeded patient and that patient's profile.
+
+It also times `import main` in a bare interpreter and lists the modules that
+import spends the most time in. Needs a database seeded with `python -m benchmarks.seed`.
+
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --modes off,on --port 8100
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+import psycopg2
+
+from database import DATABASE_URL
+from benchmarks.seed import BENCH_PASSWORD, BENCH_EMAIL_DOMAIN
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_MAIN = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+_IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+def time_import(runs):
+    seconds = [float(subprocess.run([sys.executable, "-c", IMPORT_MAIN], cwd=BACKEND, check=True,
+                                    capture_output=True, text=True).stdout.split()[-1]) for _ in range(runs)]
+    # Cumulative time of each module main imports directly (the ones nested one level under it).
+    trace = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=BACKEND,
+                           check=True, capture_output=True, text=True).stderr
+    direct = []
+    for line in trace.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match and len(match.group(3)) == 3:
+            direct.append((int(match.group(2)) / 1000, match.group(4)))
+    return statistics.median(seconds), sorted(direct, reverse=True)
+
+def request(port, method, path, body=None, token=None):
+    headers = {"Content-Type": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=data, method=method, headers=headers)
+    start = time.perf_counter()
+    with urllib.request.urlopen(req, timeout=30) as response:
+        payload = response.read()
+    return time.perf_counter() - start, payload
+
+def one_run(mode, port, email):
+    env = dict(os.environ, WARM_UP=mode)
+    started = time.perf_counter()
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+                              cwd=BACKEND, env=env)
+    try:
+        while True:
+            if server.poll() is not None:
+                raise SystemExit(f"The server exited with status {server.returncode}.")
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                break
+            except OSError:
+                time.sleep(0.005)
+        timings = {"listening": time.perf_counter() - started}
+        token = None
+        for name, method, path, body in (
+            ("articles", "GET", "/articles", None),
+            ("doctor search", "GET", "/doctors/search?q=cardio", None),
+            ("login", "POST", "/auth/login", {"email": email, "password": BENCH_PASSWORD}),
+            ("profile", "GET", "/patient/profile", None),
+        ):
+            first, payload = request(port, method, path, body, token)
+            second, _ = request(port, method, path, body, token)
+            if name == "login":
+                token = json.loads(payload)["access_token"]
+            timings[name] = (first, second)
+        return timings
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--modes", default="off,on,background")
+    parser.add_argument("--port", type=int, default=8099)
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(DATABASE_URL)
+    with conn.cursor() as cur:
+        cur.execute("SELECT email FROM users WHERE email LIKE %s ORDER BY email LIMIT 1;",
+                    (f"patient-%@{BENCH_EMAIL_DOMAIN}",))
+        row = cur.fetchone()
+    conn.close()
+    if not row:
+        raise SystemExit("No seeded patients; run `python -m benchmarks.seed` first.")
+
+    seconds, direct = time_import(args.runs)
+    print(f"import main: {seconds * 1000:.0f} ms (median of {args.runs})")
+    for ms, module in direct[:8]:
+        print(f"  {module:<24} {ms:>7.1f} ms")
+    print()
+
+    print(f"{'mode':<11} {'step':<14} {'first ms':>9} {'second ms':>10}   (median of {args.runs} fresh processes)")
+    for mode in args.modes.split(","):
+        runs = [one_run(mode, args.port, row[0]) for _ in range(args.runs)]
+        print(f"{mode:<11} {'listening':<14} {statistics.median(r['listening'] for r in runs) * 1000:>9.0f}")
+        for step in [name for name in runs[0] if name != "listening"]:
+            first = statistics.median(r[step][0] for r in runs) * 1000
+            second = statistics.median(r[step][1] for r in runs) * 1000
+            print(f"{'':<11} {step:<14} {first:>9.1f} {second:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+Write round trips: how many client/server round trips each patient write costs.
+
+Runs the data-access layer of --driver through a small TCP proxy in front of
+the database that counts round trips (each time the client speaks again after
+the server has answered) and can add --latency-ms to each one, as a network
+between the API and the database would. Each write runs --writes times on one
+pooled connection, after a first call that PREPAREs its statement; the report
+shows round trips and milliseconds per write for the writes themselves and,
+through idempotency.respond, for the keyed path: each write sent with a fresh
+Idempotency-Key (the write and its stored response in one transaction) and a
+retry that replays a stored response.
+--prepare off runs the same writes without server-side prepared statements.
+Everything it creates is deleted afterwards. Needs DATABASE_URL and migrations
+through 009 applied.
+
+    python -m benchmarks.write_round_trips --writes 200
+    python -m benchmarks.write_round_trips --driver async --latency-ms 1
+"""
+import argparse
+import asyncio
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+import psycopg2
+import psycopg2.extensions
+from fastapi import HTTPException
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writes", type=int, default=200, help="timed calls of each write")
+    parser.add_argument("--driver", choices=["sync", "async"], default="sync")
+    parser.add_argument("--prepare", choices=["on", "off"], default="on")
+    parser.add_argument("--latency-ms", type=float, default=0, help="delay added to every round trip")
+    return parser.parse_args()
+
+class RoundTripProxy:
+    """Forwards TCP connections to the database and counts their round trips."""
+
+    def __init__(self, host, port, latency):
+        # A host starting with "/" is libpq's directory of Unix sockets.
+        self.upstream = (f"{host}/.s.PGSQL.{port}", None) if host.startswith("/") else (host, port)
+        self.latency = latency
+        self.round_trips = 0
+        self.loop = asyncio.new_event_loop()
+
+    def start(self):
+        ready = threading.Event()
+
+        def run():
+            asyncio.set_event_loop(self.loop)
+            self.server = self.loop.run_until_complete(asyncio.start_server(self._serve, "127.0.0.1", 0))
+            ready.set()
+            self.loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait()
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _serve(self, client_reader, client_writer):
+        path, port = self.upstream
+        if port is None:
+            server_reader, server_writer = await asyncio.open_unix_connection(path)
+        else:
+            server_reader, server_writer = await asyncio.open_connection(path, port)
+        turn = {"client": False}
+
+        async def pump(reader, writer, from_client):
+            try:
+                while data := await reader.read(65536):
+                    if from_client and not turn["client"]:
+                        turn["client"] = True
+                        self.round_trips += 1
+                        if self.latency:
+                            await asyncio.sleep(self.latency)
+                    elif not from_client:
+                        turn["client"] = False
+                    writer.write(data)
+                    await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                writer.close()
+
+        await asyncio.gather(pump(client_reader, server_writer, True), pump(server_reader, client_writer, False))
+
+args = parse_args()
+DIRECT_URL = os.environ["DATABASE_URL"]
+_dsn = psycopg2.extensions.parse_dsn(DIRECT_URL)
+proxy = RoundTripProxy(_dsn.get("host", "localhost"), int(_dsn.get("port", 5432)), args.latency_ms / 1000)
+# Everything the app does goes through the proxy, on a single pooled connection.
+os.environ["DATABASE_URL"] = psycopg2.extensions.make_dsn(DIRECT_URL, host="127.0.0.1", port=proxy.start())
+os.environ["DB_DRIVER"] = args.driver
+os.environ["DB_PREPARE_WRITES"] = "true" if args.prepare == "on" else "false"
+os.environ["DB_POOL_MIN_SIZE"] = os.environ["DB_POOL_MAX_SIZE"] = "1"
+os.environ["DATABASE_REPLICA_URLS"] = ""
+
+import db_actions
+import async_db_actions
+import database
+import idempotency
+from models import AppointmentOut, ReviewOut
+
+def setup(conn, writes):
+    run = uuid.uuid4().hex[:8]
+    start = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    slots = [start + timedelta(minutes=15 * i) for i in range(2 * (writes + 1))]
+    with conn.cursor() as cur:
+        cur.execute("INSERT INTO users (full_name, email, role, hashed_password) VALUES (%s, %s, 'patient', '!') RETURNING id;",
+                    (f"Round Trips {run}", f"round-trips-{run}@example.invalid"))
+        patient = {"id": cur.fetchone()[0], "full_name": f"Round Trips {run}"}
+        cur.execute("INSERT INTO doctors (name, specialty, experience, available_slots) VALUES (%s, 'Benchmark', 0, %s) RETURNING id;",
+                    (f"Round Trips {run}", [s.isoformat() for s in slots]))
+        doctor_id = cur.fetchone()[0]
+        # Completed appointments to review, one per review.
+        cur.execute("""
+            INSERT INTO appointments (doctor_id, patient_id, patient_name, slot, status)
+            SELECT %s, %s, %s, now() - s * interval '1 day', 'completed' FROM generate_series(1, %s) s
+            RETURNING id;
+        """, (doctor_id, patient["id"], patient["full_name"], writes + 1))
+        reviewable = [row[0] for row in cur.fetchall()]
+    conn.commit()
+    return run, patient, doctor_id, slots, reviewable
+
+def teardown(conn, run, patient, doctor_id):
+    with conn.cursor() as cur:
+        cur.execute("DELETE FROM idempotency_keys WHERE user_id = %s;", (patient["id"],))
+        cur.execute("DELETE FROM doctor_reviews WHERE doctor_id = %s;", (doctor_id,))
+        cur.execute("DELETE FROM appointments WHERE doctor_id = %s;", (doctor_id,))
+        cur.execute("DELETE FROM doctors WHERE id = %s;", (doctor_id,))
+        cur.execute("DELETE FROM users WHERE id = %s OR email LIKE %s;", (patient["id"], f"round-trips-{run}-%"))
+    conn.commit()
+
+def scenarios(run, patient, doctor_id, slots, reviewable):
+    """(name, [call, ...]) per write: the first call PREPAREs, the rest are timed."""
+    booked = []
+    profile = {"full_name": patient["full_name"], "phone_number": "+91 90000 00000", "sex": "F"}
+
+    def book(slot):
+        async def call():
+            booked.append((await actions.book_new_appointment(patient, doctor_id, slot))["id"])
+        return call
+
+    def cancel(i):
+        async def call():
+            await actions.cancel_appointment(booked[i], patient["id"])
+        return call
+
+    def review(appointment_id):
+        return lambda: actions.add_doctor_review(patient["id"], {
+            "doctor_id": doctor_id, "appointment_id": appointment_id, "rating": 4, "comment": "Fine"})
+
+    def keyed(key, route, request, write, model):
+        return idempotency.respond(key, patient["id"], route, request, write, model)
+
+    def keyed_book(key, slot):
+        async def write():
+            row = await actions.book_new_appointment(patient, doctor_id, slot)
+            if not row:
+                raise HTTPException(status_code=409, detail="This slot is no longer available.")
+            booked.append(row["id"])
+            return row
+        return lambda: keyed(key, "book_appointment", {"doctor_id": doctor_id, "slot": slot}, write, AppointmentOut)
+
+    def keyed_cancel(key, i):
+        async def call():
+            write = lambda: actions.cancel_appointment(booked[i], patient["id"])
+            return await keyed(key, "cancel_appointment", {"appointment_id": booked[i]}, write, AppointmentOut)
+        return call
+
+    def keyed_review(key, appointment_id):
+        review = {"doctor_id": doctor_id, "appointment_id": appointment_id, "rating": 5, "comment": "Fine"}
+        return lambda: keyed(key, "doctor_review", review, lambda: actions.add_doctor_review(patient["id"], review), ReviewOut)
+
+    n = len(reviewable) - 1
+    keys = [f"round-trips-{run}-{i}" for i in range(n + 1)]
+    return [
+        ("create_new_user", [lambda i=i: actions.create_new_user("Round Trips", f"round-trips-{run}-{i}@example.invalid", "!")
+                             for i in range(n + 1)]),
+        ("update_patient_profile", [lambda: actions.update_patient_profile(patient["id"], profile)] * (n + 1)),
+        ("book_new_appointment", [book(slot) for slot in slots[:n + 1]]),
+        ("cancel_appointment", [cancel(i) for i in range(n + 1)]),
+        ("add_doctor_review", [review(a) for a in reviewable]),
+        ("keyed book_new_appointment", [keyed_book(f"book-{key}", slot) for key, slot in zip(keys, slots[n + 1:])]),
+        ("keyed cancel_appointment", [keyed_cancel(f"cancel-{key}", n + 1 + i) for i, key in enumerate(keys)]),
+        ("keyed add_doctor_review", [keyed_review(f"review-{key}", a) for key, a in zip(keys, reviewable)]),
+        ("  retry replayed", [keyed_book(f"book-{keys[0]}", slots[n + 1])] * (n + 1)),
+    ]
+
+async def measure(calls):
+    await calls[0]()
+    proxy.round_trips = 0
+    start = time.perf_counter()
+    for call in calls[1:]:
+        await call()
+    seconds = time.perf_counter() - start
+    return proxy.round_trips / (len(calls) - 1), seconds * 1000 / (len(calls) - 1)
+
+async def run_all(fixtures):
+    results = []
+    try:
+        for name, calls in scenarios(*fixtures):
+            results.append((name, *await measure(calls)))
+    finally:
+        await database.close_async_pool()
+        database.close_pool()
+    return results
+
+actions = None
+
+def main():
+    global actions
+    if args.driver == "async":
+        actions = async_db_actions
+    else:
+        from data_access import ThreadedActions
+        actions = ThreadedActions(db_actions)
+    conn = psycopg2.connect(DIRECT_URL)
+    fixtures = setup(conn, args.writes)
+    try:
+        results = asyncio.run(run_all(fixtures))
+    finally:
+        conn.rollback()
+        teardown(conn, fixtures[0], fixtures[1], fixtures[2])
+        conn.close()
+    print(f"driver={args.driver} prepare={args.prepare} latency={args.latency_ms:g} ms per round trip, {args.writes} writes each")
+    print(f"{'write':<30} {'round trips':>12} {'ms/write':>9}")
+    for name, round_trips, ms in results:
+        print(f"{name:<30} {round_trips:>12.2f} {ms:>9.2f}")
+
+if __name__ == "__main__":
+    main()
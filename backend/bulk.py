@@ -0,0 +1,313 @@
+import os
+import csv
+import json
+import time
+from dotenv import load_dotenv
+
+import hashing
+
+load_dotenv()
+
+# Bulk import and export of directory data, run by `python manage.py import|export`.
+#
+# An import streams the file into a temporary staging table with COPY, then
+# merges it into the real table with a handful of set-based statements in one
+# transaction: rows are matched to existing ones by `id`, or by the table's
+# natural key when the file has no ids, updated in place if found and inserted
+# otherwise. Re-running the same file is therefore safe. Only the columns present
+# in the file are written; the rest keep their current values (or defaults).
+
+# --- Configuration ---
+# Rows fetched per round trip when exporting NDJSON.
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "2000"))
+
+# Table -> (columns a file may set, natural key). The first key column must be
+# NOT NULL; the others may be null and then match null.
+TABLES = {
+    "clinics": (("id", "name", "address"), ("name",)),
+    "doctors": (("id", "name", "specialty", "experience", "bio", "available_slots", "clinic_id", "user_id"),
+                ("name", "clinic_id")),
+    "pharmacies": (("id", "name", "address", "phone_number", "is_active"), ("name", "address")),
+    "labs": (("id", "name", "address", "phone_number", "is_active"), ("name", "address")),
+    "articles": (("id", "title", "content", "author", "published_at"), ("title",)),
+}
+
+# Staging-only columns resolved before the merge: column -> (target column, table, matched by).
+LOOKUPS = {
+    "doctors": {"clinic_name": ("clinic_id", "clinics", "name")},
+}
+
+EXPORT_QUERIES = {
+    "clinics": "SELECT id, name, address FROM clinics ORDER BY name, id",
+    "doctors": """
+        SELECT d.id, d.name, d.specialty, d.experience, d.bio, d.available_slots,
+               d.clinic_id, c.name AS clinic_name, d.user_id
+        FROM doctors d LEFT JOIN clinics c ON c.id = d.clinic_id
+        ORDER BY d.name, d.id
+    """,
+    "pharmacies": "SELECT id, name, address, phone_number, is_active FROM pharmacies ORDER BY name, id",
+    "labs": "SELECT id, name, address, phone_number, is_active FROM labs ORDER BY name, id",
+    "articles": "SELECT id, title, content, author, published_at FROM articles ORDER BY published_at DESC NULLS LAST, id",
+}
+
+# Patient files: `password` is hashed here; `hashed_password` is taken as is.
+# Rows with neither get an unusable password (Google sign-in only, or reset later).
+PATIENT_COLUMNS = ("full_name", "email", "password", "hashed_password", "phone_number", "date_of_birth", "sex")
+
+# --- Files ---
+
+def file_format(path, fmt=None):
+    if fmt:
+        return fmt
+    if path.endswith(".csv"):
+        return "csv"
+    if path.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    raise SystemExit(f"Can't tell the format of {path}; pass --format csv or ndjson.")
+
+def read_columns(path, fmt):
+    """The CSV header, or the keys of the first NDJSON record."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "csv":
+            return next(csv.reader(f), [])
+        for line in f:
+            if line.strip():
+                return list(json.loads(line))
+    return []
+
+def read_records(path, fmt):
+    """Dicts for each record of a CSV (empty fields are null) or NDJSON file."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "csv":
+            for row in csv.DictReader(f):
+                yield {k: (v if v != "" else None) for k, v in row.items()}
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+def copy_file(cur, table, path, fmt, columns):
+    """COPYs the file's records into `table`. Returns the row count."""
+    if fmt == "csv":
+        # Postgres parses CSV itself; the file is streamed as is.
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, HEADER true);", f)
+        return cur.rowcount
+    stream = CopyStream(read_records(path, fmt), columns)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN;", stream)
+    return stream.rows
+
+def _check_columns(columns, allowed, what):
+    unknown = [c for c in columns if c not in allowed]
+    if unknown:
+        raise SystemExit(f"Unknown column(s) for {what}: {', '.join(unknown)}. Allowed: {', '.join(allowed)}.")
+
+# --- COPY text format ---
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+def _array_literal(values):
+    items = ("NULL" if v is None else '"' + str(v).replace("\\", "\\\\").replace('"', '\\"') + '"' for v in values)
+    return "{" + ",".join(items) + "}"
+
+def copy_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, list):
+        value = _array_literal(value)
+    elif isinstance(value, dict):
+        value = json.dumps(value)
+    return _escape(str(value))
+
+class CopyStream:
+    """A file-like object that COPY ... FROM STDIN reads `columns` of each record from."""
+
+    def __init__(self, records, columns):
+        self._records = iter(records)
+        self._columns = columns
+        self._buffer = ""
+        self.rows = 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            record = next(self._records, None)
+            if record is None:
+                break
+            if not isinstance(record, dict):
+                raise SystemExit(f"Record {self.rows + 1} is not an object.")
+            extra = set(record) - set(self._columns)
+            if extra:
+                raise SystemExit(f"Record {self.rows + 1} has columns the first record doesn't: {', '.join(map(str, extra))}.")
+            self._buffer += "\t".join(copy_value(record.get(c)) for c in self._columns) + "\n"
+            self.rows += 1
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
+
+# --- Import ---
+
+def import_table(conn, table, path, fmt=None):
+    """Loads a CSV/NDJSON file into `table`. Returns {rows, inserted, updated, seconds}."""
+    allowed, key = TABLES[table]
+    lookups = LOOKUPS.get(table, {})
+    fmt = file_format(path, fmt)
+    start = time.perf_counter()
+    columns = read_columns(path, fmt)
+    _check_columns(columns, allowed + tuple(lookups), table)
+    targets = [c for c in columns if c in allowed]
+    if "id" not in columns and key[0] not in columns:
+        raise SystemExit(f"{table} rows need an id or a {key[0]} column to be matched on.")
+    stage = f"import_{table}"
+    staged = ["id"] + [c for c in allowed if c != "id"]
+    key_match = " AND ".join([f"t.{key[0]} = s.{key[0]}"] + [f"t.{k} IS NOT DISTINCT FROM s.{k}" for k in key[1:]])
+    # Rows with an id are the same row when their ids are; rows without one when their keys are.
+    same_row = ", ".join(["id"] + [f"CASE WHEN id IS NULL THEN {k} END" for k in key])
+    written = [c for c in targets if c != "id"]
+    for lookup, (target, _, _) in lookups.items():
+        if lookup in columns and target not in written:
+            written.append(target)
+
+    with conn.cursor() as cur:
+        cur.execute(f"LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE;")
+        # No constraints are copied, so COPY leaves absent columns null.
+        cur.execute(f"CREATE TEMP TABLE {stage} ON COMMIT DROP AS SELECT {', '.join(staged)} FROM {table} WITH NO DATA;")
+        for lookup in lookups:
+            cur.execute(f"ALTER TABLE {stage} ADD COLUMN {lookup} text;")
+        cur.execute(f"ALTER TABLE {stage} ADD COLUMN line bigserial;")
+        rows = copy_file(cur, stage, path, fmt, columns)
+        cur.execute(f"ANALYZE {stage};")
+
+        for lookup, (target, other, by) in lookups.items():
+            if lookup not in columns:
+                continue
+            cur.execute(f"""
+                UPDATE {stage} s SET {target} = o.id
+                FROM (SELECT DISTINCT ON ({by}) id, {by} FROM {other} ORDER BY {by}, id) o
+                WHERE s.{target} IS NULL AND o.{by} = s.{lookup};
+            """)
+            cur.execute(f"SELECT line, {lookup} FROM {stage} WHERE {lookup} IS NOT NULL AND {target} IS NULL ORDER BY line LIMIT 5;")
+            missing = cur.fetchall()
+            if missing:
+                conn.rollback()
+                raise SystemExit(f"No {other} named {', '.join(repr(m[1]) for m in missing)} (record {missing[0][0]}...).")
+
+        cur.execute(f"UPDATE {stage} s SET id = t.id FROM {table} t WHERE s.id IS NULL AND {key_match};")
+        # The last of several records for the same row wins.
+        cur.execute(f"""
+            DELETE FROM {stage} WHERE line IN (
+                SELECT line FROM (
+                    SELECT line, row_number() OVER (PARTITION BY {same_row} ORDER BY line DESC) AS n FROM {stage}
+                ) d WHERE n > 1
+            );
+        """)
+        updated = 0
+        if written:
+            cur.execute(f"""
+                UPDATE {table} t SET {', '.join(f'{c} = s.{c}' for c in written)}
+                FROM {stage} s WHERE t.id = s.id;
+            """)
+            updated = cur.rowcount
+        cur.execute(f"""
+            INSERT INTO {table} (id{''.join(f', {c}' for c in written)})
+            SELECT COALESCE(s.id, gen_random_uuid()){''.join(f', s.{c}' for c in written)}
+            FROM {stage} s
+            WHERE s.id IS NULL OR NOT EXISTS (SELECT 1 FROM {table} t WHERE t.id = s.id);
+        """)
+        inserted = cur.rowcount
+    conn.commit()
+    _analyze(conn, table)
+    return {"rows": rows, "inserted": inserted, "updated": updated, "seconds": time.perf_counter() - start}
+
+def _analyze(conn, table):
+    # Fresh statistics, so the planner knows about the new rows right away.
+    with conn.cursor() as cur:
+        cur.execute(f"ANALYZE {table};")
+    conn.commit()
+
+def hash_passwords(passwords, workers=None):
+    """bcrypt hashes of `passwords`, computed in parallel across `workers` processes."""
+    if not passwords:
+        return []
+    pool = hashing.HashingPool(workers=workers or os.cpu_count() or 2, queue_limit=0)
+    try:
+        chunksize = max(1, len(passwords) // (pool.workers * 4))
+        return list(pool.start().map(hashing.hash_password, passwords, chunksize=chunksize))
+    finally:
+        pool.shutdown()
+
+def import_patients(conn, path, fmt=None, workers=None):
+    """
+    Creates patient accounts from a CSV/NDJSON file. Existing emails are left
+    alone (and their passwords are never hashed). Returns {rows, created,
+    existing (emails already registered), duplicates (rows repeating an earlier
+    row's email), skipped (rows without an email), hashed, hash_seconds, seconds}.
+    """
+    fmt = file_format(path, fmt)
+    start = time.perf_counter()
+    columns = read_columns(path, fmt)
+    _check_columns(columns, PATIENT_COLUMNS, "patients")
+    if "full_name" not in columns or "email" not in columns:
+        raise SystemExit("Patient rows need full_name and email columns.")
+    records = list(read_records(path, fmt))
+    with conn.cursor() as cur:
+        cur.execute("SELECT email FROM users WHERE email = ANY(%s);", ([r.get("email") for r in records],))
+        existing = {row[0] for row in cur.fetchall()}
+    new, seen, duplicates, skipped = {}, set(), 0, 0
+    for record in records:
+        email = record.get("email")
+        if not email:
+            skipped += 1
+            continue
+        if email in seen:
+            duplicates += 1
+        seen.add(email)
+        if email not in existing:
+            new[email] = record  # the last record for an email wins
+    to_hash = [r for r in new.values() if r.get("password") and not r.get("hashed_password")]
+    hash_start = time.perf_counter()
+    for record, hashed in zip(to_hash, hash_passwords([r["password"] for r in to_hash], workers)):
+        record["hashed_password"] = hashed
+    hash_seconds = time.perf_counter() - hash_start
+    for record in new.values():
+        record["hashed_password"] = record.get("hashed_password") or hashing.UNUSABLE_PASSWORD
+
+    staged = ("full_name", "email", "hashed_password", "phone_number", "date_of_birth", "sex")
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE TEMP TABLE import_patients ON COMMIT DROP AS SELECT {', '.join(staged)} FROM users WITH NO DATA;")
+        cur.copy_expert(f"COPY import_patients ({', '.join(staged)}) FROM STDIN;", CopyStream(({c: r.get(c) for c in staged} for r in new.values()), staged))
+        cur.execute(f"""
+            INSERT INTO users ({', '.join(staged)}, role)
+            SELECT {', '.join(staged)}, 'patient' FROM import_patients
+            ON CONFLICT (email) DO NOTHING;
+        """)
+        created = cur.rowcount
+    conn.commit()
+    # Emails registered since the lookup above were skipped by ON CONFLICT; they count as existing.
+    return {"rows": len(records), "created": created, "existing": len(existing) + len(new) - created,
+            "duplicates": duplicates, "skipped": skipped, "hashed": len(to_hash),
+            "hash_seconds": hash_seconds, "seconds": time.perf_counter() - start}
+
+# --- Export ---
+
+def export_table(conn, table, out, fmt):
+    """Writes every row of `table` to the open text file `out`. Returns the row count."""
+    query = EXPORT_QUERIES[table]
+    if fmt == "csv":
+        with conn.cursor() as cur:
+            cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER true);", out)
+            rows = cur.rowcount
+    else:
+        # A server-side cursor, so the table is never held in memory at once.
+        with conn.cursor(name=f"export_{table}") as cur:
+            cur.itersize = EXPORT_BATCH_SIZE
+            cur.execute(f"SELECT row_to_json(t)::text FROM ({query}) t;")
+            rows = 0
+            for (line,) in cur:
+                out.write(line + "\n")
+                rows += 1
+    conn.rollback()
+    return rows
@@ -0,0 +1,200 @@
+import os
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Configuration ---
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+# Also used as the Cache-Control max-age of article responses.
+ARTICLES_CACHE_TTL = int(os.getenv("ARTICLES_CACHE_TTL", "60"))
+# Public doctor/pharmacy/lab search results: how many are kept per worker, how long
+# they are served as fresh, and for how much longer a stale one is still served
+# while a single background query refreshes it. A TTL of 0 turns the cache off.
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2048"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "30"))
+SEARCH_CACHE_STALE_TTL = float(os.getenv("SEARCH_CACHE_STALE_TTL", "300"))
+
+_MISSING = object()
+
+class TTLCache:
+    """
+    A bounded, thread-safe LRU cache whose entries expire `ttl` seconds after being set.
+
+    Caches are per process: with several workers each one holds its own copy,
+    so invalidation only reaches the local worker and the TTL bounds staleness elsewhere.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value); least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING or entry[0] <= time.monotonic():
+                if entry is not _MISSING:
+                    del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+class AsyncLoadingCache:
+    """
+    A bounded LRU cache of async results, for data that many requests ask for at
+    once. get(key, load) returns:
+    - a fresh entry (younger than `ttl`) as is;
+    - a stale one (within `stale_ttl` after that) as is, while one background
+      load() replaces it (stale-while-revalidate);
+    - otherwise load()'s result, with concurrent callers of the same key
+      awaiting the same call, so a burst of identical misses runs one query.
+    Failed loads are not cached; a failed refresh leaves the stale entry to be
+    retried by the next request. A load that started before an invalidation
+    still answers its callers but isn't stored.
+
+    Unlike TTLCache this is not thread-safe: use it from the event loop only.
+    Values are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, maxsize=1024, ttl=30.0, stale_ttl=300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict()  # key -> (fresh_until, value); least recently used first
+        self._loading = {}          # key -> asyncio.Task of the load in flight
+        self._generation = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    async def get(self, key, load):
+        if self.ttl <= 0:
+            return await load()
+        entry = self._data.get(key)
+        if entry is not None:
+            fresh_until, value = entry
+            now = time.monotonic()
+            if now < fresh_until + self.stale_ttl:
+                self._data.move_to_end(key)
+                if now < fresh_until:
+                    self.hits += 1
+                else:
+                    self.stale_hits += 1
+                    if key not in self._loading:
+                        self.refreshes += 1
+                        self._load(key, load, background=True)
+                return value
+            del self._data[key]
+        task = self._loading.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = self._load(key, load)
+        # Shielded so a caller that gives up (a client disconnect, the /search
+        # deadline) doesn't cancel the query the other callers are waiting on.
+        return await asyncio.shield(task)
+
+    def _load(self, key, load, background=False):
+        generation = self._generation
+        task = asyncio.ensure_future(load())
+        self._loading[key] = task
+        task.add_done_callback(lambda done: self._loaded(key, generation, done, background))
+        return task
+
+    def _loaded(self, key, generation, task, background):
+        if self._loading.get(key) is task:
+            del self._loading[key]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self.errors += 1
+            if background:
+                print(f"Error refreshing cached {key!r}: {task.exception()}")
+            return
+        if generation == self._generation:
+            self._data[key] = (time.monotonic() + self.ttl, task.result())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate_where(self, predicate):
+        """Drops every entry whose key matches, and stops loads in flight from being stored."""
+        self._generation += 1
+        for key in [key for key in self._data if predicate(key)]:
+            del self._data[key]
+
+    def clear(self):
+        self.invalidate_where(lambda key: True)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "stale_hits": self.stale_hits,
+                "misses": self.misses, "coalesced": self.coalesced, "refreshes": self.refreshes,
+                "errors": self.errors, "loading": len(self._loading)}
+
+# Authenticated users keyed by user id (or email for tokens issued without one).
+# Rows never include hashed_password.
+principals = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+
+def invalidate_principal(user):
+    """Drops every cache key a user row can be found under."""
+    if user:
+        principals.invalidate(str(user['id']), user.get('email'))
+
+# Rendered article feed pages and bodies (responses.RenderedJSON), keyed by request.
+articles = TTLCache(maxsize=512, ttl=ARTICLES_CACHE_TTL)
+
+def invalidate_articles():
+    """Call after articles are created, edited or (un)published."""
+    articles.clear()
+
+# Rows of the public per-type searches (search.search_type), keyed by
+# (type, normalized query, limit, paging). events.DirectoryChanges clears them
+# when the directory tables change, in any process.
+search_results = AsyncLoadingCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL, stale_ttl=SEARCH_CACHE_STALE_TTL)
+
+def invalidate_search(*kinds):
+    """Drops cached search results of the given types (doctor, pharmacy, lab), or of all types."""
+    if kinds:
+        search_results.invalidate_where(lambda key: key[0] in kinds)
+    else:
+        search_results.clear()
@@ -0,0 +1,75 @@
+import inspect
+import anyio
+from starlette.concurrency import run_in_threadpool
+from database import DB_DRIVER
+import metrics
+import tracing
+
+# Routes and auth dependencies await `db` from here rather than importing a
+# driver module directly, so DB_DRIVER can switch implementations without
+# touching route code. It is also where every data-access call is instrumented
+# (see metrics.py) when METRICS_ENABLED is on.
+
+class ThreadedActions:
+    """
+    Exposes a sync actions module (db_actions) with the async API of
+    async_db_actions by running every call on Starlette's threadpool.
+    """
+
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, name):
+        func = getattr(self._module, name)
+        if not callable(func):
+            return func
+        if inspect.isgeneratorfunction(func):
+            call = lambda *args, **kwargs: _iterate_in_threadpool(func(*args, **kwargs))
+            setattr(self, name, call)
+            return call
+        if metrics.METRICS_ENABLED:
+            func = metrics.instrument_db_call(name, func)
+        if tracing.TRACING_ENABLED:
+            func = tracing.bind_to_request(func)
+
+        async def call(*args, **kwargs):
+            return await run_in_threadpool(func, *args, **kwargs)
+        call.__name__ = name
+        setattr(self, name, call)
+        return call
+
+_DONE = object()
+
+async def _iterate_in_threadpool(iterator):
+    # Each step of a sync generator runs on the threadpool, and the generator is
+    # closed there too (releasing its connection) even if the consumer stops early.
+    try:
+        while True:
+            item = await run_in_threadpool(next, iterator, _DONE)
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        with anyio.CancelScope(shield=True):
+            await run_in_threadpool(iterator.close)
+
+class InstrumentedActions:
+    """Exposes an async actions module (async_db_actions) with every call instrumented."""
+
+    def __init__(self, module):
+        self._module = module
+
+    def __getattr__(self, name):
+        func = getattr(self._module, name)
+        if not callable(func) or inspect.isasyncgenfunction(func):
+            return func
+        call = metrics.instrument_async_db_call(name, func)
+        setattr(self, name, call)
+        return call
+
+if DB_DRIVER == "async":
+    import async_db_actions
+    db = InstrumentedActions(async_db_actions) if metrics.METRICS_ENABLED else async_db_actions
+else:
+    import db_actions
+    db = ThreadedActions(db_actions)
@@ -1,16 +1,730 @@
 import os
+import asyncio
+import itertools
+import re
+import threading
+import time
+import weakref
+from contextlib import contextmanager, asynccontextmanager
+from contextvars import ContextVar
+import anyio
 import psycopg2
+import psycopg2.extensions
 from dotenv import load_dotenv
 
+from cache import TTLCache
+
 load_dotenv()
+# The primary: every write, and every read when no replica is configured or usable.
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-def get_db_connection():
-    """Establishes and returns a new connection to the local PostgreSQL database."""
+# --- Pool Configuration ---
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "5"))
+# Connections idle for longer than this are pinged before being handed out.
+DB_POOL_HEALTH_CHECK_AFTER = float(os.getenv("DB_POOL_HEALTH_CHECK_AFTER", "30"))
+# Connections older than this are closed and replaced when returned to the pool.
+DB_POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "1800"))
+# "sync" runs db_actions (psycopg2) on the threadpool; "async" uses async_db_actions (psycopg 3).
+DB_DRIVER = os.getenv("DB_DRIVER", "sync").lower()
+# Run the patient writes as server-side prepared statements, prepared once per
+# connection. Turn off behind a pooler in transaction mode (e.g. PgBouncer),
+# where a connection's prepared statements don't follow the client.
+DB_PREPARE_WRITES = os.getenv("DB_PREPARE_WRITES", "true").lower() == "true"
+
+# --- Replica Configuration ---
+# Comma-separated DSNs of read replicas, each with its own pool. Reads that can
+# tolerate a little lag (public search and pages, patient history) go to them.
+DATABASE_REPLICA_URLS = [url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()]
+# A replica that can't be reached, or lags by more than REPLICA_MAX_LAG_SECONDS,
+# is skipped for REPLICA_RETRY_SECONDS; its reads fail over to the primary.
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "10"))
+# How often a replica's lag is measured, on one of its checked-out connections.
+REPLICA_LAG_CHECK_SECONDS = float(os.getenv("REPLICA_LAG_CHECK_SECONDS", "5"))
+# Replica checkouts give up sooner than primary ones, since the primary is the fallback.
+REPLICA_ACQUIRE_TIMEOUT = float(os.getenv("REPLICA_ACQUIRE_TIMEOUT", "1"))
+# After a patient's own booking, cancellation, review or profile update, their
+# reads stay on the primary this long so they see their change. Pins are kept
+# per worker process, so with several workers use sticky sessions or keep this
+# above the replicas' usual lag.
+PRIMARY_PIN_SECONDS = float(os.getenv("PRIMARY_PIN_SECONDS", "10"))
+
+# --- Statement Observers ---
+# Callables run after every SQL statement, on both drivers, as
+# observer(query, params, seconds, rowcount); e.g. the benchmarks count queries
+# per request with one. While none are registered, cursors are not wrapped.
+statement_observers = []
+# Callables run as observer(seconds) each time a connection is checked out of either pool.
+acquire_observers = []
+
+def _notify_observers(query, params, seconds, rowcount):
+    for observer in statement_observers:
+        observer(query, params, seconds, rowcount)
+
+_observed_cursor_classes = {}
+
+def _observed_cursor_class(cursor_class):
+    """A subclass of a psycopg2 cursor class whose execute() reports to the observers."""
+    observed = _observed_cursor_classes.get(cursor_class)
+    if observed is None:
+        def execute(self, query, vars=None):
+            start = time.perf_counter()
+            try:
+                return cursor_class.execute(self, query, vars)
+            finally:
+                _notify_observers(query, vars, time.perf_counter() - start, self.rowcount)
+        observed = type(f"Observed{cursor_class.__name__}", (cursor_class,), {"execute": execute})
+        _observed_cursor_classes[cursor_class] = observed
+    return observed
+
+class ObservedConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()  # names of the statements PREPAREd on this connection
+        self.begin_pending = False  # write_transaction() opened; its BEGIN goes out with the next statement
+
+    def cursor(self, *args, **kwargs):
+        if statement_observers:
+            cursor_class = kwargs.get("cursor_factory") or self.cursor_factory or psycopg2.extensions.cursor
+            kwargs["cursor_factory"] = _observed_cursor_class(cursor_class)
+        return super().cursor(*args, **kwargs)
+
+# --- Prepared Statements ---
+# psycopg2 interpolates parameters client-side, so every execute() is parsed and
+# planned by the server again. execute_prepared() instead PREPAREs a statement
+# once per connection and from then on sends only EXECUTE name(values).
+# (psycopg 3 prepares natively: async_db_actions passes prepare=DB_PREPARE_WRITES.)
+
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+_prepared_forms = {}
+
+def _prepared_form(query):
+    """`query` with its %s / %(name)s placeholders numbered $1, $2, ..., and the
+    parameter names in that order (None for positional parameters)."""
+    form = _prepared_forms.get(query)
+    if form is None:
+        names, count = [], itertools.count(1)
+
+        def number(match):
+            if match.group(0) == "%%":
+                return "%"  # PREPARE is sent without parameters, so nothing unescapes it
+            if match.group(1) is None:
+                names.append(None)
+                return f"${next(count)}"
+            if match.group(1) not in names:
+                names.append(match.group(1))
+                next(count)
+            return f"${names.index(match.group(1)) + 1}"
+
+        sql = _PLACEHOLDER.sub(number, query).strip().rstrip(";")
+        form = _prepared_forms[query] = (sql, names)
+    return form
+
+def _begin_pending(conn):
+    """"BEGIN; " if `conn` has a write_transaction() waiting to start, which it is from now on."""
+    if not getattr(conn, "begin_pending", False):
+        return ""
+    conn.begin_pending = False
+    return "BEGIN; "
+
+def execute_prepared(cur, name, query, params=(), commit=False):
+    """
+    Runs `query` on `cur` as the prepared statement `name`, PREPAREd on the
+    cursor's connection the first time (one extra round trip per connection).
+    With DB_PREPARE_WRITES off it is a plain cur.execute(query, params).
+    Inside write_transaction() the first statement carries its BEGIN, and
+    commit=True sends the COMMIT along, so neither costs a round trip.
+    """
+    conn = cur.connection
+    end = " COMMIT;" if commit else ""
+    if not DB_PREPARE_WRITES or not isinstance(conn, ObservedConnection):
+        return cur.execute(f"{_begin_pending(conn)}{query.strip().rstrip(';')};{end}", params)
+    sql, names = _prepared_form(query)
+    if name not in conn.prepared:
+        # PREPARE isn't undone by a ROLLBACK, so it may open a write transaction.
+        cur.execute(f"{_begin_pending(conn)}PREPARE {name} AS {sql};")
+        conn.prepared.add(name)
+    values = [params[key] for key in names] if isinstance(params, dict) else list(params)
+    if values:
+        cur.execute(f"{_begin_pending(conn)}EXECUTE {name}({', '.join(['%s'] * len(values))});{end}", values)
+    else:
+        cur.execute(f"{_begin_pending(conn)}EXECUTE {name};{end}")
+
+def get_db_connection(dsn=None, **kwargs):
+    """Establishes and returns a new connection to the primary (or `dsn`)."""
     try:
-        conn = psycopg2.connect(DATABASE_URL)
+        conn = psycopg2.connect(dsn or DATABASE_URL, connection_factory=ObservedConnection, **kwargs)
         return conn
     except Exception as e:
         print("!!! DATABASE CONNECTION FAILED !!!")
         print(f"Error: {e}")
         raise
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the acquire timeout."""
+
+class ConnectionPool:
+    """
+    A bounded, thread-safe pool of psycopg2 connections.
+
+    Connections are opened lazily up to `max_size`. Callers block for at most
+    `acquire_timeout` seconds when the pool is exhausted. Idle connections are
+    pinged on checkout, and broken or expired connections are replaced.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, acquire_timeout=5.0,
+                 health_check_after=30.0, max_lifetime=1800.0):
+        if max_size < 1 or not 0 <= min_size <= max_size:
+            raise ValueError("Pool sizes must satisfy 0 <= min_size <= max_size and max_size >= 1")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.health_check_after = health_check_after
+        self.max_lifetime = max_lifetime
+        self._idle = []        # stack of (conn, returned_at); most recently used on top
+        self._created_at = {}  # id(conn) -> creation time for every open connection
+        self._size = 0         # open connections plus connections being opened
+        self._cond = threading.Condition()
+        self._closed = False
+        for _ in range(min_size):
+            conn = self._connect()
+            self._created_at[id(conn)] = time.monotonic()
+            self._idle.append((conn, time.monotonic()))
+            self._size += 1
+
+    def _discard(self, conn):
+        """Closes a connection and frees its slot. Caller must hold the lock."""
+        self._created_at.pop(id(conn), None)
+        self._size -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn, returned_at):
+        if conn.closed:
+            return False
+        if time.monotonic() - returned_at < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1;")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def getconn(self, timeout=None):
+        """Checks out a healthy connection, opening a new one if the pool has room."""
+        timeout = self.acquire_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed.")
+                    if self._idle:
+                        conn, returned_at = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        # Claim the slot before connecting so other threads respect max_size.
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(f"Timed out after {timeout:.1f}s waiting for a database connection.")
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._created_at[id(conn)] = time.monotonic()
+                return conn
+
+            # Health checks run outside the lock so a slow ping doesn't stall other callers.
+            if self._is_healthy(conn, returned_at):
+                return conn
+            with self._cond:
+                self._discard(conn)
+                self._cond.notify()
+
+    def putconn(self, conn):
+        """Returns a connection to the pool, rolling back any open transaction."""
+        broken = conn.closed
+        if not broken and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+        with self._cond:
+            expired = time.monotonic() - self._created_at.get(id(conn), 0) > self.max_lifetime
+            if broken or expired or self._closed:
+                self._discard(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                self._discard(self._idle.pop()[0])
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {"size": self._size, "idle": len(self._idle), "max_size": self.max_size}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Returns the process-wide pool, creating it on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    get_db_connection,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_POOL_MAX_SIZE,
+                    acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT,
+                    health_check_after=DB_POOL_HEALTH_CHECK_AFTER,
+                    max_lifetime=DB_POOL_MAX_LIFETIME,
+                )
+    return _pool
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+        for replica in _replicas:
+            if replica.pool is not None:
+                replica.pool.closeall()
+                replica.pool = None
+
+def warm_pools(size):
+    """
+    Opens connections until the primary pool, and each replica's, holds `size`
+    (capped at DB_POOL_MAX_SIZE), so the first requests don't pay for connecting.
+    """
+    for name, pool in [("primary", get_pool())] + [(r.name, r.get_pool()) for r in _replicas]:
+        conns = []
+        try:
+            for _ in range(min(size, pool.max_size)):
+                conns.append(pool.getconn())
+        except Exception as e:
+            print(f"Could not pre-open connections to {name}: {e}")
+        finally:
+            for conn in conns:
+                pool.putconn(conn)
+
+# --- Replica Routing ---
+
+# 0 on the primary and on a replica that has replayed everything it received.
+REPLICA_LAG_QUERY = """
+    SELECT CASE WHEN pg_last_wal_receive_lsn() IS NOT DISTINCT FROM pg_last_wal_replay_lsn() THEN 0
+                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END;
+"""
+
+class Replica:
+    """One replica DSN, its (lazily created) pools and its health."""
+
+    def __init__(self, index, dsn):
+        self.name = f"replica-{index}"
+        self.dsn = dsn
+        self.pool = None
+        self.async_pool = None
+        self.down_until = 0.0
+        self.lag_checked_at = 0.0
+
+    def available(self):
+        return time.monotonic() >= self.down_until
+
+    def mark_down(self, reason):
+        print(f"Database {self.name} skipped for {REPLICA_RETRY_SECONDS:.0f}s, reads fail over to the primary: {reason}")
+        self.down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+
+    def lag_check_due(self):
+        """True for one caller every REPLICA_LAG_CHECK_SECONDS."""
+        now = time.monotonic()
+        if now - self.lag_checked_at < REPLICA_LAG_CHECK_SECONDS:
+            return False
+        self.lag_checked_at = now
+        return True
+
+    def get_pool(self):
+        if self.pool is None:
+            with _pool_lock:
+                if self.pool is None:
+                    self.pool = ConnectionPool(
+                        lambda: get_db_connection(self.dsn, connect_timeout=max(1, round(REPLICA_ACQUIRE_TIMEOUT))),
+                        min_size=0,
+                        max_size=DB_POOL_MAX_SIZE,
+                        acquire_timeout=REPLICA_ACQUIRE_TIMEOUT,
+                        health_check_after=DB_POOL_HEALTH_CHECK_AFTER,
+                        max_lifetime=DB_POOL_MAX_LIFETIME,
+                    )
+        return self.pool
+
+_replicas = [Replica(i, dsn) for i, dsn in enumerate(DATABASE_REPLICA_URLS)]
+_replica_turn = itertools.count()
+
+# User ids whose reads must stay on the primary for now (see PRIMARY_PIN_SECONDS).
+_pinned_users = TTLCache(maxsize=100000, ttl=PRIMARY_PIN_SECONDS)
+
+def pin_to_primary(user_id):
+    """Call after a user's own write commits, so their next reads see it."""
+    if _replicas:
+        _pinned_users.set(str(user_id), True)
+
+def _use_replica(read_only, user_id):
+    return read_only and _replicas and not (user_id is not None and _pinned_users.get(str(user_id)))
+
+def _replica_candidates():
+    """Available replicas, starting from a different one each call."""
+    available = [replica for replica in _replicas if replica.available()]
+    if not available:
+        return []
+    first = next(_replica_turn) % len(available)
+    return available[first:] + available[:first]
+
+def _checkout_replica():
+    """(pool, connection) from the first healthy replica, or (None, None)."""
+    for replica in _replica_candidates():
+        pool = replica.get_pool()
+        try:
+            conn = pool.getconn()
+        except PoolTimeout:
+            # Every connection is in use: the replica is busy, not down. Only this
+            # read falls back to the primary.
+            continue
+        except Exception as e:
+            replica.mark_down(e)
+            continue
+        if replica.lag_check_due():
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(REPLICA_LAG_QUERY)
+                    lag = float(cur.fetchone()[0])
+                conn.rollback()
+            except Exception as e:
+                pool.putconn(conn)
+                replica.mark_down(e)
+                continue
+            if lag > REPLICA_MAX_LAG_SECONDS:
+                pool.putconn(conn)
+                replica.mark_down(f"{lag:.1f}s behind the primary")
+                continue
+        return pool, conn
+    return None, None
+
+@contextmanager
+def get_connection(read_only=False, user_id=None, autocommit=False):
+    """
+    Checks a connection out of the pool for the duration of the block.
+    read_only=True lets a healthy replica serve it, unless `user_id` is pinned
+    to the primary by a recent write of their own.
+    autocommit=True commits each statement as it runs, saving the BEGIN and
+    COMMIT round trips; for writes that are a single statement. Inside
+    write_transaction() it yields the transaction's connection instead.
+    Uncommitted work is rolled back when the connection is returned.
+    """
+    transaction = _transaction.get()
+    if autocommit and transaction is not None:
+        yield transaction
+        return
+    start = time.perf_counter()
+    pool, conn = _checkout_replica() if _use_replica(read_only, user_id) else (None, None)
+    if conn is None:
+        pool = get_pool()
+        conn = pool.getconn()
+    for observer in acquire_observers:
+        observer(time.perf_counter() - start)
+    try:
+        if autocommit:
+            conn.autocommit = True
+        yield conn
+    finally:
+        if autocommit and not conn.closed:
+            try:
+                conn.autocommit = False
+            except psycopg2.Error:
+                conn.close()  # so the pool replaces it rather than handing it out in autocommit
+        pool.putconn(conn)
+
+# --- Async Pool (psycopg 3) ---
+# psycopg 3 is only imported when DB_DRIVER=async, so the sync deployment doesn't need it installed.
+
+_async_pool = None
+_async_pool_lock = asyncio.Lock()
+
+_observed_async_cursor = None
+
+def _observed_async_cursor_class():
+    """The psycopg 3 counterpart of _observed_cursor_class(), created on first use."""
+    global _observed_async_cursor
+    if _observed_async_cursor is None:
+        from psycopg import AsyncCursor
+
+        class ObservedAsyncCursor(AsyncCursor):
+            async def execute(self, query, params=None, **kwargs):
+                if not statement_observers:
+                    return await super().execute(query, params, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return await super().execute(query, params, **kwargs)
+                finally:
+                    _notify_observers(query, params, time.perf_counter() - start, self.rowcount)
+
+        _observed_async_cursor = ObservedAsyncCursor
+    return _observed_async_cursor
+
+async def _configure_async_connection(conn):
+    # Match psycopg2's behaviour of returning UUID columns as strings,
+    # so both drivers produce identical rows for the response models.
+    from psycopg.types.string import TextLoader
+    conn.adapters.register_loader("uuid", TextLoader)
+    conn.cursor_factory = _observed_async_cursor_class()
+
+# When each connection was last returned to its async pool.
+_async_returned_at = weakref.WeakKeyDictionary()
+
+async def _check_async_connection(conn):
+    # Like the sync pool, only ping connections that sat idle for a while; pinging
+    # on every checkout cost an extra round trip per data-access call.
+    returned_at = _async_returned_at.get(conn)
+    if returned_at is not None and time.monotonic() - returned_at >= DB_POOL_HEALTH_CHECK_AFTER:
+        from psycopg_pool import AsyncConnectionPool
+        await AsyncConnectionPool.check_connection(conn)
+
+async def _open_async_pool(dsn, min_size, timeout):
+    from psycopg_pool import AsyncConnectionPool
+    pool = AsyncConnectionPool(
+        dsn,
+        min_size=min_size,
+        max_size=DB_POOL_MAX_SIZE,
+        timeout=timeout,
+        max_lifetime=DB_POOL_MAX_LIFETIME,
+        configure=_configure_async_connection,
+        check=_check_async_connection,
+        open=False,
+    )
+    await pool.open()
+    return pool
+
+async def get_async_pool():
+    """Returns the process-wide async pool, opening it on first use."""
+    global _async_pool
+    if _async_pool is None:
+        async with _async_pool_lock:
+            if _async_pool is None:
+                _async_pool = await _open_async_pool(DATABASE_URL, DB_POOL_MIN_SIZE, DB_POOL_ACQUIRE_TIMEOUT)
+    return _async_pool
+
+async def _get_async_replica_pool(replica):
+    if replica.async_pool is None:
+        async with _async_pool_lock:
+            if replica.async_pool is None:
+                replica.async_pool = await _open_async_pool(replica.dsn, 0, REPLICA_ACQUIRE_TIMEOUT)
+    return replica.async_pool
+
+async def warm_async_pools(size):
+    """The async counterpart of warm_pools()."""
+    pools = [("primary", await get_async_pool())]
+    for replica in _replicas:
+        pools.append((replica.name, await _get_async_replica_pool(replica)))
+    for name, pool in pools:
+        results = await asyncio.gather(*(pool.getconn() for _ in range(min(size, pool.max_size))),
+                                       return_exceptions=True)
+        errors = [result for result in results if isinstance(result, Exception)]
+        if errors:
+            print(f"Could not pre-open connections to {name}: {errors[0]}")
+        for result in results:
+            if not isinstance(result, Exception):
+                await pool.putconn(result)
+
+async def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+    for replica in _replicas:
+        if replica.async_pool is not None:
+            await replica.async_pool.close()
+            replica.async_pool = None
+
+async def _checkout_async_replica():
+    """The async counterpart of _checkout_replica()."""
+    import psycopg_pool
+    for replica in _replica_candidates():
+        pool = await _get_async_replica_pool(replica)
+        connect_errors = pool.get_stats().get("connections_errors", 0)
+        try:
+            conn = await pool.getconn()
+        except psycopg_pool.PoolTimeout as e:
+            # psycopg_pool also times out when it can't connect. Without failed
+            # connection attempts meanwhile, the replica is busy rather than down,
+            # and only this read falls back to the primary.
+            if pool.get_stats().get("connections_errors", 0) > connect_errors:
+                replica.mark_down(e)
+            continue
+        except Exception as e:
+            replica.mark_down(e)
+            continue
+        if replica.lag_check_due():
+            try:
+                cur = await conn.execute(REPLICA_LAG_QUERY)
+                lag = float((await cur.fetchone())[0])
+                await conn.rollback()
+            except Exception as e:
+                await pool.putconn(conn)
+                replica.mark_down(e)
+                continue
+            if lag > REPLICA_MAX_LAG_SECONDS:
+                await pool.putconn(conn)
+                replica.mark_down(f"{lag:.1f}s behind the primary")
+                continue
+        return pool, conn
+    return None, None
+
+@asynccontextmanager
+async def get_async_connection(read_only=False, user_id=None, autocommit=False):
+    """
+    Async counterpart of get_connection(), backed by the psycopg 3 pools.
+    Uncommitted work is rolled back when the connection is returned.
+    """
+    import psycopg
+    import psycopg_pool
+    transaction = _transaction.get()
+    if autocommit and transaction is not None:
+        yield transaction
+        return
+    start = time.perf_counter()
+    pool, conn = await _checkout_async_replica() if _use_replica(read_only, user_id) else (None, None)
+    if conn is None:
+        pool = await get_async_pool()
+        try:
+            conn = await pool.getconn()
+        except psycopg_pool.PoolTimeout as e:
+            raise PoolTimeout(str(e)) from e
+    for observer in acquire_observers:
+        observer(time.perf_counter() - start)
+    try:
+        if autocommit:
+            await conn.set_autocommit(True)
+        yield conn
+    finally:
+        if conn.info.transaction_status != psycopg.pq.TransactionStatus.IDLE:
+            try:
+                await conn.rollback()
+            except psycopg.Error:
+                pass
+        if autocommit and not conn.closed:
+            try:
+                await conn.set_autocommit(False)
+            except psycopg.Error:
+                await conn.close()
+        _async_returned_at[conn] = time.monotonic()
+        await pool.putconn(conn)
+
+# --- Write Transactions ---
+# write_transaction() makes several data-access calls one transaction on one
+# primary connection: idempotency.respond commits a keyed write together with
+# the row recording its response this way. The writes need no changes; inside
+# the block get_connection(autocommit=True) and get_async_connection(autocommit=True)
+# hand out the transaction's connection.
+_transaction = ContextVar("transaction", default=None)
+
+def _commit(conn):
+    with conn.cursor() as cur:
+        cur.execute("COMMIT;")
+
+def _end_transaction(conn, checkout):
+    # psycopg2's rollback() does nothing in autocommit mode, so the ROLLBACK is sent here.
+    conn.begin_pending = False
+    if not conn.closed and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        try:
+            with conn.cursor() as cur:
+                cur.execute("ROLLBACK;")
+        except psycopg2.Error:
+            conn.close()
+    checkout.__exit__(None, None, None)
+
+@asynccontextmanager
+async def write_transaction():
+    """
+    Runs the writes made in the block as one transaction, committed when the
+    block completes and rolled back if it raises. BEGIN and COMMIT cost no round
+    trips of their own: psycopg2 sends BEGIN with the first execute_prepared()
+    statement (so writes in the block must use it) and COMMIT with one run as
+    execute_prepared(..., commit=True); psycopg 3 queues both in a pipeline
+    whose last sync commits.
+    """
+    if DB_DRIVER == "async":
+        import psycopg
+        async with get_async_connection(autocommit=True) as conn:
+            error = None
+            try:
+                async with conn.pipeline():
+                    await conn.execute("BEGIN")
+                    token = _transaction.set(conn)
+                    try:
+                        yield conn
+                    finally:
+                        _transaction.reset(token)
+                    try:
+                        await conn.execute("COMMIT")
+                    except psycopg.Error as e:
+                        # A queued statement failed before the COMMIT went out; the pipeline
+                        # then ends "aborted", and this is the error to report.
+                        error = e
+            except psycopg.errors.PipelineAborted:
+                if error is None:
+                    raise
+            if error is not None:
+                raise error
+        return
+    checkout = get_connection(autocommit=True)
+    conn = await anyio.to_thread.run_sync(checkout.__enter__)
+    conn.begin_pending = True
+    token = _transaction.set(conn)
+    try:
+        yield conn
+        if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            await anyio.to_thread.run_sync(_commit, conn)
+    finally:
+        _transaction.reset(token)
+        with anyio.CancelScope(shield=True):
+            await anyio.to_thread.run_sync(_end_transaction, conn, checkout)
+
+def pool_stats():
+    """{(pool, stat): value} for the primary and replica pools of the active driver."""
+    pools = [("primary", _async_pool if DB_DRIVER == "async" else _pool)]
+    pools += [(r.name, r.async_pool if DB_DRIVER == "async" else r.pool) for r in _replicas]
+    stats = {}
+    for name, pool in pools:
+        if pool is None:
+            continue
+        if DB_DRIVER == "async":
+            raw = pool.get_stats()
+            values = {"size": raw.get("pool_size", 0), "idle": raw.get("pool_available", 0),
+                      "waiting": raw.get("requests_waiting", 0), "max_size": pool.max_size}
+        else:
+            values = pool.stats()
+        stats.update({(name, key): value for key, value in values.items()})
+    for replica in _replicas:
+        stats[(replica.name, "available")] = int(replica.available())
+    return stats
@@ -1,251 +1,218 @@
 import uuid
 import psycopg2
 import psycopg2.extras
-from database import get_db_connection
+from database import get_connection, pin_to_primary, execute_prepared
+from cache import invalidate_principal
 from typing import List, Dict, Any
-import json
-from auth import get_password_hash # We need this for Google Sign-in user creation
+import queries as q
 
 # --- AUTH FUNCTIONS ---
 def get_user_by_email(email: str):
     """Fetches a single user by their email address."""
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            cur.execute("SELECT * FROM users WHERE email = %s;", (email,))
-            user = cur.fetchone()
-            return dict(user) if user else None
-    finally:
-        if conn: conn.close()
+    with get_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(q.GET_USER_BY_EMAIL, (email,))
+        user = cur.fetchone()
+        return user
+
+def get_user_by_id(user_id: uuid.UUID):
+    """Fetches a user's profile by id, without the password hash."""
+    with get_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(q.GET_USER_BY_ID, (str(user_id),))
+        user = cur.fetchone()
+        return user
 
 def create_new_user(full_name: str, email: str, hashed_password: str, role: str = 'patient'):
     """Creates a new user in the database with a *pre-hashed* password."""
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            sql = "INSERT INTO users (full_name, email, role, hashed_password) VALUES (%s, %s, %s, %s) RETURNING *;"
-            cur.execute(sql, (full_name, email, role, hashed_password))
-            new_user = cur.fetchone()
-            conn.commit()
-            return dict(new_user) if new_user else None
-    except psycopg2.errors.UniqueViolation:
-        conn.rollback(); return None
-    finally:
-        if conn: conn.close()
+    with get_connection(autocommit=True) as conn:
+        try:
+            with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+                execute_prepared(cur, "create_new_user", q.CREATE_NEW_USER, (full_name, email, role, hashed_password))
+                new_user = cur.fetchone()
+                invalidate_principal(new_user)
+                return new_user
+        except psycopg2.errors.UniqueViolation:
+            return None
 
 # --- PATIENT-SPECIFIC (PROTECTED) FUNCTIONS ---
 
 def get_patient_profile(user_id: uuid.UUID):
     """Fetches the profile details for a patient from the users table."""
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            sql = "SELECT id, full_name, email, phone_number, date_of_birth, sex, created_at, role FROM users WHERE id = %s AND role = 'patient';"
-            cur.execute(sql, (str(user_id),))
-            profile = cur.fetchone()
-            return dict(profile) if profile else None
-    finally:
-        if conn: conn.close()
+    with get_connection() as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(q.GET_PATIENT_PROFILE, (str(user_id),))
+        profile = cur.fetchone()
+        return profile
 
 def update_patient_profile(user_id: uuid.UUID, profile_data: Dict[str, Any]):
     """Updates a patient's profile details in the users table."""
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            sql = """
-                UPDATE users
-                SET full_name = %s, phone_number = %s, date_of_birth = %s, sex = %s
-                WHERE id = %s AND role = 'patient'
-                RETURNING id, full_name, email, phone_number, date_of_birth, sex, created_at, role;
-            """
-            cur.execute(sql, (
-                profile_data['full_name'],
-                profile_data.get('phone_number'),
-                profile_data.get('date_of_birth'),
-                profile_data.get('sex'),
-                str(user_id)
-            ))
-            updated_profile = cur.fetchone()
-            conn.commit()
-            return dict(updated_profile) if updated_profile else None
-    finally:
-        if conn: conn.close()
-
-def book_new_appointment(patient: Dict[str, Any], doctor_id: uuid.UUID, slot: str):
-    """Creates a new 'scheduled' appointment for the logged-in patient."""
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            cur.execute("SELECT user_id FROM doctors WHERE id = %s;", (str(doctor_id),))
-            doctor = cur.fetchone()
-            if not doctor:
-                return None # Doctor not found
-            
-            sql = """
-                INSERT INTO appointments (doctor_id, patient_id, patient_name, slot, status, doctor_user_id)
-                VALUES (%s, %s, %s, %s, 'scheduled', %s)
-                RETURNING *;
-            """
-            cur.execute(sql, (
-                str(doctor_id),
-                str(patient['id']),
-                patient['full_name'],
-                slot,
-                doctor['user_id']
-            ))
-            new_appt = cur.fetchone()
-            conn.commit()
-            return dict(new_appt) if new_appt else None
-    except Exception as e:
-        conn.rollback()
-        print(f"Error booking appointment: {e}")
-        return None
-    finally:
-        if conn: conn.close()
-
-def get_patient_appointments(user_id: uuid.UUID):
-    """Gets all of the logged-in patient's appointments (past and future)."""
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            # --- THIS IS THE FIX ---
-            # Explicitly select a.user_id (which is the same as a.patient_id)
-            # to prevent a crash when the frontend tries to read it.
-            sql = """
-                SELECT a.*, a.patient_id as user_id, d.name as doctor_name
-                FROM appointments a
-                LEFT JOIN doctors d ON a.doctor_id = d.id
-                WHERE a.patient_id = %s
-                ORDER BY a.slot DESC;
-            """
-            # Note: The database stores the patient's ID in 'patient_id' and 'user_id'
-            # in the appointments table. We are ensuring the column is selected.
-            cur.execute(sql, (str(user_id),))
-            results = cur.fetchall()
-            return [dict(row) for row in results]
-    finally:
-        if conn: conn.close()
+    with get_connection(autocommit=True) as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        execute_prepared(cur, "update_patient_profile", q.UPDATE_PATIENT_PROFILE, q.profile_update_params(user_id, profile_data))
+        updated_profile = cur.fetchone()
+        invalidate_principal(updated_profile)
+        pin_to_primary(user_id)
+        return updated_profile
+
+def book_new_appointment(patient: Dict[str, Any], doctor_id: uuid.UUID, slot):
+    """
+    Claims one of the doctor's open slots and creates a 'scheduled' appointment in it.
+    Returns None if the doctor has no such open slot (unknown, past or already taken).
+    """
+    with get_connection(autocommit=True) as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        execute_prepared(cur, "book_appointment", q.BOOK_APPOINTMENT, q.booking_params(patient, doctor_id, slot))
+        new_appt = cur.fetchone()
+        if new_appt:
+            pin_to_primary(patient['id'])
+        return new_appt
+
+def get_patient_appointments(user_id: uuid.UUID, limit: int = 50, after=None, when=None, start=None, end=None):
+    """Gets a page of the logged-in patient's appointments (see queries.patient_appointments)."""
+    with get_connection(read_only=True, user_id=user_id) as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        # Note: The database stores the patient's ID in 'patient_id' and 'user_id'
+        # in the appointments table. We are ensuring the column is selected.
+        cur.execute(*q.patient_appointments(user_id, limit, after, when, start, end))
+        results = cur.fetchall()
+        return results
 
 def cancel_appointment(appointment_id: uuid.UUID, user_id: uuid.UUID):
-    """Cancels one of the patient's own appointments."""
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            sql = """
-                UPDATE appointments
-                SET status = 'cancelled'
-                WHERE id = %s AND patient_id = %s AND status = 'scheduled'
-                RETURNING *;
-            """
-            cur.execute(sql, (str(appointment_id), str(user_id)))
-            result = cur.fetchone()
-            conn.commit()
-            return dict(result) if result else None
-    finally:
-        if conn: conn.close()
-
-def get_patient_medical_records(user_id: uuid.UUID):
-    """Gets all of the logged-in patient's past prescriptions."""
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            sql = "SELECT * FROM prescriptions WHERE patient_id = %s ORDER BY created_at DESC;"
-            cur.execute(sql, (str(user_id),))
-            results = cur.fetchall()
-            return [dict(row) for row in results]
-    finally:
-        if conn: conn.close()
+    """Cancels one of the patient's own appointments and frees its slot."""
+    with get_connection(autocommit=True) as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        execute_prepared(cur, "cancel_appointment", q.CANCEL_APPOINTMENT, (str(appointment_id), str(user_id)))
+        result = cur.fetchone()
+        if result:
+            pin_to_primary(user_id)
+        return result
+
+def get_patient_medical_records(user_id: uuid.UUID, limit: int = 20, after=None, start=None, end=None):
+    """Gets a page of the logged-in patient's past prescriptions, newest first."""
+    with get_connection(read_only=True, user_id=user_id) as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(*q.patient_medical_records(user_id, limit, after, start, end))
+        results = cur.fetchall()
+        return results
+
+def iter_patient_medical_records(user_id: uuid.UUID, batch_size: int = 500):
+    """
+    Yields every one of the patient's prescriptions, newest first, in lists of up
+    to `batch_size`. Rows are read through a server-side cursor, so only one batch
+    is ever in memory; the connection is held until the generator is exhausted or closed.
+    """
+    with get_connection(read_only=True, user_id=user_id) as conn:
+        with conn.cursor(name="export_medical_records", cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute(q.EXPORT_PATIENT_MEDICAL_RECORDS, (str(user_id),))
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield rows
+
+def get_pending_reviews(user_id: uuid.UUID, limit: int = 5):
+    """Gets the patient's latest completed appointments that have no review yet."""
+    with get_connection(read_only=True, user_id=user_id) as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(q.GET_PENDING_REVIEWS, (str(user_id), limit))
+        return cur.fetchall()
 
 def add_doctor_review(user_id: uuid.UUID, review_data: Dict[str, Any]):
-    """Submits a new review for a doctor."""
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            sql = """
-                INSERT INTO doctor_reviews (doctor_id, patient_id, appointment_id, rating, comment)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (patient_id, appointment_id) DO UPDATE 
-                SET rating = EXCLUDED.rating, comment = EXCLUDED.comment
-                RETURNING *;
-            """
-            cur.execute(sql, (
-                str(review_data['doctor_id']),
-                str(user_id),
-                str(review_data['appointment_id']),
-                review_data['rating'],
-                review_data.get('comment')
-            ))
-            new_review = cur.fetchone()
-            conn.commit()
-            return dict(new_review) if new_review else None
-    except Exception as e:
-        conn.rollback(); print(f"Error adding review: {e}"); return None
-    finally:
-        if conn: conn.close()
+    """
+    Submits (or updates) the patient's review of one of their completed appointments.
+    Returns None if the appointment isn't theirs, isn't with that doctor or isn't completed.
+    """
+    with get_connection(autocommit=True) as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        execute_prepared(cur, "upsert_doctor_review", q.UPSERT_DOCTOR_REVIEW, q.review_params(user_id, review_data))
+        new_review = cur.fetchone()
+        if new_review:
+            pin_to_primary(user_id)
+        return new_review
+
+def reconcile_doctor_rating_stats():
+    """Recomputes doctor_rating_stats from doctor_reviews. Returns how many doctors were corrected."""
+    with get_connection() as conn, conn.cursor() as cur:
+        cur.execute(q.LOCK_DOCTOR_REVIEWS)
+        cur.execute(q.RECONCILE_DOCTOR_RATING_STATS)
+        corrected = cur.fetchone()[0]
+        conn.commit()
+        return corrected
+
+# --- IDEMPOTENCY KEYS ---
+
+def store_idempotent_response(user_id: uuid.UUID, key: str, route: str, request_hash: str,
+                              status_code: int, response: str):
+    """
+    Records a keyed write's response and commits its write_transaction in the same
+    round trip. Raises UniqueViolation if the key is already taken.
+    """
+    with get_connection(autocommit=True) as conn, conn.cursor() as cur:
+        execute_prepared(cur, "store_idempotent_response", q.STORE_IDEMPOTENT_RESPONSE, {
+            "user_id": str(user_id), "key": key, "route": route, "request_hash": request_hash,
+            "status_code": status_code, "response": response,
+        }, commit=True)
+
+def get_idempotent_response(user_id: uuid.UUID, key: str, expire_after: float):
+    """The key's stored response, or None if it has none (see queries.GET_IDEMPOTENT_RESPONSE)."""
+    with get_connection(autocommit=True) as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        execute_prepared(cur, "get_idempotent_response", q.GET_IDEMPOTENT_RESPONSE,
+                         {"user_id": str(user_id), "key": key, "expire_after": expire_after})
+        return cur.fetchone()
+
+def purge_idempotency_keys(older_than: float):
+    """Deletes keys stored more than `older_than` seconds ago. Returns how many."""
+    with get_connection(autocommit=True) as conn, conn.cursor() as cur:
+        cur.execute(q.PURGE_IDEMPOTENCY_KEYS, (older_than,))
+        return cur.rowcount
 
 # --- PUBLIC FUNCTIONS ---
 
-def search_doctors(query: str):
-    """Searches for doctors by name or specialty and includes average rating."""
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            sql = """
-                SELECT 
-                    d.id, d.name, d.specialty, d.experience, d.bio, d.available_slots, c.name as clinic_name,
-                    COALESCE(AVG(r.rating), 0) as average_rating,
-                    COUNT(r.id) as review_count
-                FROM doctors d
-                LEFT JOIN clinics c ON d.clinic_id = c.id
-                LEFT JOIN doctor_reviews r ON d.id = r.doctor_id
-            """
-            params = []
-            
-            if query:
-                sql += " WHERE d.name ILIKE %s OR d.specialty ILIKE %s"
-                search_query = f"%{query}%"
-                params.extend([search_query, search_query])
-            
-            sql += " GROUP BY d.id, c.name ORDER BY d.name LIMIT 20;"
-            
-            cur.execute(sql, params)
-            results = cur.fetchall()
-            return [
-                {**dict(row), "average_rating": float(row["average_rating"])} 
-                for row in results
-            ]
-    finally:
-        if conn: conn.close()
-
-def get_all_articles():
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            sql = "SELECT * FROM articles WHERE published_at IS NOT NULL ORDER BY published_at DESC;"
-            cur.execute(sql)
-            results = cur.fetchall()
-            return [dict(row) for row in results]
-    finally:
-        if conn: conn.close()
-
-def search_pharmacies(query: str):
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            sql = "SELECT id, name, address, phone_number FROM pharmacies WHERE name ILIKE %s AND is_active = TRUE LIMIT 10;"
-            cur.execute(sql, (f"%{query}%",))
-            results = cur.fetchall()
-            return [dict(row) for row in results]
-    finally:
-        if conn: conn.close()
-
-def search_labs(query: str):
-    conn = get_db_connection()
-    try:
-        with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
-            sql = "SELECT id, name, address, phone_number FROM labs WHERE name ILIKE %s AND is_active = TRUE LIMIT 10;"
-            cur.execute(sql, (f"%{query}%",))
-            results = cur.fetchall()
-            return [dict(row) for row in results]
-    finally:
-        if conn: conn.close()
+def search_doctors(query: str, limit: int = 20, offset: int = 0, after=None):
+    """
+    Searches for doctors by name or specialty, best matches first, and includes average rating.
+    Page with `offset`, or with `after` = (rank, id) of the last row already returned.
+    """
+    with get_connection(read_only=True) as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(*q.search_doctors(query, limit, offset, after))
+        results = cur.fetchall()
+        return [
+            {**row, "average_rating": float(row["average_rating"])}
+            for row in results
+        ]
+
+def get_doctor(doctor_id: uuid.UUID):
+    """Fetches one doctor's public profile with precomputed rating stats."""
+    with get_connection(read_only=True) as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(q.GET_DOCTOR, (str(doctor_id),))
+        row = cur.fetchone()
+        return {**row, "average_rating": float(row["average_rating"])} if row else None
+
+def get_doctor_index_rows(since=None):
+    """Fetches doctor names for the typeahead index, optionally only those changed after `since`."""
+    with get_connection(read_only=True) as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        if since is None:
+            cur.execute(q.GET_DOCTOR_INDEX_ROWS)
+        else:
+            cur.execute(q.GET_DOCTOR_INDEX_ROWS_SINCE, (since,))
+        results = cur.fetchall()
+        return results
+
+def get_article_summaries(limit: int = 20, after=None):
+    """Gets a page of published article summaries, newest first."""
+    with get_connection(read_only=True) as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(*q.article_summaries(limit, after))
+        results = cur.fetchall()
+        return results
+
+def get_article(article_id: uuid.UUID):
+    """Gets one published article with its full content."""
+    with get_connection(read_only=True) as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(q.GET_ARTICLE, (str(article_id),))
+        article = cur.fetchone()
+        return article
+
+def search_pharmacies(query: str, limit: int = 10):
+    """Active pharmacies whose name contains the query, best matches first, with their `rank`."""
+    with get_connection(read_only=True) as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(q.SEARCH_PHARMACIES, q.name_search_params(query, limit))
+        results = cur.fetchall()
+        return results
+
+def search_labs(query: str, limit: int = 10):
+    """Active labs whose name contains the query, best matches first, with their `rank`."""
+    with get_connection(read_only=True) as conn, conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.execute(q.SEARCH_LABS, q.name_search_params(query, limit))
+        results = cur.fetchall()
+        return results
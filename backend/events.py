@@ -0,0 +1,197 @@
+import os
+import asyncio
+import json
+import select
+import threading
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+import cache
+import database
+
+load_dotenv()
+
+# --- Configuration ---
+# Idle event streams get a comment line this often, so proxies keep them open.
+APPOINTMENT_EVENTS_HEARTBEAT = float(os.getenv("APPOINTMENT_EVENTS_HEARTBEAT", "15"))
+# Deltas buffered per stream; a client that falls further behind is sent a resync instead.
+APPOINTMENT_EVENTS_QUEUE_SIZE = int(os.getenv("APPOINTMENT_EVENTS_QUEUE_SIZE", "100"))
+
+CHANNEL = "appointment_events"  # see migrations/007_appointment_events.sql
+DIRECTORY_CHANNEL = "directory_changes"  # see migrations/008_directory_changes.sql
+RECONNECT_DELAY = 5
+# How often the listener thread wakes up to notice close().
+POLL_INTERVAL = 1.0
+
+# Sent instead of deltas that may have been lost (listener reconnected, or the
+# client fell behind). The client should refetch its appointment list.
+RESYNC = {"op": "resync"}
+
+def sse(event, data):
+    """One Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+class Listener:
+    """
+    A thread holding one LISTEN connection to the primary for `channel`. It
+    reconnects on its own if the connection drops, calling on_connect() each time
+    it (re)starts listening, since anything sent in between was missed, and
+    on_notify(payload) for every notification. Both run on the listener thread.
+    """
+
+    channel = None
+    name = "listener"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+        self._stopping = threading.Event()
+        self.connected = False
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stopping.clear()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def close(self):
+        self._stopping.set()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                conn = database.get_db_connection()
+            except Exception:
+                self._stopping.wait(RECONNECT_DELAY)
+                continue
+            try:
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {self.channel};")
+                self.connected = True
+                self.on_connect()
+                while not self._stopping.is_set():
+                    if not select.select([conn], [], [], POLL_INTERVAL)[0]:
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self.on_notify(conn.notifies.pop(0).payload)
+            except Exception as e:
+                print(f"The {self.name} listener lost its connection: {e}")
+            finally:
+                self.connected = False
+                conn.close()
+            self._stopping.wait(RECONNECT_DELAY)
+
+    def on_connect(self):
+        pass
+
+    def on_notify(self, payload):
+        pass
+
+class AppointmentEvents(Listener):
+    """
+    Fans appointment status deltas out to patients' event streams. One thread per
+    process holds a single LISTEN connection to the primary and hands each NOTIFY
+    to the streams of the appointment's patient, so the database sees one listener
+    however many patients are connected. The thread starts with the first stream.
+    """
+
+    channel = CHANNEL
+    name = "appointment-events"
+
+    def __init__(self):
+        super().__init__()
+        self._subscribers = {}  # patient id -> set of asyncio.Queue
+        self.delivered = 0
+        self.resyncs = 0
+
+    @asynccontextmanager
+    async def subscribe(self, patient_id):
+        """A queue of the patient's deltas (dicts), for the duration of the block."""
+        self._loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=APPOINTMENT_EVENTS_QUEUE_SIZE)
+        key = str(patient_id)
+        with self._lock:
+            self._subscribers.setdefault(key, set()).add(queue)
+        self._start()
+        try:
+            yield queue
+        finally:
+            with self._lock:
+                queues = self._subscribers.get(key)
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[key]
+
+    def on_connect(self):
+        # Anything sent while we were not listening is lost.
+        self._broadcast(RESYNC)
+
+    def on_notify(self, payload):
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        with self._lock:
+            queues = list(self._subscribers.get(event.pop("patient_id", None), ()))
+        for queue in queues:
+            self._loop.call_soon_threadsafe(self._deliver, queue, event)
+
+    def _broadcast(self, event):
+        with self._lock:
+            queues = [queue for queues in self._subscribers.values() for queue in queues]
+        for queue in queues:
+            self._loop.call_soon_threadsafe(self._deliver, queue, event)
+
+    def _deliver(self, queue, event):
+        # Runs on the event loop.
+        try:
+            queue.put_nowait(event)
+            self.delivered += 1
+        except asyncio.QueueFull:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESYNC)
+            self.resyncs += 1
+
+    def stats(self):
+        with self._lock:
+            streams = sum(len(queues) for queues in self._subscribers.values())
+            patients = len(self._subscribers)
+        return {"streams": streams, "patients": patients, "connected": int(self.connected),
+                "delivered": self.delivered, "resyncs": self.resyncs}
+
+appointments = AppointmentEvents()
+
+class DirectoryChanges(Listener):
+    """
+    Drops cached search results (cache.search_results) when doctors, clinics,
+    pharmacies, labs or doctors' open slots change, whichever process or
+    connection changed them (including `manage.py import` and every booking or
+    cancellation). Started by the lifespan when the search cache is on.
+    """
+
+    channel = DIRECTORY_CHANNEL
+    name = "directory-changes"
+    # Table -> the search types whose results show its rows.
+    KINDS = {"doctors": ("doctor",), "clinics": ("doctor",), "doctor_slots": ("doctor",),
+             "pharmacies": ("pharmacy",), "labs": ("lab",)}
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._start()
+
+    def on_connect(self):
+        # Changes made while we were not listening were missed.
+        self._loop.call_soon_threadsafe(cache.invalidate_search)
+
+    def on_notify(self, payload):
+        kinds = self.KINDS.get(payload)
+        if kinds:
+            self._loop.call_soon_threadsafe(cache.invalidate_search, *kinds)
+
+directory = DirectoryChanges()
@@ -0,0 +1,134 @@
+import os
+import json
+import re
+import threading
+import time
+import urllib.request
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Configuration ---
+GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
+# Google's ID-token signing certificates, {kid: PEM}. Point this at a local stand-in
+# key server to run sign-in offline (see benchmarks/google_tokens.py).
+GOOGLE_CERTS_URL = os.getenv("GOOGLE_CERTS_URL", "https://www.googleapis.com/oauth2/v1/certs")
+# Refresh this many seconds before the certs' Cache-Control max-age runs out.
+GOOGLE_CERTS_REFRESH_AHEAD = float(os.getenv("GOOGLE_CERTS_REFRESH_AHEAD", "300"))
+GOOGLE_CERTS_TIMEOUT = float(os.getenv("GOOGLE_CERTS_TIMEOUT", "5"))
+GOOGLE_TOKEN_CLOCK_SKEW = int(os.getenv("GOOGLE_TOKEN_CLOCK_SKEW", "10"))
+
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+# Used when the response has no usable max-age, and as the retry delay after a failed refresh.
+DEFAULT_MAX_AGE = 3600
+RETRY_AFTER_FAILURE = 60
+# An unknown kid forces a refetch at most this often, so made-up key ids can't
+# turn every sign-in attempt into a request to Google.
+MIN_FORCED_REFRESH_INTERVAL = 30
+
+_MAX_AGE = re.compile(r"max-age=(\d+)")
+
+class CertsUnavailable(Exception):
+    """Raised when no signing certificates could be fetched; the API answers 503."""
+
+def _max_age(cache_control):
+    match = _MAX_AGE.search(cache_control or "")
+    return int(match.group(1)) if match else DEFAULT_MAX_AGE
+
+class GoogleCertCache:
+    """
+    Keeps Google's signing certificates in memory so verifying an ID token is a
+    local signature check. The certs are refetched in the background shortly before
+    their Cache-Control max-age expires; if that fails the old ones are kept (Google
+    publishes new keys well before it signs with them) and the fetch is retried.
+    A token signed with a key we don't know yet triggers one immediate refetch.
+    """
+
+    def __init__(self, url=GOOGLE_CERTS_URL, refresh_ahead=GOOGLE_CERTS_REFRESH_AHEAD):
+        self.url = url
+        self.refresh_ahead = refresh_ahead
+        self._certs = {}
+        self._expires_at = 0.0
+        self._fetched_at = None
+        self._lock = threading.Lock()
+        self._timer = None
+        self.fetches = 0
+
+    def _fetch(self):
+        request = urllib.request.Request(self.url, headers={"Accept": "application/json"})
+        with urllib.request.urlopen(request, timeout=GOOGLE_CERTS_TIMEOUT) as response:
+            certs = json.loads(response.read())
+            max_age = _max_age(response.headers.get("Cache-Control"))
+        if not isinstance(certs, dict) or not certs:
+            raise ValueError("Certificate response has no keys.")
+        return certs, max_age
+
+    def refresh(self, seen=None):
+        """
+        Fetches the certs now and schedules the next background refresh. Callers
+        that found the certs stale pass the `_fetched_at` they saw, so a burst of
+        them waiting on the lock results in one fetch.
+        """
+        with self._lock:
+            if seen is not None and self._fetched_at != seen and self._certs:
+                return self._certs
+            try:
+                certs, max_age = self._fetch()
+            except Exception as e:
+                print(f"Error fetching Google certs: {e}")
+                self._schedule(RETRY_AFTER_FAILURE)
+                if not self._certs:
+                    raise CertsUnavailable() from e
+                return self._certs
+            now = time.monotonic()
+            self._certs = certs
+            self._fetched_at = now
+            self._expires_at = now + max_age
+            self.fetches += 1
+            self._schedule(max(max_age - self.refresh_ahead, max_age / 2))
+            return certs
+
+    def _schedule(self, delay):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._refresh_in_background)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except CertsUnavailable:
+            pass
+
+    def certs_for(self, kid):
+        """The current certs, refetched first if they have expired or don't include `kid`."""
+        certs, fetched_at = self._certs, self._fetched_at
+        if not certs or time.monotonic() >= self._expires_at:
+            return self.refresh(seen=fetched_at or 0.0)
+        if kid not in certs and time.monotonic() - fetched_at >= MIN_FORCED_REFRESH_INTERVAL:
+            return self.refresh(seen=fetched_at)
+        return certs
+
+    def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+
+def verify_id_token(token, audience=GOOGLE_CLIENT_ID, cert_cache=None):
+    """
+    Verifies a Google ID token and returns its claims; raises ValueError if it is
+    invalid, for the wrong audience or not issued by Google. Same checks as
+    google.oauth2.id_token.verify_oauth2_token, with the certs served from cache.
+    """
+    # google-auth is the heaviest import in the API and only /auth/google needs it,
+    # so it is loaded on the first Google sign-in rather than at startup.
+    from google.auth import jwt
+    cert_cache = cert_cache or google_certs
+    kid = jwt.decode_header(token).get("kid")
+    claims = jwt.decode(token, certs=cert_cache.certs_for(kid), audience=audience,
+                        clock_skew_in_seconds=GOOGLE_TOKEN_CLOCK_SKEW)
+    if claims.get("iss") not in GOOGLE_ISSUERS:
+        raise ValueError(f"Wrong issuer: {claims.get('iss')}")
+    return claims
+
+google_certs = GoogleCertCache()
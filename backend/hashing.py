@@ -0,0 +1,156 @@
+import os
+import asyncio
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Configuration ---
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", str(os.cpu_count() or 2)))
+# How many hash jobs may wait for a free worker before new ones are rejected with a 503.
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", "32"))
+HASH_RETRY_AFTER = int(os.getenv("HASH_RETRY_AFTER", "2"))
+
+# passlib and its bcrypt backend are loaded on first use (see _context), which in
+# the API process is never: hashing runs in the pool workers.
+_pwd_context = None
+
+# Stored for accounts that can only sign in through Google. It is not a valid
+# bcrypt hash, so it never verifies and costs nothing to create.
+UNUSABLE_PASSWORD = "!"
+
+# --- Sync API (runs in the calling thread or inside a pool worker) ---
+
+def _context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+    return _pwd_context
+
+def load_backend():
+    """Loads passlib's bcrypt backend, which runs its self-tests the first time."""
+    _context().handler("bcrypt").get_backend()
+
+def verify_password(plain_password, hashed_password):
+    """Checks if a plain password matches a hashed one."""
+    if not hashed_password or hashed_password.startswith(UNUSABLE_PASSWORD):
+        return False
+    return _context().verify(plain_password, hashed_password)
+
+def hash_password(password):
+    """Generates a secure hash from a plain password."""
+    return _context().hash(password)
+
+def _timed(func, *args):
+    # Runs in the worker process; returns the CPU-side latency alongside the result.
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+# --- Worker Pool ---
+
+class HashingPoolBusy(Exception):
+    """Raised when the hashing queue is full; the API answers 503 with Retry-After."""
+
+class HashingPool:
+    """
+    Runs bcrypt in a dedicated process pool so a login burst can't starve the
+    event loop or the request threadpool. At most `workers + queue_limit` jobs
+    are admitted at once; anything beyond that is rejected immediately.
+    """
+
+    # Upper bounds (seconds) of the hash latency histogram; counts are cumulative, as in Prometheus.
+    LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+    def __init__(self, workers=HASH_POOL_SIZE, queue_limit=HASH_QUEUE_LIMIT):
+        self.workers = max(1, workers)
+        self.queue_limit = max(0, queue_limit)
+        self._executor = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.rejected = 0
+        self.completed = 0
+        self.hash_seconds_sum = 0.0
+        self.wait_seconds_sum = 0.0
+        self.latency_counts = [0] * len(self.LATENCY_BUCKETS)
+
+    def start(self):
+        """Creates the worker processes. Called lazily on first use if not called earlier."""
+        with self._lock:
+            if self._executor is None:
+                import multiprocessing
+                from concurrent.futures import ProcessPoolExecutor
+                # spawn keeps the workers free of the parent's DB connections and threads.
+                # Each worker loads the bcrypt backend as it starts rather than on its first hash.
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                    initializer=load_backend,
+                )
+            return self._executor
+
+    def warm_up(self):
+        """Starts the workers and waits until they are ready to hash (see warmup.py)."""
+        executor = self.start()
+        for future in [executor.submit(load_backend) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_limit:
+                self.rejected += 1
+                raise HashingPoolBusy()
+            self._in_flight += 1
+        executor = self._executor or self.start()
+        submitted = time.perf_counter()
+        try:
+            result, hash_seconds = await asyncio.get_running_loop().run_in_executor(executor, _timed, func, *args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+        self._record(hash_seconds, time.perf_counter() - submitted - hash_seconds)
+        return result
+
+    def _record(self, hash_seconds, wait_seconds):
+        with self._lock:
+            self.completed += 1
+            self.hash_seconds_sum += hash_seconds
+            self.wait_seconds_sum += max(0.0, wait_seconds)
+            for i, bound in enumerate(self.LATENCY_BUCKETS):
+                if hash_seconds <= bound:
+                    self.latency_counts[i] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "in_flight": self._in_flight,
+                "queue_depth": max(0, self._in_flight - self.workers),
+                "queue_limit": self.queue_limit,
+                "rejected": self.rejected,
+                "completed": self.completed,
+                "hash_seconds_sum": self.hash_seconds_sum,
+                "wait_seconds_sum": self.wait_seconds_sum,
+                # {le: hashes that took at most `le` seconds}; "+Inf" is every completed hash.
+                "latency_buckets": {**dict(zip(self.LATENCY_BUCKETS, self.latency_counts)), "+Inf": self.completed},
+            }
+
+pool = HashingPool()
+
+# --- Async API used by the routes ---
+
+async def verify_password_async(plain_password, hashed_password):
+    if not hashed_password or hashed_password.startswith(UNUSABLE_PASSWORD):
+        return False
+    return await pool.run(verify_password, plain_password, hashed_password)
+
+async def hash_password_async(password):
+    return await pool.run(hash_password, password)
@@ -0,0 +1,86 @@
+import os
+import json
+import hashlib
+from dotenv import load_dotenv
+from fastapi import HTTPException
+from starlette.responses import Response
+
+from data_access import db
+import database
+import serialization
+
+load_dotenv()
+
+# --- Configuration ---
+# How long a key's response is replayed to retries. After that the key may be
+# reused, and `python manage.py purge-idempotency-keys` deletes it.
+IDEMPOTENCY_KEY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+
+KEY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+def request_hash(route, request):
+    """Fingerprint of a request's inputs, so a key reused for a different request is caught."""
+    return hashlib.sha256(json.dumps([route, request], sort_keys=True, default=str).encode()).hexdigest()
+
+def _replay(stored):
+    return Response(content=stored["response"], status_code=stored["status_code"],
+                    media_type="application/json", headers={REPLAYED_HEADER: "true"})
+
+def _key_taken(error):
+    # A unique violation from either driver on the key's row (queries.STORE_IDEMPOTENT_RESPONSE).
+    return getattr(getattr(error, "diag", None), "constraint_name", None) == "idempotency_keys_pkey"
+
+async def _write_once(key, user_id, route, fingerprint, write, model, status_code):
+    # The write and the row recording its response commit together, or not at all.
+    error = None
+    async with database.write_transaction():
+        try:
+            row = await write()
+        except HTTPException as e:
+            if e.status_code >= 500:
+                raise
+            error, status_code, body = e, e.status_code, serialization.dumps({"detail": e.detail})
+        else:
+            body = serialization.dumps(serialization.projection(model)(row))
+        await db.store_idempotent_response(user_id, key, route, fingerprint, status_code, body.decode())
+    if error is not None:
+        raise error
+    return Response(content=body, status_code=status_code, media_type="application/json")
+
+async def respond(key, user_id, route, request, write, model, status_code=200):
+    """
+    The response to a patient write that honours an Idempotency-Key header.
+
+    `write` is an async callable returning the row to send as `model` (or raising
+    HTTPException); `request` holds the inputs that identify the request. Without
+    a key the row is rendered as usual. With one, a stored response for the key
+    is replayed, marked Idempotent-Replayed, without running the write: a retry
+    costs one lookup. Otherwise the write runs in a transaction that also stores
+    its response (including a 4xx) under the key, so a retry finds either both or
+    neither. Should a concurrent request with the same key commit first, the
+    write is rolled back and that response replayed. A key reused for a different
+    request gets 422. If the write fails with anything else nothing is stored, so
+    the retry runs it again.
+    """
+    if key is None:
+        return serialization.render(await write(), model, status_code=status_code)
+    if not 0 < len(key) <= MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"{KEY_HEADER} must be 1 to {MAX_KEY_LENGTH} characters.")
+
+    fingerprint = request_hash(route, request)
+    # The second pass replays what a concurrent request stored under the key.
+    for _ in range(2):
+        stored = await db.get_idempotent_response(user_id, key, IDEMPOTENCY_KEY_TTL_HOURS * 3600)
+        if stored is not None:
+            if stored["route"] != route or stored["request_hash"] != fingerprint:
+                raise HTTPException(status_code=422, detail="This Idempotency-Key was already used for a different request.")
+            return _replay(stored)
+        try:
+            return await _write_once(key, user_id, route, fingerprint, write, model, status_code)
+        except Exception as e:
+            if not _key_taken(e):
+                raise
+    # Taken both times, yet gone when looked up: the key expired while concurrent requests raced for it.
+    raise HTTPException(status_code=409, detail="This Idempotency-Key expired while another request was using it.")
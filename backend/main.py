@@ -1,134 +1,407 @@
-from fastapi import FastAPI, HTTPException, APIRouter, Depends, status
+from fastapi import FastAPI, HTTPException, APIRouter, Depends, Header, Query, Request, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from google.oauth2 import id_token
-from google.auth.transport import requests
-import os
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from pydantic import BaseModel, TypeAdapter
+import asyncio
 import uuid
-from typing import List
+from typing import List, Optional, Literal
+from decimal import Decimal
+from datetime import datetime
 
 from models import *
-import db_actions as db
-from auth import create_access_token, get_current_user_from_db, verify_password, get_password_hash
+from data_access import db
+from auth import create_access_token, get_current_user_from_db, get_current_principal, token_claims_for
+import hashing
+from hashing import HashingPoolBusy
+import google_tokens
+from google_tokens import CertsUnavailable
+import database
+import search_index
+import search
+import events
+import record_export
+from pagination import encode_cursor, decode_cursor, NEXT_CURSOR_HEADER
+import cache
+from responses import RenderedJSON, conditional_response
+import serialization
+import metrics
+import tracing
+import ratelimit
+import idempotency
+import warmup
+from database import PoolTimeout
 
-app = FastAPI(title="OPD Nexus Patient API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if database.DB_DRIVER == "async":
+        await database.get_async_pool()
+    if cache.SEARCH_CACHE_TTL > 0:
+        events.directory.start()
+    warm_up = await warmup.start(app, prefixes=("", patient_router.prefix, auth_router.prefix),
+                                 prime_caches=(_prime_doctor_index, _prime_article_feed))
+    yield
+    if warm_up is not None:
+        warm_up.cancel()
+    hashing.pool.shutdown()
+    google_tokens.google_certs.close()
+    events.appointments.close()
+    events.directory.close()
+    await database.close_async_pool()
+    database.close_pool()
+
+app = FastAPI(title="OPD Nexus Patient API", lifespan=lifespan)
 origins = ["Access-Control-Allow-Origin: https://patient-dashboard-navy-five.vercel.app"]
-app.add_middleware(CORSMiddleware, allow_origins=origins, allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+if ratelimit.RATE_LIMIT_ENABLED:
+    # Added before CORS so CORS wraps it: 429/503 answers still get CORS headers,
+    # and preflights never count against a budget.
+    app.add_middleware(ratelimit.AdmissionMiddleware)
+app.add_middleware(CORSMiddleware, allow_origins=origins, allow_credentials=True, allow_methods=["*"], allow_headers=["*"], expose_headers=[NEXT_CURSOR_HEADER, "ETag", "Retry-After", idempotency.REPLAYED_HEADER, tracing.REQUEST_ID_HEADER])
+if tracing.TRACING_ENABLED:
+    app.add_middleware(tracing.TracingMiddleware)
+if metrics.METRICS_ENABLED:
+    # Added last so it is outermost and times everything, CORS preflights included.
+    app.add_middleware(metrics.MetricsMiddleware)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics_route():
+        return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
 
 patient_router = APIRouter(prefix="/patient")
 auth_router = APIRouter(prefix="/auth")
 public_router = APIRouter()
 
+@app.exception_handler(PoolTimeout)
+def pool_timeout_handler(request, exc):
+    # The database pool is saturated; ask the client to back off instead of queueing forever.
+    return JSONResponse(status_code=503, content={"detail": "Service is busy, please retry."}, headers={"Retry-After": "1"})
+
+@app.exception_handler(HashingPoolBusy)
+def hashing_busy_handler(request, exc):
+    # Too many logins/registrations are already waiting on bcrypt; reject before doing any work.
+    return JSONResponse(status_code=503, content={"detail": "Too many sign-in attempts in progress, please retry."},
+                        headers={"Retry-After": str(hashing.HASH_RETRY_AFTER)})
+
+@app.exception_handler(CertsUnavailable)
+def certs_unavailable_handler(request, exc):
+    # Google's signing certs could not be fetched and none are cached yet.
+    return JSONResponse(status_code=503, content={"detail": "Google sign-in is temporarily unavailable, please retry."},
+                        headers={"Retry-After": str(google_tokens.RETRY_AFTER_FAILURE)})
+
 # --- Authentication Endpoints ---
 @auth_router.post("/register")
-def register_user(user_data: UserRegister):
-    hashed_password = get_password_hash(user_data.password)
-    user = db.create_new_user(user_data.fullName, user_data.email, hashed_password, "patient")
+async def register_user(user_data: UserRegister):
+    hashed_password = await hashing.hash_password_async(user_data.password)
+    user = await db.create_new_user(user_data.fullName, user_data.email, hashed_password, "patient")
     if not user: raise HTTPException(status_code=400, detail="Email already registered.")
-    token_data = {"sub": user['email'], "user_id": str(user['id']), "full_name": user['full_name']}
-    access_token = create_access_token(data=token_data)
+    access_token = create_access_token(data=token_claims_for(user))
     return {"access_token": access_token, "token_type": "bearer"}
 
 @auth_router.post("/login")
-def login_user(form_data: UserLogin):
-    user = db.get_user_by_email(form_data.email)
-    if not user or not user.get('hashed_password') or not verify_password(form_data.password, user['hashed_password']):
+async def login_user(form_data: UserLogin):
+    user = await db.get_user_by_email(form_data.email)
+    if not user or not user.get('hashed_password') or not await hashing.verify_password_async(form_data.password, user['hashed_password']):
         raise HTTPException(status_code=401, detail="Incorrect email or password")
-    token_data = {"sub": user['email'], "user_id": str(user['id']), "full_name": user['full_name']}
-    access_token = create_access_token(data=token_data)
+    access_token = create_access_token(data=token_claims_for(user))
     return {"access_token": access_token, "token_type": "bearer"}
 
 @auth_router.post("/google")
-def google_auth(token_data: GoogleToken):
+async def google_auth(token_data: GoogleToken):
     try:
-        idinfo = id_token.verify_oauth2_token(token_data.idToken, requests.Request(), os.getenv("GOOGLE_CLIENT_ID"))
+        idinfo = await run_in_threadpool(google_tokens.verify_id_token, token_data.idToken)
         email = idinfo['email']; full_name = idinfo.get('name', 'New User')
-        user = db.get_user_by_email(email)
+        user = await db.get_user_by_email(email)
         if not user:
-            hashed_password = get_password_hash(str(uuid.uuid4())) 
-            user = db.create_new_user(full_name, email, hashed_password, "patient")
+            # Google-only accounts get an unusable password instead of a bcrypt hash of a random value.
+            user = await db.create_new_user(full_name, email, hashing.UNUSABLE_PASSWORD, "patient")
         if not user:
             raise HTTPException(status_code=500, detail="Could not create user account.")
         if user['role'] != 'patient':
             raise HTTPException(status_code=403, detail="This account is not a patient account.")
-        token_data = {"sub": user['email'], "user_id": str(user['id']), "full_name": user['full_name']}
-        access_token = create_access_token(data=token_data)
+        access_token = create_access_token(data=token_claims_for(user))
         return {"access_token": access_token, "token_type": "bearer"}
     except ValueError:
         raise HTTPException(status_code=401, detail="Invalid Google token")
 
 # --- Patient Endpoints (Protected) ---
 @patient_router.get("/profile", response_model=PatientProfile)
-def get_profile(current_user: User = Depends(get_current_user_from_db)):
-    profile = db.get_patient_profile(current_user.id)
-    if not profile: raise HTTPException(status_code=404, detail="Profile not found.")
-    return profile
+async def get_profile(principal: dict = Depends(get_current_principal)):
+    # The cached principal already carries every profile column, so no second query is needed.
+    if principal['role'] != 'patient': raise HTTPException(status_code=404, detail="Profile not found.")
+    return serialization.render(principal, PatientProfile)
 
 @patient_router.put("/profile", response_model=PatientProfile)
-def update_profile(profile_data: PatientProfileUpdate, current_user: User = Depends(get_current_user_from_db)):
-    updated = db.update_patient_profile(current_user.id, profile_data.model_dump())
+async def update_profile(profile_data: PatientProfileUpdate, current_user: User = Depends(get_current_user_from_db)):
+    updated = await db.update_patient_profile(current_user.id, profile_data.model_dump())
     if not updated: raise HTTPException(status_code=400, detail="Update failed.")
-    return updated
+    return serialization.render(updated, PatientProfile)
 
 @patient_router.post("/book-appointment", response_model=AppointmentOut)
-def book_appointment_route(appt_data: AppointmentIn, current_user: User = Depends(get_current_user_from_db)):
-    new_appt = db.book_new_appointment(current_user.model_dump(), appt_data.doctor_id, appt_data.slot)
-    if not new_appt: raise HTTPException(status_code=500, detail="Could not book appointment.")
-    return new_appt
+async def book_appointment_route(appt_data: AppointmentIn, current_user: User = Depends(get_current_user_from_db),
+                                 idempotency_key: Optional[str] = Header(None, alias=idempotency.KEY_HEADER)):
+    """Books an open slot. Send an Idempotency-Key to make retries safe (see idempotency.respond)."""
+    try:
+        slot = datetime.fromisoformat(appt_data.slot)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid slot.")
+
+    async def book():
+        new_appt = await db.book_new_appointment(current_user.model_dump(), appt_data.doctor_id, slot)
+        if not new_appt: raise HTTPException(status_code=409, detail="This slot is no longer available.")
+        return new_appt
+
+    return await idempotency.respond(idempotency_key, current_user.id, "book_appointment",
+                                     appt_data.model_dump(), book, AppointmentOut)
 
 # --- NEW: "My Appointments" Endpoints ---
 @patient_router.get("/my-appointments", response_model=List[AppointmentOut])
-def get_my_appointments(current_user: User = Depends(get_current_user_from_db)):
-    """Gets all of the logged-in patient's appointments (past and future)."""
-    return db.get_patient_appointments(current_user.id)
+async def get_my_appointments(response: Response, current_user: User = Depends(get_current_user_from_db),
+                              limit: int = Query(50, ge=1, le=200), cursor: Optional[str] = None,
+                              when: Optional[Literal["upcoming", "past"]] = None,
+                              start: Optional[datetime] = Query(None, alias="from"), end: Optional[datetime] = Query(None, alias="to")):
+    """
+    Gets a page of the logged-in patient's appointments, latest slot first
+    (soonest first for when=upcoming). Pass back X-Next-Cursor as `cursor`.
+    """
+    try:
+        after = decode_cursor(cursor, datetime.fromisoformat, uuid.UUID) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    appointments = await db.get_patient_appointments(current_user.id, limit, after, when, start, end)
+    if len(appointments) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(appointments[-1]['slot'].isoformat(), appointments[-1]['id'])
+    return serialization.render(appointments, AppointmentOut, response)
 
 @patient_router.put("/appointments/{appointment_id}/cancel", response_model=AppointmentOut)
-def cancel_appointment_route(appointment_id: uuid.UUID, current_user: User = Depends(get_current_user_from_db)):
-    """Cancels one of the patient's own appointments."""
-    cancelled_appt = db.cancel_appointment(appointment_id, current_user.id)
-    if not cancelled_appt:
-        raise HTTPException(status_code=404, detail="Appointment not found or you do not have permission to cancel it.")
-    return cancelled_appt
+async def cancel_appointment_route(appointment_id: uuid.UUID, current_user: User = Depends(get_current_user_from_db),
+                                   idempotency_key: Optional[str] = Header(None, alias=idempotency.KEY_HEADER)):
+    """Cancels one of the patient's own appointments and frees its slot. Accepts an Idempotency-Key."""
+
+    async def cancel():
+        cancelled_appt = await db.cancel_appointment(appointment_id, current_user.id)
+        if not cancelled_appt:
+            raise HTTPException(status_code=404, detail="Appointment not found or you do not have permission to cancel it.")
+        return cancelled_appt
+
+    return await idempotency.respond(idempotency_key, current_user.id, "cancel_appointment",
+                                     {"appointment_id": appointment_id}, cancel, AppointmentOut)
 
 # --- NEW: "My Medical Records" Endpoint ---
 @patient_router.get("/my-records", response_model=List[PrescriptionRecord])
-def get_my_medical_records(current_user: User = Depends(get_current_user_from_db)):
-    """Gets all of the logged-in patient's past prescriptions."""
-    return db.get_patient_medical_records(current_user.id)
+async def get_my_medical_records(response: Response, current_user: User = Depends(get_current_user_from_db),
+                                 limit: int = Query(20, ge=1, le=100), cursor: Optional[str] = None,
+                                 start: Optional[datetime] = Query(None, alias="from"), end: Optional[datetime] = Query(None, alias="to")):
+    """Gets a page of the logged-in patient's past prescriptions, newest first. Pass back X-Next-Cursor as `cursor`."""
+    try:
+        after = decode_cursor(cursor, datetime.fromisoformat, uuid.UUID) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    records = await db.get_patient_medical_records(current_user.id, limit, after, start, end)
+    if len(records) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(records[-1]['created_at'].isoformat(), records[-1]['id'])
+    return serialization.render(records, PrescriptionRecord, response)
+
+@patient_router.get("/my-records/export")
+async def export_my_medical_records(current_user: User = Depends(get_current_user_from_db),
+                                    format: Literal["ndjson", "csv", "print"] = "ndjson"):
+    """
+    The patient's complete prescription history, newest first, as NDJSON, CSV or
+    a printable HTML document. Streamed a batch at a time as it is read.
+    """
+    _, media_type, extension = record_export.FORMATS[format]
+    batches = db.iter_patient_medical_records(current_user.id, record_export.RECORDS_EXPORT_BATCH_SIZE)
+    body = record_export.stream(format, batches, current_user.model_dump())
+    filename = f"medical-record-{datetime.now().date().isoformat()}.{extension}"
+    disposition = "inline" if format == "print" else "attachment"
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'{disposition}; filename="{filename}"', "Cache-Control": "no-store"})
 
 # --- NEW: "Doctor Reviews" Endpoint ---
 @patient_router.post("/reviews", response_model=ReviewOut, status_code=201)
-def post_doctor_review(review_data: ReviewIn, current_user: User = Depends(get_current_user_from_db)):
-    """Submits a new review for a doctor from the logged-in patient."""
-    new_review = db.add_doctor_review(current_user.id, review_data.model_dump())
-    if not new_review:
-        raise HTTPException(status_code=400, detail="Could not submit review. You may have already reviewed this appointment.")
-    return new_review
+async def post_doctor_review(review_data: ReviewIn, current_user: User = Depends(get_current_user_from_db),
+                             idempotency_key: Optional[str] = Header(None, alias=idempotency.KEY_HEADER)):
+    """
+    Submits (or updates) the logged-in patient's review of one of their completed
+    appointments with that doctor. Accepts an Idempotency-Key.
+    """
+
+    async def review():
+        new_review = await db.add_doctor_review(current_user.id, review_data.model_dump())
+        if not new_review:
+            raise HTTPException(status_code=400, detail="Could not submit review. Only your own completed appointments can be reviewed.")
+        return new_review
+
+    return await idempotency.respond(idempotency_key, current_user.id, "doctor_review",
+                                     review_data.model_dump(), review, ReviewOut, status_code=201)
+
+# --- Appointment Status Push ---
+@patient_router.get("/appointment-events")
+async def appointment_events_route(principal: dict = Depends(get_current_principal)):
+    """
+    Server-Sent Events stream of the patient's appointment changes: an
+    `appointment` event carrying {op, id, doctor_id, doctor_name, slot, status}
+    for every booking and status or slot change, whoever made it. A `resync`
+    event means deltas may have been missed and the list should be refetched.
+    """
+    if principal['role'] != 'patient': raise HTTPException(status_code=404, detail="Profile not found.")
+
+    async def stream():
+        async with events.appointments.subscribe(principal['id']) as queue:
+            yield f"retry: {events.RECONNECT_DELAY * 1000}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), events.APPOINTMENT_EVENTS_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield events.sse("resync" if event is events.RESYNC else "appointment", event)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+# --- Patient Dashboard Endpoint ---
+DASHBOARD_PARTS = {
+    "profile": PatientProfile,
+    "upcoming_appointments": AppointmentOut,
+    "recent_prescriptions": PrescriptionRecord,
+    "pending_reviews": AppointmentOut,
+}
+
+@patient_router.get("/dashboard", response_model=PatientDashboard, response_model_exclude_unset=True)
+async def get_dashboard(principal: dict = Depends(get_current_principal), fields: Optional[str] = None,
+                        upcoming: int = Query(5, ge=1, le=50), prescriptions: int = Query(5, ge=1, le=50),
+                        reviews: int = Query(5, ge=1, le=50)):
+    """
+    The patient's profile, next `upcoming` appointments, latest `prescriptions` and
+    up to `reviews` completed appointments still waiting for a review, in one
+    response. `fields` (comma-separated part names) limits it to what the client
+    renders. The list queries run concurrently, each on its own pool connection.
+    """
+    if principal['role'] != 'patient': raise HTTPException(status_code=404, detail="Profile not found.")
+    wanted = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(DASHBOARD_PARTS)
+    unknown = [f for f in wanted if f not in DASHBOARD_PARTS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}. Choose from {', '.join(DASHBOARD_PARTS)}.")
+    user_id = principal['id']
+    queries = {
+        "upcoming_appointments": lambda: db.get_patient_appointments(user_id, upcoming, when="upcoming"),
+        "recent_prescriptions": lambda: db.get_patient_medical_records(user_id, prescriptions),
+        "pending_reviews": lambda: db.get_pending_reviews(user_id, reviews),
+    }
+    parts = [part for part in queries if part in wanted]
+    results = await asyncio.gather(*(queries[part]() for part in parts))
+    content = dict(zip(parts, results))
+    if "profile" in wanted:
+        # The cached principal already carries every profile column.
+        content["profile"] = principal
+    return serialization.render_parts(content, DASHBOARD_PARTS)
 
 # --- Public Endpoints (No Auth Required) ---
 @public_router.get("/doctors/search", response_model=List[DoctorPublic])
-def search_doctors_route(q: str):
+async def search_doctors_route(response: Response, q: str, limit: int = Query(20, ge=1, le=50),
+                               offset: int = Query(0, ge=0, le=1000), cursor: Optional[str] = None):
+    """Best matches first. Page with `offset`, or pass back the X-Next-Cursor header as `cursor`."""
+    try:
+        # A tuple, since it is part of the search cache key.
+        after = tuple(decode_cursor(cursor, Decimal, uuid.UUID)) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    doctors = await search.search_type("doctor", q, limit, offset=offset, after=after)
+    if len(doctors) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(doctors[-1]['rank'], doctors[-1]['id'])
+    return serialization.render(doctors, DoctorPublic, response)
+
+@public_router.get("/doctors/suggest", response_model=List[DoctorSuggestion])
+async def suggest_doctors_route(q: str, limit: int = Query(10, ge=1, le=20)):
+    """Typeahead. Served from the in-process prefix index when DOCTOR_PREFIX_INDEX is on."""
     if len(q) < 2: return []
-    return db.search_doctors(q)
+    if search_index.DOCTOR_PREFIX_INDEX:
+        await search_index.doctors.refresh(db.get_doctor_index_rows)
+        return serialization.render(search_index.doctors.suggest(q, limit), DoctorSuggestion)
+    return serialization.render(await db.search_doctors(q, limit), DoctorSuggestion)
+
+@public_router.get("/doctors/{doctor_id}", response_model=DoctorPublic)
+async def get_doctor_route(doctor_id: uuid.UUID):
+    doctor = await db.get_doctor(doctor_id)
+    if not doctor: raise HTTPException(status_code=404, detail="Doctor not found.")
+    return serialization.render(doctor, DoctorPublic)
+
+# Article responses are rendered once per cache entry and revalidated with ETags,
+# so a repeat visit costs a 304 and no database work.
+ARTICLES_CACHE_CONTROL = f"public, max-age={cache.ARTICLES_CACHE_TTL}"
+_article_summaries = TypeAdapter(List[ArticleSummary])
+_article = TypeAdapter(Article)
 
-@public_router.get("/articles", response_model=List[Article])
-def get_articles_route():
-    return db.get_all_articles()
+@public_router.get("/articles", response_model=List[ArticleSummary])
+async def get_articles_route(request: Request, limit: int = Query(20, ge=1, le=50), cursor: Optional[str] = None):
+    """Newest first. Pass back the X-Next-Cursor header as `cursor` for the next page."""
+    return conditional_response(request, await _article_feed(limit, cursor), ARTICLES_CACHE_CONTROL)
+
+async def _article_feed(limit, cursor):
+    key = ("feed", limit, cursor)
+    rendered = cache.articles.get(key)
+    if rendered is None:
+        try:
+            after = decode_cursor(cursor, datetime.fromisoformat, uuid.UUID) if cursor else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        summaries = await db.get_article_summaries(limit, after)
+        headers = {}
+        if len(summaries) == limit:
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(summaries[-1]['published_at'].isoformat(), summaries[-1]['id'])
+        rendered = RenderedJSON(_article_summaries.dump_json(_article_summaries.validate_python(summaries)), headers)
+        cache.articles.set(key, rendered)
+    return rendered
+
+@public_router.get("/articles/{article_id}", response_model=Article)
+async def get_article_route(request: Request, article_id: uuid.UUID):
+    key = ("article", article_id)
+    rendered = cache.articles.get(key)
+    if rendered is None:
+        article = await db.get_article(article_id)
+        if not article: raise HTTPException(status_code=404, detail="Article not found.")
+        rendered = RenderedJSON(_article.dump_json(_article.validate_python(article)))
+        cache.articles.set(key, rendered)
+    return conditional_response(request, rendered, ARTICLES_CACHE_CONTROL)
+
+# --- Warm-up ---
+# Hot caches filled by the lifespan warm-up (WARM_UP, see warmup.py): the first
+# page of the articles feed as the frontend requests it, and the doctor prefix index.
+
+async def _prime_article_feed():
+    await _article_feed(20, None)
+
+async def _prime_doctor_index():
+    if search_index.DOCTOR_PREFIX_INDEX:
+        await search_index.doctors.refresh(db.get_doctor_index_rows)
+
+@public_router.get("/search", response_model=SearchResults)
+async def search_route(q: str, types: Optional[str] = None, limit: int = Query(10, ge=1, le=50)):
+    """
+    Doctors, pharmacies and labs matching `q`, searched concurrently and merged best
+    first. `types` (comma-separated: doctor, pharmacy, lab) narrows it; `limit`
+    applies per type. If a type misses the deadline the rest are returned with
+    partial=true and the type listed in `missing`.
+    """
+    kinds = [t.strip() for t in types.split(",") if t.strip()] if types else None
+    unknown = [t for t in kinds or () if t not in search.SOURCES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown types: {', '.join(unknown)}. Choose from {', '.join(search.SOURCES)}.")
+    return serialization.render(await search.search(q, kinds, limit), SearchResults)
 
 @public_router.get("/pharmacies/search", response_model=List[Pharmacy])
-def search_pharmacies_route(q: str):
-    if len(q) < 2: return []
-    return db.search_pharmacies(q)
+async def search_pharmacies_route(q: str):
+    return serialization.render(await search.search_type("pharmacy", q, 10), Pharmacy)
 
 @public_router.get("/labs/search", response_model=List[Lab])
-def search_labs_route(q: str):
-    if len(q) < 2: return []
-    return db.search_labs(q)
+async def search_labs_route(q: str):
+    return serialization.render(await search.search_type("lab", q, 10), Lab)
 
 app.include_router(patient_router)
 app.include_router(auth_router)
 app.include_router(public_router)
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"message": "Welcome to the OPD Nexus PATIENT API"}
@@ -0,0 +1,153 @@
+import argparse
+import sys
+import time
+import db_actions as db
+import migrate
+import bulk
+from database import get_db_connection
+
+# Admin commands. Run from the backend directory, e.g.:
+#   python manage.py reconcile-ratings
+#   python manage.py migrate
+#   python manage.py purge-idempotency-keys   (e.g. hourly from cron)
+#   python manage.py import doctors doctors.csv
+
+def reconcile_ratings(args):
+    corrected = db.reconcile_doctor_rating_stats()
+    print(f"Rating stats reconciled: {corrected} doctor(s) corrected.")
+
+def purge_idempotency_keys(args):
+    from idempotency import IDEMPOTENCY_KEY_TTL_HOURS
+    hours = IDEMPOTENCY_KEY_TTL_HOURS if args.older_than is None else args.older_than
+    purged = db.purge_idempotency_keys(hours * 3600)
+    print(f"Purged {purged} idempotency key(s) older than {hours:g} hour(s).")
+
+def run_migrations(args):
+    conn = get_db_connection()
+    try:
+        applied = migrate.migrate(conn, target=args.to, dry_run=args.dry_run)
+    finally:
+        conn.close()
+    if not applied:
+        print("No pending migrations.")
+    elif not args.dry_run:
+        print(f"Applied {len(applied)} migration(s).")
+
+def migration_status(args):
+    conn = get_db_connection()
+    try:
+        for filename, state in migrate.status(conn):
+            print(f"{state:<8} {filename}")
+    finally:
+        conn.close()
+
+def baseline_migrations(args):
+    conn = get_db_connection()
+    try:
+        marked = migrate.baseline(conn, args.through)
+    finally:
+        conn.close()
+    print(f"Marked {len(marked)} migration(s) as applied: {', '.join(marked) or '-'}")
+
+def verify_query_plans(args):
+    conn = get_db_connection()
+    try:
+        problems = migrate.verify_plans(conn, args.min_rows)
+    finally:
+        conn.close()
+    for name, table, rows in problems:
+        print(f"{name}: sequential scan on {table} (~{rows} rows)")
+    if problems:
+        raise SystemExit(f"{len(problems)} query plan(s) scan a table of {args.min_rows}+ rows.")
+    print("No sequential scans on large tables.")
+
+def _rate(rows, seconds):
+    return f"{rows} rows in {seconds:.2f}s ({rows / seconds if seconds else 0:,.0f} rows/s)"
+
+def import_table(args):
+    conn = get_db_connection()
+    try:
+        result = bulk.import_table(conn, args.table, args.path, args.format)
+    finally:
+        conn.close()
+    print(f"{args.table}: {_rate(result['rows'], result['seconds'])}; "
+          f"{result['inserted']} inserted, {result['updated']} updated")
+
+def import_patients(args):
+    conn = get_db_connection()
+    try:
+        result = bulk.import_patients(conn, args.path, args.format, args.workers)
+    finally:
+        conn.close()
+    print(f"patients: {_rate(result['rows'], result['seconds'])}; "
+          f"{result['created']} created, {result['existing']} already registered, "
+          f"{result['duplicates']} duplicate emails, {result['skipped']} without an email")
+    if result['hashed']:
+        print(f"  hashed {_rate(result['hashed'], result['hash_seconds']).replace('rows', 'passwords')}")
+
+def export_table(args):
+    fmt = bulk.file_format(args.path, args.format) if args.path != "-" else (args.format or "ndjson")
+    out = sys.stdout if args.path == "-" else open(args.path, "w", newline="", encoding="utf-8")
+    conn = get_db_connection()
+    try:
+        start = time.perf_counter()
+        rows = bulk.export_table(conn, args.table, out, fmt)
+        seconds = time.perf_counter() - start
+    finally:
+        conn.close()
+        if out is not sys.stdout:
+            out.close()
+    print(f"{args.table}: exported {_rate(rows, seconds)}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="OPD Nexus patient API admin commands.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cmd = commands.add_parser("reconcile-ratings", help="Recompute doctor_rating_stats from doctor_reviews.")
+    cmd.set_defaults(func=reconcile_ratings)
+
+    cmd = commands.add_parser("purge-idempotency-keys", help="Delete stored Idempotency-Key responses past their TTL.")
+    cmd.add_argument("--older-than", type=float, help="hours (default: IDEMPOTENCY_KEY_TTL_HOURS)")
+    cmd.set_defaults(func=purge_idempotency_keys)
+
+    cmd = commands.add_parser("migrate", help="Apply pending migrations from migrations/.")
+    cmd.add_argument("--to", help="stop after this version, e.g. 006")
+    cmd.add_argument("--dry-run", action="store_true", help="list what would be applied")
+    cmd.set_defaults(func=run_migrations)
+
+    cmd = commands.add_parser("migration-status", help="List migrations as applied, pending or changed.")
+    cmd.set_defaults(func=migration_status)
+
+    cmd = commands.add_parser("migrate-baseline", help="Record migrations already applied by hand (psql) without running them.")
+    cmd.add_argument("--through", required=True, help="last version already applied, e.g. 005")
+    cmd.set_defaults(func=baseline_migrations)
+
+    cmd = commands.add_parser("verify-query-plans", help="EXPLAIN every API query; fail on sequential scans of large tables.")
+    cmd.add_argument("--min-rows", type=int, default=migrate.LARGE_TABLE_ROWS,
+                     help="tables with at least this many (estimated) rows count as large")
+    cmd.set_defaults(func=verify_query_plans)
+
+    formats = ("csv", "ndjson")
+    cmd = commands.add_parser("import", help="Bulk-load directory data from CSV/NDJSON (COPY, then upsert).")
+    cmd.add_argument("table", choices=sorted(bulk.TABLES))
+    cmd.add_argument("path")
+    cmd.add_argument("--format", choices=formats, help="default: from the file extension")
+    cmd.set_defaults(func=import_table)
+
+    cmd = commands.add_parser("import-patients", help="Bulk-create patient accounts from CSV/NDJSON.")
+    cmd.add_argument("path")
+    cmd.add_argument("--format", choices=formats, help="default: from the file extension")
+    cmd.add_argument("--workers", type=int, help="processes hashing passwords (default: one per core)")
+    cmd.set_defaults(func=import_patients)
+
+    cmd = commands.add_parser("export", help="Write a directory table to CSV/NDJSON ('-' for stdout).")
+    cmd.add_argument("table", choices=sorted(bulk.TABLES))
+    cmd.add_argument("path")
+    cmd.add_argument("--format", choices=formats, help="default: from the file extension")
+    cmd.set_defaults(func=export_table)
+
+    args = parser.parse_args()
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+import os
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+from dotenv import load_dotenv
+
+import database
+
+load_dotenv()
+
+# --- Configuration ---
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Request and database metrics in the Prometheus text format, served on /metrics.
+# Every worker process keeps its own counters, so scrape each worker (or run one
+# per container); Prometheus sums them across instances.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, values)} {total}")
+        return lines
+
+class Gauge:
+    """A gauge set directly, or read from `collect()` (returning {label_values: value}) at scrape time."""
+
+    def __init__(self, name, help, labels=(), collect=None):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.collect = collect
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def add(self, amount, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        if self.collect:
+            values = self.collect()
+        else:
+            with self._lock:
+                values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+class Histogram:
+    """
+    A histogram fed by `observe()`, or read from `collect()` at scrape time. `collect()`
+    returns {label_values: ({le: cumulative count, ..., "+Inf": count}, sum)}.
+    """
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS, collect=None):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self.collect = collect
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[-2] += 1
+            series[-1] += value
+
+    def _snapshot(self):
+        if self.collect:
+            return self.collect()
+        with self._lock:
+            series_by_labels = {k: list(v) for k, v in self._series.items()}
+        snapshot = {}
+        for label_values, series in series_by_labels.items():
+            cumulative, buckets = 0, {}
+            for bound, count in zip((*self.buckets, "+Inf"), series[:-1]):
+                cumulative += count
+                buckets[bound] = cumulative
+            snapshot[label_values] = (buckets, series[-1])
+        return snapshot
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, (buckets, total) in sorted(self._snapshot().items()):
+            names = (*self.labels, "le")
+            for bound, count in buckets.items():
+                lines.append(f"{self.name}_bucket{_format_labels(names, (*label_values, bound))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, label_values)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, label_values)} {buckets['+Inf']}")
+        return lines
+
+_registry = []
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# --- HTTP ---
+
+http_requests = register(Counter("http_requests_total", "Requests served.", ("method", "route", "status")))
+http_latency = register(Histogram("http_request_duration_seconds", "Request latency.", ("method", "route")))
+http_in_flight = register(Gauge("http_requests_in_flight", "Requests being served."))
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no per-request task or body buffering) that times every
+    HTTP request. Routes are labelled by their path template, e.g. /doctors/{doctor_id},
+    so label cardinality stays bounded; requests that match no route share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        http_in_flight.add(1)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.add(-1)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            http_requests.inc(scope["method"], route, status)
+            http_latency.observe(time.perf_counter() - start, scope["method"], route)
+
+# --- Database ---
+
+db_calls = register(Counter("db_calls_total", "Data-access function calls.", ("function", "outcome")))
+db_call_latency = register(Histogram("db_call_duration_seconds", "Data-access function time, end to end.", ("function",)))
+db_query_seconds = register(Histogram("db_query_duration_seconds", "Time spent executing SQL per data-access call.", ("function",)))
+db_acquire_seconds = register(Histogram("db_connection_acquire_seconds", "Time waiting for a pool connection per data-access call.", ("function",)))
+db_rows = register(Histogram("db_rows_returned", "Rows returned per data-access call.", ("function",), buckets=ROW_BUCKETS))
+db_statements = register(Counter("db_statements_total", "SQL statements executed.", ("function",)))
+
+# Per-call accumulators: [statements, query seconds, acquire seconds], set while a data-access function runs.
+_current_call = ContextVar("db_call", default=None)
+
+def _on_statement(query, params, seconds, rowcount):
+    call = _current_call.get()
+    if call is not None:
+        call[0] += 1
+        call[1] += seconds
+
+def _on_acquire(seconds):
+    call = _current_call.get()
+    if call is not None:
+        call[2] += seconds
+
+def _row_count(result):
+    if result is None:
+        return 0
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    return 1
+
+def _record(name, start, call, result, outcome):
+    db_calls.inc(name, outcome)
+    db_call_latency.observe(time.perf_counter() - start, name)
+    db_query_seconds.observe(call[1], name)
+    db_acquire_seconds.observe(call[2], name)
+    db_statements.inc(name, amount=call[0])
+    if outcome == "ok":
+        db_rows.observe(_row_count(result), name)
+
+def instrument_db_call(name, func):
+    """Wraps a db_actions function (run inside the worker thread) to record its metrics."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        call = [0, 0.0, 0.0]
+        token = _current_call.set(call)
+        start = time.perf_counter()
+        result, outcome = None, "error"
+        try:
+            result = func(*args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            _current_call.reset(token)
+            _record(name, start, call, result, outcome)
+    return wrapper
+
+def instrument_async_db_call(name, func):
+    """The async_db_actions counterpart of instrument_db_call()."""
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        call = [0, 0.0, 0.0]
+        token = _current_call.set(call)
+        start = time.perf_counter()
+        result, outcome = None, "error"
+        try:
+            result = await func(*args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            _current_call.reset(token)
+            _record(name, start, call, result, outcome)
+    return wrapper
+
+# --- Pools and caches, read at scrape time ---
+
+def _hashing_stats():
+    import hashing
+    stats = hashing.pool.stats()
+    return {(key,): stats[key] for key in ("workers", "in_flight", "queue_depth", "rejected", "completed", "wait_seconds_sum")}
+
+def _hashing_latency():
+    import hashing
+    stats = hashing.pool.stats()
+    return {(): (stats["latency_buckets"], stats["hash_seconds_sum"])}
+
+def _appointment_events_stats():
+    import events
+    return {(key,): value for key, value in events.appointments.stats().items()}
+
+def _admission_stats():
+    import ratelimit
+    return {(key,): value for key, value in ratelimit.admission.stats().items()}
+
+def _cache_stats():
+    import cache
+    values = {}
+    for name, store in (("principals", cache.principals), ("articles", cache.articles), ("search", cache.search_results)):
+        for key, value in store.stats().items():
+            values[(name, key)] = value
+    return values
+
+register(Gauge("db_pool", "Database connection pool state, per primary/replica pool.", ("pool", "stat"), collect=database.pool_stats))
+register(Gauge("hashing_pool", "bcrypt worker pool state (rejected/completed/wait_seconds_sum are running totals; "
+                              "wait_seconds_sum is time spent queued for a worker).", ("stat",), collect=_hashing_stats))
+register(Histogram("hashing_seconds", "bcrypt time per hash or verify, in the worker.", collect=_hashing_latency))
+register(Gauge("admission", "Requests in flight, and requests shed (503) or rate limited (429) per budget, with the clients tracked for each "
+                           "(shed/rejected_* are running totals).", ("stat",), collect=_admission_stats))
+register(Gauge("cache", "In-process cache sizes and hit/miss totals.", ("cache", "stat"), collect=_cache_stats))
+register(Gauge("appointment_events", "Appointment push streams and the shared LISTEN connection (delivered/resyncs are running totals).",
+               ("stat",), collect=_appointment_events_stats))
+
+if METRICS_ENABLED:
+    database.statement_observers.append(_on_statement)
+    database.acquire_observers.append(_on_acquire)
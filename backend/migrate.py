@@ -0,0 +1,247 @@
+import os
+import glob
+import hashlib
+import json
+import re
+import uuid
+import queries as q
+
+# Versioned schema migrations, run by `python manage.py migrate`.
+#
+# Every file in migrations/ is NNN_name.sql and is applied once, in order, and
+# recorded in schema_migrations with a checksum. A file runs in a single
+# transaction unless its first line is `-- migrate: no-transaction`; those are
+# run one statement at a time in autocommit mode so they can use
+# CREATE INDEX CONCURRENTLY, and must therefore be safe to re-run (IF NOT EXISTS).
+# Such statements are split on a `;` at the end of a line. A statement preceded
+# by a `-- skip-if: <query>` comment is skipped when that query returns true.
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+NO_TRANSACTION = "-- migrate: no-transaction"
+# Held for the whole run so two deploys can't migrate at once.
+ADVISORY_LOCK_ID = 7_341_002_017
+
+CREATE_SCHEMA_MIGRATIONS = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version text PRIMARY KEY,
+        name text NOT NULL,
+        checksum text NOT NULL,
+        applied_at timestamptz NOT NULL DEFAULT now()
+    );
+"""
+
+_FILENAME = re.compile(r"^(\d+)_(.+)\.sql$")
+_SKIP_IF = re.compile(r"^--\s*skip-if:\s*(.+)$", re.MULTILINE)
+_CONCURRENT_INDEX = re.compile(r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE)
+
+class Migration:
+    def __init__(self, path):
+        self.path = path
+        self.filename = os.path.basename(path)
+        self.version, self.name = _FILENAME.match(self.filename).groups()
+        with open(path) as f:
+            self.sql = f.read()
+        self.checksum = hashlib.sha256(self.sql.encode()).hexdigest()
+        self.transactional = not self.sql.startswith(NO_TRANSACTION)
+
+    def statements(self):
+        """The file's statements, for no-transaction migrations."""
+        chunks = re.split(r";[ \t]*$", self.sql, flags=re.MULTILINE)
+        return [chunk.strip() for chunk in chunks if re.sub(r"--.*$", "", chunk, flags=re.MULTILINE).strip()]
+
+def discover(directory=MIGRATIONS_DIR):
+    migrations = [Migration(path) for path in sorted(glob.glob(os.path.join(directory, "*.sql")))
+                  if _FILENAME.match(os.path.basename(path))]
+    versions = [m.version for m in migrations]
+    if len(set(versions)) != len(versions):
+        raise SystemExit(f"Duplicate migration versions in {directory}.")
+    return migrations
+
+def applied_migrations(conn):
+    """{version: checksum} of every recorded migration."""
+    with conn.cursor() as cur:
+        cur.execute(CREATE_SCHEMA_MIGRATIONS)
+        cur.execute("SELECT version, checksum FROM schema_migrations;")
+        rows = dict(cur.fetchall())
+    conn.commit()
+    return rows
+
+def _record(cur, migration):
+    cur.execute(
+        "INSERT INTO schema_migrations (version, name, checksum) VALUES (%s, %s, %s) ON CONFLICT (version) DO NOTHING;",
+        (migration.version, migration.name, migration.checksum),
+    )
+
+def _drop_invalid_index(cur, statement):
+    # A failed CREATE INDEX CONCURRENTLY leaves an INVALID index behind, which
+    # IF NOT EXISTS would then silently keep; drop it so the build is retried.
+    match = _CONCURRENT_INDEX.search(statement)
+    if not match:
+        return
+    cur.execute("""
+        SELECT c.oid::regclass::text FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid
+        WHERE c.relname = %s AND NOT i.indisvalid;
+    """, (match.group(1),))
+    row = cur.fetchone()
+    if row:
+        print(f"  dropping invalid index {row[0]} left by an earlier failed build")
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {row[0]};")
+
+def _apply(conn, migration):
+    if migration.transactional:
+        with conn.cursor() as cur:
+            cur.execute(migration.sql)
+            _record(cur, migration)
+        conn.commit()
+        return
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            for statement in migration.statements():
+                condition = _SKIP_IF.search(statement)
+                if condition:
+                    cur.execute(condition.group(1))
+                    if cur.fetchone()[0]:
+                        print(f"  skipped: {_first_sql_line(statement)}")
+                        continue
+                _drop_invalid_index(cur, statement)
+                cur.execute(statement)
+            _record(cur, migration)
+    finally:
+        conn.autocommit = False
+
+def _first_sql_line(statement):
+    return next(line for line in statement.splitlines() if line.strip() and not line.lstrip().startswith("--")).strip()
+
+def migrate(conn, target=None, dry_run=False, directory=MIGRATIONS_DIR):
+    """Applies every pending migration up to and including `target`. Returns the applied versions."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s);", (ADVISORY_LOCK_ID,))
+    conn.commit()
+    try:
+        applied = applied_migrations(conn)
+        done = []
+        for migration in discover(directory):
+            if target is not None and migration.version > target:
+                break
+            if migration.version in applied:
+                if applied[migration.version] != migration.checksum:
+                    print(f"warning: {migration.filename} changed after it was applied")
+                continue
+            print(f"{'would apply' if dry_run else 'applying'} {migration.filename}"
+                  f"{'' if migration.transactional else ' (no transaction)'}")
+            if not dry_run:
+                _apply(conn, migration)
+            done.append(migration.version)
+        return done
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s);", (ADVISORY_LOCK_ID,))
+        conn.commit()
+
+def baseline(conn, through, directory=MIGRATIONS_DIR):
+    """Records migrations up to `through` as applied without running them, for databases migrated by hand."""
+    applied = applied_migrations(conn)
+    marked = []
+    with conn.cursor() as cur:
+        for migration in discover(directory):
+            if migration.version > through:
+                break
+            if migration.version not in applied:
+                _record(cur, migration)
+                marked.append(migration.version)
+    conn.commit()
+    return marked
+
+def status(conn, directory=MIGRATIONS_DIR):
+    """(filename, state) for every migration file; state is applied, pending or changed."""
+    applied = applied_migrations(conn)
+    result = []
+    for migration in discover(directory):
+        if migration.version not in applied:
+            state = "pending"
+        elif applied[migration.version] != migration.checksum:
+            state = "changed"
+        else:
+            state = "applied"
+        result.append((migration.filename, state))
+    return result
+
+# --- Query plan verification ---
+
+# Tables estimated to have at least this many rows must not be read with a
+# sequential scan by any API query.
+LARGE_TABLE_ROWS = 10000
+
+SAMPLE_IDS = """
+    SELECT (SELECT id FROM users WHERE role = 'patient' LIMIT 1),
+           (SELECT email FROM users LIMIT 1),
+           (SELECT id FROM doctors LIMIT 1),
+           (SELECT id FROM appointments LIMIT 1),
+           (SELECT id FROM articles LIMIT 1);
+"""
+
+def plan_checks(patient_id, email, doctor_id, appointment_id, article_id):
+    """(name, sql, params) for every statement the db_actions functions run on a request path."""
+    now = "2030-01-01T09:00:00+00:00"
+    patient = {"id": patient_id, "full_name": "Plan Check"}
+    review = {"doctor_id": doctor_id, "appointment_id": appointment_id, "rating": 5}
+    profile = {"full_name": "Plan Check"}
+    idempotency_key = {"user_id": patient_id, "key": "plan-check", "route": "book_appointment", "request_hash": "0" * 64}
+    return [
+        ("get_user_by_email", q.GET_USER_BY_EMAIL, (email,)),
+        ("get_user_by_id", q.GET_USER_BY_ID, (patient_id,)),
+        ("create_new_user", q.CREATE_NEW_USER, ("Plan Check", email, "patient", "!")),
+        ("get_patient_profile", q.GET_PATIENT_PROFILE, (patient_id,)),
+        ("update_patient_profile", q.UPDATE_PATIENT_PROFILE, q.profile_update_params(patient_id, profile)),
+        ("book_new_appointment", q.BOOK_APPOINTMENT, q.booking_params(patient, doctor_id, now)),
+        ("get_patient_appointments", *q.patient_appointments(patient_id, 50)),
+        ("get_patient_appointments (upcoming)", *q.patient_appointments(patient_id, 50, when="upcoming")),
+        ("get_patient_appointments (next page)", *q.patient_appointments(patient_id, 50, after=(now, appointment_id))),
+        ("cancel_appointment", q.CANCEL_APPOINTMENT, (appointment_id, patient_id)),
+        ("get_pending_reviews", q.GET_PENDING_REVIEWS, (patient_id, 5)),
+        ("get_patient_medical_records", *q.patient_medical_records(patient_id, 20)),
+        ("get_patient_medical_records (next page)", *q.patient_medical_records(patient_id, 20, after=(now, appointment_id))),
+        ("iter_patient_medical_records", q.EXPORT_PATIENT_MEDICAL_RECORDS, (patient_id,)),
+        ("add_doctor_review", q.UPSERT_DOCTOR_REVIEW, q.review_params(patient_id, review)),
+        ("store_idempotent_response", q.STORE_IDEMPOTENT_RESPONSE, {**idempotency_key, "status_code": 200, "response": "{}"}),
+        ("get_idempotent_response", q.GET_IDEMPOTENT_RESPONSE, {**idempotency_key, "expire_after": 86400}),
+        ("search_doctors", *q.search_doctors("cardio", 20)),
+        ("get_doctor", q.GET_DOCTOR, (doctor_id,)),
+        ("get_doctor_index_rows (since)", q.GET_DOCTOR_INDEX_ROWS_SINCE, (now,)),
+        ("get_article_summaries", *q.article_summaries(20)),
+        ("get_article", q.GET_ARTICLE, (article_id,)),
+        ("search_pharmacies", q.SEARCH_PHARMACIES, q.name_search_params("apollo")),
+        ("search_labs", q.SEARCH_LABS, q.name_search_params("metro")),
+    ]
+
+def _seq_scans(plan):
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", ()):
+        yield from _seq_scans(child)
+
+def verify_plans(conn, min_rows=LARGE_TABLE_ROWS):
+    """
+    EXPLAINs (without executing) every API query and returns
+    [(name, table, estimated rows)] for sequential scans of tables with at
+    least `min_rows` rows. Run ANALYZE first so the estimates are current.
+    """
+    with conn.cursor() as cur:
+        cur.execute(SAMPLE_IDS)
+        samples = [str(value) if value is not None else str(uuid.uuid4()) for value in cur.fetchone()]
+        cur.execute("SELECT relname, reltuples::bigint FROM pg_class WHERE relkind IN ('r', 'p') AND relnamespace = 'public'::regnamespace;")
+        table_rows = dict(cur.fetchall())
+        problems = []
+        for name, sql, params in plan_checks(*samples):
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cur.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            for table in _seq_scans(plan[0]["Plan"]):
+                rows = table_rows.get(table, 0)
+                if rows >= min_rows:
+                    problems.append((name, table, rows))
+    conn.rollback()
+    return problems
@@ -0,0 +1,22 @@
+-- Trigram indexes for doctor search (db_actions.search_doctors) and the
+-- updated_at column the in-process typeahead index refreshes from.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_doctors_name_trgm ON doctors USING gin (name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_doctors_specialty_trgm ON doctors USING gin (specialty gin_trgm_ops);
+
+ALTER TABLE doctors ADD COLUMN IF NOT EXISTS updated_at timestamptz NOT NULL DEFAULT now();
+CREATE INDEX IF NOT EXISTS idx_doctors_updated_at ON doctors (updated_at);
+
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS doctors_set_updated_at ON doctors;
+CREATE TRIGGER doctors_set_updated_at
+    BEFORE UPDATE ON doctors
+    FOR EACH ROW EXECUTE FUNCTION set_updated_at();
@@ -0,0 +1,45 @@
+-- Per-doctor rating totals, so search and doctor pages read an O(1) row instead
+-- of aggregating doctor_reviews. A trigger keeps the totals in step with every
+-- insert, re-rating (including add_doctor_review's ON CONFLICT ... DO UPDATE
+-- path) and delete, inside the writing transaction.
+-- `python manage.py reconcile-ratings` recomputes them from scratch.
+
+CREATE TABLE IF NOT EXISTS doctor_rating_stats (
+    doctor_id uuid PRIMARY KEY REFERENCES doctors(id) ON DELETE CASCADE,
+    rating_sum bigint NOT NULL DEFAULT 0,
+    rating_count integer NOT NULL DEFAULT 0
+);
+
+CREATE OR REPLACE FUNCTION doctor_rating_stats_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.rating = NEW.rating AND OLD.doctor_id = NEW.doctor_id THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE doctor_rating_stats
+        SET rating_sum = rating_sum - OLD.rating, rating_count = rating_count - 1
+        WHERE doctor_id = OLD.doctor_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO doctor_rating_stats (doctor_id, rating_sum, rating_count)
+        VALUES (NEW.doctor_id, NEW.rating, 1)
+        ON CONFLICT (doctor_id) DO UPDATE
+        SET rating_sum = doctor_rating_stats.rating_sum + EXCLUDED.rating_sum,
+            rating_count = doctor_rating_stats.rating_count + 1;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS doctor_reviews_rating_stats ON doctor_reviews;
+CREATE TRIGGER doctor_reviews_rating_stats
+    AFTER INSERT OR DELETE OR UPDATE OF rating, doctor_id ON doctor_reviews
+    FOR EACH ROW EXECUTE FUNCTION doctor_rating_stats_apply();
+
+-- Backfill. Reviews are locked against writes until this migration commits,
+-- so none can slip in between the trigger and the totals.
+LOCK TABLE doctor_reviews IN SHARE MODE;
+INSERT INTO doctor_rating_stats (doctor_id, rating_sum, rating_count)
+SELECT doctor_id, SUM(rating), COUNT(*) FROM doctor_reviews GROUP BY doctor_id
+ON CONFLICT (doctor_id) DO UPDATE
+SET rating_sum = EXCLUDED.rating_sum, rating_count = EXCLUDED.rating_count;
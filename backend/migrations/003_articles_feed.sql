@@ -0,0 +1,5 @@
+-- Keyset index for the paginated articles feed (newest first).
+
+CREATE INDEX IF NOT EXISTS idx_articles_published_feed
+    ON articles (published_at DESC, id DESC)
+    WHERE published_at IS NOT NULL;
@@ -0,0 +1,8 @@
+-- Composite indexes so each page of a patient's appointments or prescriptions
+-- is an index range scan, in either direction, instead of a sort of their whole history.
+
+CREATE INDEX IF NOT EXISTS idx_appointments_patient_slot
+    ON appointments (patient_id, slot DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_prescriptions_patient_created
+    ON prescriptions (patient_id, created_at DESC, id DESC);
@@ -0,0 +1,53 @@
+-- Slot inventory: one row per bookable (doctor, slot). Booking claims an open
+-- row and inserts the appointment in a single statement (queries.BOOK_APPOINTMENT),
+-- so two patients can never take the same slot; cancelling frees it again.
+--
+-- doctors.available_slots stays the place doctors publish their slots; a trigger
+-- mirrors every change into doctor_slots, never touching slots already booked.
+
+CREATE TABLE IF NOT EXISTS doctor_slots (
+    doctor_id uuid NOT NULL REFERENCES doctors(id) ON DELETE CASCADE,
+    slot timestamptz NOT NULL,
+    appointment_id uuid UNIQUE REFERENCES appointments(id) ON DELETE SET NULL,
+    PRIMARY KEY (doctor_id, slot)
+);
+
+-- Open slots per doctor, for the available_slots shown on doctor pages and search.
+CREATE INDEX IF NOT EXISTS idx_doctor_slots_open
+    ON doctor_slots (doctor_id, slot) WHERE appointment_id IS NULL;
+
+CREATE OR REPLACE FUNCTION doctor_slots_sync() RETURNS trigger AS $$
+BEGIN
+    DELETE FROM doctor_slots ds
+    WHERE ds.doctor_id = NEW.id AND ds.appointment_id IS NULL
+      AND ds.slot <> ALL (SELECT s::timestamptz FROM unnest(COALESCE(NEW.available_slots, '{}')) s);
+    INSERT INTO doctor_slots (doctor_id, slot)
+    SELECT NEW.id, s::timestamptz FROM unnest(COALESCE(NEW.available_slots, '{}')) s
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS doctors_slots_sync ON doctors;
+CREATE TRIGGER doctors_slots_sync
+    AFTER INSERT OR UPDATE OF available_slots ON doctors
+    FOR EACH ROW EXECUTE FUNCTION doctor_slots_sync();
+
+-- Backfill, then attach slots to the appointments already scheduled in them.
+LOCK TABLE doctors, appointments IN SHARE ROW EXCLUSIVE MODE;
+
+INSERT INTO doctor_slots (doctor_id, slot)
+SELECT d.id, s::timestamptz FROM doctors d, unnest(d.available_slots) s
+ON CONFLICT DO NOTHING;
+
+UPDATE doctor_slots ds SET appointment_id = a.id
+FROM appointments a
+WHERE a.doctor_id = ds.doctor_id AND a.slot = ds.slot AND a.status = 'scheduled';
+
+-- The last line of defence against double-booking, whatever path writes appointments.
+-- This fails if a slot is already double-booked; find those with
+--   SELECT doctor_id, slot FROM appointments WHERE status = 'scheduled'
+--   GROUP BY 1, 2 HAVING count(*) > 1;
+-- and cancel the duplicates before re-running.
+CREATE UNIQUE INDEX IF NOT EXISTS uq_appointments_doctor_slot_scheduled
+    ON appointments (doctor_id, slot) WHERE status = 'scheduled';
@@ -0,0 +1,24 @@
+-- migrate: no-transaction
+-- Indexes for the remaining columns the API filters on. They are built with
+-- CONCURRENTLY so reads and writes carry on meanwhile, which is why this file is
+-- applied by `python manage.py migrate` one statement at a time, outside a transaction.
+-- (appointments (patient_id, slot) and prescriptions (patient_id, created_at) are
+-- covered by migrations/004_patient_history_indexes.sql.)
+
+-- Logins look users up by email, and registration relies on it being unique.
+-- Most databases already have this as a UNIQUE constraint, so it's only built if
+-- no valid index leads with email. It fails on duplicate emails; find them with
+--   SELECT email FROM users GROUP BY email HAVING count(*) > 1;
+-- skip-if: SELECT EXISTS (SELECT 1 FROM pg_index i JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0] WHERE i.indrelid = 'users'::regclass AND a.attname = 'email' AND i.indisvalid)
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_users_email ON users (email);
+
+-- A doctor's reviews (and the cascades from doctors).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_doctor_reviews_doctor ON doctor_reviews (doctor_id);
+
+-- Pharmacy and lab search is name ILIKE '%q%' AND is_active. A btree on a boolean
+-- wouldn't help; a trigram index over the active rows serves both filters at once.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pharmacies_active_name_trgm
+    ON pharmacies USING gin (name gin_trgm_ops) WHERE is_active;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_labs_active_name_trgm
+    ON labs USING gin (name gin_trgm_ops) WHERE is_active;
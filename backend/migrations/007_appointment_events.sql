@@ -0,0 +1,31 @@
+-- Appointment status changes, pushed to patients over /patient/appointment-events.
+-- Every new appointment and every change of status or slot sends a small JSON
+-- delta on the appointment_events channel when its transaction commits (the API's
+-- own writes and anything done doctor-side alike). One listener per API process
+-- fans the deltas out to that patient's open streams (see events.py).
+-- NOTIFY payloads are capped at 8000 bytes; these are a few hundred.
+
+CREATE OR REPLACE FUNCTION appointments_notify() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND OLD.status IS NOT DISTINCT FROM NEW.status AND OLD.slot = NEW.slot THEN
+        RETURN NULL;
+    END IF;
+    PERFORM pg_notify('appointment_events', json_build_object(
+        'op', lower(TG_OP),
+        'id', NEW.id,
+        'patient_id', NEW.patient_id,
+        'doctor_id', NEW.doctor_id,
+        'doctor_name', (SELECT name FROM doctors WHERE id = NEW.doctor_id),
+        'slot', NEW.slot,
+        'status', NEW.status
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS appointments_notify ON appointments;
+CREATE TRIGGER appointments_notify
+    AFTER INSERT OR UPDATE OF status, slot ON appointments
+    FOR EACH ROW
+    WHEN (NEW.patient_id IS NOT NULL)
+    EXECUTE FUNCTION appointments_notify();
@@ -0,0 +1,39 @@
+-- Directory changes, for the API's cached search results (cache.search_results).
+-- Any statement that changes doctors, clinics, pharmacies or labs, or books or
+-- frees a doctor_slots row (doctor results show available_slots), sends the
+-- table's name on the directory_changes channel when its transaction commits;
+-- each API process listens (events.DirectoryChanges) and drops the affected
+-- searches. Postgres folds identical notifications within a transaction, so a
+-- bulk import sends one per table.
+
+CREATE OR REPLACE FUNCTION directory_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('directory_changes', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS directory_notify ON doctors;
+CREATE TRIGGER directory_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON doctors
+    FOR EACH STATEMENT EXECUTE FUNCTION directory_notify();
+
+DROP TRIGGER IF EXISTS directory_notify ON clinics;
+CREATE TRIGGER directory_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON clinics
+    FOR EACH STATEMENT EXECUTE FUNCTION directory_notify();
+
+DROP TRIGGER IF EXISTS directory_notify ON pharmacies;
+CREATE TRIGGER directory_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON pharmacies
+    FOR EACH STATEMENT EXECUTE FUNCTION directory_notify();
+
+DROP TRIGGER IF EXISTS directory_notify ON labs;
+CREATE TRIGGER directory_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON labs
+    FOR EACH STATEMENT EXECUTE FUNCTION directory_notify();
+
+DROP TRIGGER IF EXISTS directory_notify ON doctor_slots;
+CREATE TRIGGER directory_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON doctor_slots
+    FOR EACH STATEMENT EXECUTE FUNCTION directory_notify();
@@ -0,0 +1,20 @@
+-- Idempotency keys for patient writes (booking, cancelling, reviewing).
+-- A client sends the same Idempotency-Key header with every retry of one
+-- request. The first attempt's response is stored here in the same transaction
+-- as its write, so later attempts replay it instead of running the write again
+-- (see idempotency.py).
+-- Keys are per user, and rows older than IDEMPOTENCY_KEY_TTL_HOURS are removed
+-- by `python manage.py purge-idempotency-keys`.
+
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    user_id      uuid        NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    key          text        NOT NULL,
+    route        text        NOT NULL,
+    request_hash text        NOT NULL,
+    status_code  integer     NOT NULL,
+    response     text        NOT NULL,
+    created_at   timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (user_id, key)
+);
+
+CREATE INDEX IF NOT EXISTS idempotency_keys_created_at_idx ON idempotency_keys (created_at);
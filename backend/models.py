@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 import uuid
 from datetime import datetime, date
 
@@ -64,6 +64,12 @@ class DoctorPublic(BaseModel):
     class Config:
         from_attributes = True
 
+class DoctorSuggestion(BaseModel):
+    """ A typeahead entry for the doctor search box. """
+    id: uuid.UUID
+    name: str
+    specialty: str
+
 class AppointmentIn(BaseModel):
     """ Data needed to book a new appointment. """
     doctor_id: uuid.UUID
@@ -105,6 +111,10 @@ class PrescriptionRecord(BaseModel):
     class Config:
         from_attributes = True
 
+class PrescriptionExport(PrescriptionRecord):
+    """ A prescription as written by /patient/my-records/export. """
+    doctor_name: Optional[str] = None
+
 # --- NEW: Review Models ---
 class ReviewIn(BaseModel):
     """ Data needed to create a new review. """
@@ -122,6 +132,14 @@ class ReviewOut(BaseModel):
     class Config:
         from_attributes = True
 
+# --- Dashboard Model ---
+class PatientDashboard(BaseModel):
+    """ Everything the patient home screen shows; parts not asked for via `fields` are left out. """
+    profile: Optional[PatientProfile] = None
+    upcoming_appointments: Optional[List[AppointmentOut]] = None
+    recent_prescriptions: Optional[List[PrescriptionRecord]] = None
+    pending_reviews: Optional[List[AppointmentOut]] = None
+
 # --- Other Public Models ---
 class Article(BaseModel):
     id: uuid.UUID
@@ -133,6 +151,14 @@ class Article(BaseModel):
     class Config:
         from_attributes = True
 
+class ArticleSummary(BaseModel):
+    """ A feed entry; the full content comes from /articles/{id}. """
+    id: uuid.UUID
+    title: str
+    excerpt: str
+    author: Optional[str] = None
+    published_at: Optional[datetime] = None
+
 class Pharmacy(BaseModel):
     id: uuid.UUID
     name: str
@@ -151,3 +177,14 @@ class Lab(BaseModel):
     class Config:
         from_attributes = True
 
+# --- Unified Search Models ---
+class SearchResult(BaseModel):
+    """ One /search hit; `type` says which model `item` is. """
+    type: str
+    rank: float
+    item: Union[DoctorPublic, Pharmacy, Lab]
+
+class SearchResults(BaseModel):
+    results: List[SearchResult]
+    partial: bool = False
+    missing: List[str] = []  # types left out because they failed or missed the deadline
@@ -0,0 +1,26 @@
+import base64
+import json
+
+# Opaque keyset cursors: the sort-key values of the last row on a page, as a
+# URL-safe base64 JSON list. List endpoints return the next one in the
+# X-Next-Cursor response header and accept it back as ?cursor=.
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps([str(v) for v in values], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str, *types) -> list:
+    """
+    Returns the cursor's values converted with `types` (one callable per value,
+    e.g. decode_cursor(c, Decimal, uuid.UUID)), or raises ValueError if it is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError
+        return [convert(value) for convert, value in zip(types, values)]
+    except Exception:
+        raise ValueError("Invalid cursor.")
@@ -0,0 +1,366 @@
+# SQL shared by the sync (db_actions) and async (async_db_actions) data-access layers.
+# Both drivers use the same %s placeholder style, so each statement is written once.
+import uuid
+from typing import Dict, Any
+
+# --- AUTH ---
+GET_USER_BY_EMAIL = "SELECT * FROM users WHERE email = %s;"
+
+# The authenticated principal: everything the API shows about a user, but never hashed_password.
+GET_USER_BY_ID = "SELECT id, full_name, email, phone_number, date_of_birth, sex, created_at, role FROM users WHERE id = %s;"
+
+CREATE_NEW_USER = "INSERT INTO users (full_name, email, role, hashed_password) VALUES (%s, %s, %s, %s) RETURNING *;"
+
+# --- PATIENT-SPECIFIC ---
+GET_PATIENT_PROFILE = "SELECT id, full_name, email, phone_number, date_of_birth, sex, created_at, role FROM users WHERE id = %s AND role = 'patient';"
+
+UPDATE_PATIENT_PROFILE = """
+    UPDATE users
+    SET full_name = %s, phone_number = %s, date_of_birth = %s, sex = %s
+    WHERE id = %s AND role = 'patient'
+    RETURNING id, full_name, email, phone_number, date_of_birth, sex, created_at, role;
+"""
+
+def profile_update_params(user_id: uuid.UUID, profile_data: Dict[str, Any]):
+    return (
+        profile_data['full_name'],
+        profile_data.get('phone_number'),
+        profile_data.get('date_of_birth'),
+        profile_data.get('sex'),
+        str(user_id)
+    )
+
+# Claims the open slot and creates the appointment in one statement. The UPDATE
+# only matches while appointment_id IS NULL, so of several concurrent bookers the
+# first one wins and the rest (who wait on its row lock, then re-check) match nothing.
+# The appointment id is generated up front so the slot can point at it.
+BOOK_APPOINTMENT = """
+    WITH claimed AS (
+        UPDATE doctor_slots
+        SET appointment_id = gen_random_uuid()
+        WHERE doctor_id = %(doctor_id)s AND slot = %(slot)s
+          AND appointment_id IS NULL AND slot > now()
+        RETURNING doctor_id, slot, appointment_id
+    )
+    INSERT INTO appointments (id, doctor_id, patient_id, patient_name, slot, status, doctor_user_id)
+    SELECT c.appointment_id, c.doctor_id, %(patient_id)s, %(patient_name)s, c.slot, 'scheduled', d.user_id
+    FROM claimed c
+    JOIN doctors d ON d.id = c.doctor_id
+    RETURNING *;
+"""
+
+def booking_params(patient: Dict[str, Any], doctor_id: uuid.UUID, slot):
+    return {
+        "doctor_id": str(doctor_id),
+        "slot": slot,
+        "patient_id": str(patient['id']),
+        "patient_name": patient['full_name'],
+    }
+
+# Explicitly select a.user_id (which is the same as a.patient_id)
+# to prevent a crash when the frontend tries to read it.
+GET_PATIENT_APPOINTMENTS = """
+    SELECT a.*, a.patient_id as user_id, d.name as doctor_name
+    FROM appointments a
+    LEFT JOIN doctors d ON a.doctor_id = d.id
+    WHERE {conditions}
+    ORDER BY a.slot {direction}, a.id {direction}
+    LIMIT %(limit)s;
+"""
+
+def patient_appointments(user_id: uuid.UUID, limit: int, after=None, when=None, start=None, end=None):
+    """
+    A page of a patient's appointments. when="upcoming" lists future slots soonest
+    first; otherwise (None or "past") the latest slot comes first. `after` is the
+    (slot, id) of the last appointment already returned; start/end bound the slot.
+    """
+    ascending = when == "upcoming"
+    conditions = ["a.patient_id = %(user_id)s"]
+    params = {"user_id": str(user_id), "limit": limit}
+    if when == "upcoming":
+        conditions.append("a.slot > now()")
+    elif when == "past":
+        conditions.append("a.slot <= now()")
+    if start:
+        conditions.append("a.slot >= %(start)s")
+        params["start"] = start
+    if end:
+        conditions.append("a.slot < %(end)s")
+        params["end"] = end
+    if after:
+        op = ">" if ascending else "<"
+        conditions.append(f"(a.slot, a.id) {op} (%(after_slot)s::timestamptz, %(after_id)s::uuid)")
+        params["after_slot"], params["after_id"] = str(after[0]), str(after[1])
+    sql = GET_PATIENT_APPOINTMENTS.format(conditions=" AND ".join(conditions), direction="ASC" if ascending else "DESC")
+    return sql, params
+
+# Completed appointments the patient has not reviewed yet, latest first. The
+# NOT EXISTS probe uses doctor_reviews' UNIQUE (patient_id, appointment_id) index.
+GET_PENDING_REVIEWS = """
+    SELECT a.*, a.patient_id as user_id, d.name as doctor_name
+    FROM appointments a
+    LEFT JOIN doctors d ON a.doctor_id = d.id
+    WHERE a.patient_id = %s AND a.status = 'completed'
+      AND NOT EXISTS (
+          SELECT 1 FROM doctor_reviews r
+          WHERE r.patient_id = a.patient_id AND r.appointment_id = a.id
+      )
+    ORDER BY a.slot DESC, a.id DESC
+    LIMIT %s;
+"""
+
+# Cancels and hands the slot back to the inventory in the same statement.
+CANCEL_APPOINTMENT = """
+    WITH cancelled AS (
+        UPDATE appointments
+        SET status = 'cancelled'
+        WHERE id = %s AND patient_id = %s AND status = 'scheduled'
+        RETURNING *
+    ),
+    freed AS (
+        UPDATE doctor_slots ds
+        SET appointment_id = NULL
+        FROM cancelled
+        WHERE ds.appointment_id = cancelled.id
+    )
+    SELECT * FROM cancelled;
+"""
+
+GET_PATIENT_MEDICAL_RECORDS = """
+    SELECT * FROM prescriptions
+    WHERE {conditions}
+    ORDER BY created_at DESC, id DESC
+    LIMIT %(limit)s;
+"""
+
+def patient_medical_records(user_id: uuid.UUID, limit: int, after=None, start=None, end=None):
+    """A page of a patient's prescriptions, newest first. `after` is the (created_at, id) of the last one returned."""
+    conditions = ["patient_id = %(user_id)s"]
+    params = {"user_id": str(user_id), "limit": limit}
+    if start:
+        conditions.append("created_at >= %(start)s")
+        params["start"] = start
+    if end:
+        conditions.append("created_at < %(end)s")
+        params["end"] = end
+    if after:
+        conditions.append("(created_at, id) < (%(after_created_at)s::timestamptz, %(after_id)s::uuid)")
+        params["after_created_at"], params["after_id"] = str(after[0]), str(after[1])
+    return GET_PATIENT_MEDICAL_RECORDS.format(conditions=" AND ".join(conditions)), params
+
+# Every prescription of a patient, newest first, for /patient/my-records/export.
+# Read through a server-side cursor, a batch at a time.
+EXPORT_PATIENT_MEDICAL_RECORDS = """
+    SELECT p.*, d.name AS doctor_name
+    FROM prescriptions p LEFT JOIN doctors d ON d.id = p.doctor_id
+    WHERE p.patient_id = %s
+    ORDER BY p.created_at DESC, p.id DESC;
+"""
+
+# Only for the patient's own completed appointment with that doctor; otherwise no row.
+UPSERT_DOCTOR_REVIEW = """
+    INSERT INTO doctor_reviews (doctor_id, patient_id, appointment_id, rating, comment)
+    SELECT a.doctor_id, a.patient_id, a.id, %(rating)s, %(comment)s
+    FROM appointments a
+    WHERE a.id = %(appointment_id)s AND a.patient_id = %(patient_id)s
+      AND a.doctor_id = %(doctor_id)s AND a.status = 'completed'
+    ON CONFLICT (patient_id, appointment_id) DO UPDATE
+    SET rating = EXCLUDED.rating, comment = EXCLUDED.comment
+    RETURNING *;
+"""
+
+def review_params(user_id: uuid.UUID, review_data: Dict[str, Any]):
+    return {
+        "doctor_id": str(review_data['doctor_id']),
+        "patient_id": str(user_id),
+        "appointment_id": str(review_data['appointment_id']),
+        "rating": review_data['rating'],
+        "comment": review_data.get('comment'),
+    }
+
+# Recomputes every doctor's rating totals from doctor_reviews, fixing any drift.
+# Run after LOCK_DOCTOR_REVIEWS in the same transaction so no review lands mid-way.
+LOCK_DOCTOR_REVIEWS = "LOCK TABLE doctor_reviews IN SHARE MODE;"
+
+RECONCILE_DOCTOR_RATING_STATS = """
+    WITH actual AS (
+        SELECT doctor_id, SUM(rating) AS rating_sum, COUNT(*) AS rating_count
+        FROM doctor_reviews GROUP BY doctor_id
+    ),
+    upserted AS (
+        INSERT INTO doctor_rating_stats (doctor_id, rating_sum, rating_count)
+        SELECT doctor_id, rating_sum, rating_count FROM actual
+        ON CONFLICT (doctor_id) DO UPDATE
+        SET rating_sum = EXCLUDED.rating_sum, rating_count = EXCLUDED.rating_count
+        WHERE (doctor_rating_stats.rating_sum, doctor_rating_stats.rating_count)
+              IS DISTINCT FROM (EXCLUDED.rating_sum, EXCLUDED.rating_count)
+        RETURNING doctor_id
+    ),
+    zeroed AS (
+        UPDATE doctor_rating_stats s SET rating_sum = 0, rating_count = 0
+        WHERE s.rating_count <> 0 AND NOT EXISTS (SELECT 1 FROM actual a WHERE a.doctor_id = s.doctor_id)
+        RETURNING doctor_id
+    )
+    SELECT (SELECT COUNT(*) FROM upserted) + (SELECT COUNT(*) FROM zeroed) AS corrected;
+"""
+
+# --- IDEMPOTENCY KEYS ---
+# Records the response to a keyed write in the write's own transaction, so the
+# two commit together (see idempotency.respond). If the key is already taken the
+# INSERT fails on idempotency_keys_pkey and the write is rolled back with it; a
+# concurrent request with the same key waits for the first one's transaction to
+# end before it gets that answer.
+STORE_IDEMPOTENT_RESPONSE = """
+    INSERT INTO idempotency_keys (user_id, key, route, request_hash, status_code, response)
+    VALUES (%(user_id)s, %(key)s, %(route)s, %(request_hash)s, %(status_code)s, %(response)s);
+"""
+
+# The stored response to replay for a key. A key stored more than
+# %(expire_after)s seconds ago is deleted instead (and no row returned), so the
+# request can run afresh.
+GET_IDEMPOTENT_RESPONSE = """
+    WITH expired AS (
+        DELETE FROM idempotency_keys
+        WHERE user_id = %(user_id)s AND key = %(key)s
+          AND created_at < now() - make_interval(secs => %(expire_after)s)
+        RETURNING 1
+    )
+    SELECT route, request_hash, status_code, response
+    FROM idempotency_keys
+    WHERE user_id = %(user_id)s AND key = %(key)s AND NOT EXISTS (SELECT 1 FROM expired);
+"""
+
+PURGE_IDEMPOTENCY_KEYS = "DELETE FROM idempotency_keys WHERE created_at < now() - make_interval(secs => %s);"
+
+# --- PUBLIC ---
+# Public doctor fields. Ratings come from the trigger-maintained doctor_rating_stats
+# (migrations/002_doctor_rating_stats.sql); callers join it as `s` and clinics as `c`.
+DOCTOR_PUBLIC_COLUMNS = """
+        d.id, d.name, d.specialty, d.experience, d.bio, c.name as clinic_name,
+        ARRAY(
+            SELECT to_char(ds.slot AT TIME ZONE 'UTC', 'YYYY-MM-DD"T"HH24:MI:SS"Z"')
+            FROM doctor_slots ds
+            WHERE ds.doctor_id = d.id AND ds.appointment_id IS NULL AND ds.slot > now()
+            ORDER BY ds.slot
+        ) as available_slots,
+        COALESCE(s.rating_sum::numeric / NULLIF(s.rating_count, 0), 0) as average_rating,
+        COALESCE(s.rating_count, 0) as review_count"""
+
+GET_DOCTOR = f"""
+    SELECT {DOCTOR_PUBLIC_COLUMNS}
+    FROM doctors d
+    LEFT JOIN clinics c ON d.clinic_id = c.id
+    LEFT JOIN doctor_rating_stats s ON s.doctor_id = d.id
+    WHERE d.id = %s;
+"""
+
+# Doctor search is served by the pg_trgm GIN indexes from migrations/001_doctor_search.sql.
+# `%%` (similarity) and `<%%` (word similarity) make it typo tolerant, ILIKE keeps plain
+# substring matches, and results are ranked by how well the name or specialty matches.
+# Only the requested page is joined to clinics and rating totals.
+SEARCH_DOCTORS = f"""
+    WITH matches AS (
+        SELECT d.id,
+               ROUND((
+                   GREATEST(word_similarity(%(q)s, d.name), word_similarity(%(q)s, d.specialty))
+                   + CASE WHEN d.name ILIKE %(prefix)s OR d.specialty ILIKE %(prefix)s THEN 1
+                          WHEN d.name ILIKE %(contains)s OR d.specialty ILIKE %(contains)s THEN 0.5
+                          ELSE 0 END
+               )::numeric, 6) AS rank
+        FROM doctors d
+        WHERE d.name %% %(q)s OR d.specialty %% %(q)s
+           OR %(q)s <%% d.name OR %(q)s <%% d.specialty
+           OR d.name ILIKE %(contains)s OR d.specialty ILIKE %(contains)s
+    ),
+    page AS (
+        SELECT id, rank FROM matches
+        {{keyset}}
+        ORDER BY rank DESC, id DESC
+        LIMIT %(limit)s OFFSET %(offset)s
+    )
+    SELECT {DOCTOR_PUBLIC_COLUMNS}, p.rank
+    FROM page p
+    JOIN doctors d ON d.id = p.id
+    LEFT JOIN clinics c ON d.clinic_id = c.id
+    LEFT JOIN doctor_rating_stats s ON s.doctor_id = d.id
+    ORDER BY p.rank DESC, p.id DESC;
+"""
+SEARCH_DOCTORS_KEYSET = "WHERE (rank, id) < (%(after_rank)s::numeric, %(after_id)s::uuid)"
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def search_doctors(query: str, limit: int = 20, offset: int = 0, after=None):
+    """
+    Builds the doctor search statement and its parameters.
+    `after` is the (rank, id) of the last row already seen, for keyset pagination.
+    """
+    query = " ".join(query.split())
+    params = {
+        "q": query,
+        "prefix": f"{_escape_like(query)}%",
+        "contains": f"%{_escape_like(query)}%",
+        "limit": limit,
+        "offset": offset,
+    }
+    keyset = ""
+    if after:
+        keyset = SEARCH_DOCTORS_KEYSET
+        params["after_rank"], params["after_id"] = str(after[0]), str(after[1])
+    return SEARCH_DOCTORS.replace("{keyset}", keyset), params
+
+# Rows for the in-process typeahead index (search_index.py). `since` limits the
+# result to doctors changed after that time, using the trigger-maintained updated_at.
+GET_DOCTOR_INDEX_ROWS = "SELECT id, name, specialty, updated_at FROM doctors"
+GET_DOCTOR_INDEX_ROWS_SINCE = "SELECT id, name, specialty, updated_at FROM doctors WHERE updated_at > %s"
+
+# The feed lists summaries only; full content is fetched per article.
+ARTICLE_EXCERPT_LENGTH = 280
+
+GET_ARTICLE_SUMMARIES = f"""
+    SELECT id, title, author, published_at,
+           CASE WHEN length(content) > {ARTICLE_EXCERPT_LENGTH}
+                THEN rtrim(left(content, {ARTICLE_EXCERPT_LENGTH})) || '…'
+                ELSE content END AS excerpt
+    FROM articles
+    WHERE published_at IS NOT NULL {{keyset}}
+    ORDER BY published_at DESC, id DESC
+    LIMIT %(limit)s;
+"""
+ARTICLE_SUMMARIES_KEYSET = "AND (published_at, id) < (%(after_published_at)s::timestamptz, %(after_id)s::uuid)"
+
+def article_summaries(limit: int, after=None):
+    """`after` is the (published_at, id) of the last article already returned."""
+    params = {"limit": limit}
+    keyset = ""
+    if after:
+        keyset = ARTICLE_SUMMARIES_KEYSET
+        params["after_published_at"], params["after_id"] = str(after[0]), str(after[1])
+    return GET_ARTICLE_SUMMARIES.replace("{keyset}", keyset), params
+
+GET_ARTICLE = "SELECT * FROM articles WHERE id = %s AND published_at IS NOT NULL;"
+
+# Active pharmacies or labs whose name contains the query, best matches first.
+# `rank` is on the same scale as the doctor search rank so /search can merge them.
+SEARCH_BY_NAME = """
+    SELECT id, name, address, phone_number,
+           ROUND((
+               word_similarity(%(q)s, name)
+               + CASE WHEN name ILIKE %(prefix)s THEN 1 ELSE 0.5 END
+           )::numeric, 6) AS rank
+    FROM {table}
+    WHERE name ILIKE %(contains)s AND is_active = TRUE
+    ORDER BY rank DESC, name, id
+    LIMIT %(limit)s;
+"""
+SEARCH_PHARMACIES = SEARCH_BY_NAME.format(table="pharmacies")
+SEARCH_LABS = SEARCH_BY_NAME.format(table="labs")
+
+def name_search_params(query: str, limit: int = 10):
+    query = " ".join(query.split())
+    return {
+        "q": query,
+        "prefix": f"{_escape_like(query)}%",
+        "contains": f"%{_escape_like(query)}%",
+        "limit": limit,
+    }
@@ -0,0 +1,188 @@
+import os
+import math
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+from starlette.responses import JSONResponse
+
+from cache import TTLCache
+
+load_dotenv()
+
+# --- Configuration ---
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Budgets are "<requests>/<seconds>": a client may burst that many requests and
+# then continues at that average rate. "0" means unlimited.
+# Every request from one address, across all routes.
+RATE_LIMIT_IP = os.getenv("RATE_LIMIT_IP", "600/60")
+# Per route group, per signed-in user (or per address when there is no valid token).
+RATE_LIMIT_AUTH = os.getenv("RATE_LIMIT_AUTH", "10/60")
+RATE_LIMIT_SEARCH = os.getenv("RATE_LIMIT_SEARCH", "120/60")
+RATE_LIMIT_PATIENT_WRITES = os.getenv("RATE_LIMIT_PATIENT_WRITES", "30/60")
+# Requests served at once per worker; beyond that new ones get a 503 straight away
+# rather than queueing for threads and connections. 0 turns shedding off.
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "200"))
+# Buckets kept per worker; the least recently seen clients are forgotten (and start full) first.
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "100000"))
+
+SHED_RETRY_AFTER = 1
+SEARCH_PATHS = frozenset(("/search", "/doctors/search", "/doctors/suggest", "/pharmacies/search", "/labs/search"))
+# Held open for as long as the client wants; they don't count towards MAX_CONCURRENT_REQUESTS.
+LONG_LIVED_PATHS = frozenset(("/patient/appointment-events", "/patient/my-records/export"))
+EXEMPT_PATHS = frozenset(("/metrics",))
+READ_METHODS = frozenset(("GET", "HEAD", "OPTIONS"))
+
+def parse_budget(spec):
+    """"30/60" -> (30 requests of burst, 0.5 requests/second), or None for unlimited."""
+    spec = (spec or "").strip()
+    if spec in ("", "0"):
+        return None
+    count, _, seconds = spec.partition("/")
+    count, seconds = float(count), float(seconds or 1)
+    if count <= 0 or seconds <= 0:
+        raise ValueError(f"Invalid rate limit budget: {spec!r}")
+    return count, count / seconds
+
+class TokenBuckets:
+    """
+    One token bucket per key, refilled lazily on each take(). Buckets for the
+    least recently seen keys are dropped beyond `max_keys`, so memory is bounded
+    however many clients there are. Event loop only, so there is no lock.
+    """
+
+    def __init__(self, capacity, rate, max_keys=RATE_LIMIT_MAX_CLIENTS):
+        self.capacity = capacity
+        self.rate = rate
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> [tokens, refilled_at]
+        self.rejected = 0
+
+    def take(self, key, now):
+        """0 if a token was taken, otherwise the seconds until one is available."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.capacity, now]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(self.capacity, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0
+        self.rejected += 1
+        return (1 - bucket[0]) / self.rate
+
+    def __len__(self):
+        return len(self._buckets)
+
+def route_group(method, path):
+    if path.startswith("/auth/"):
+        return "auth"
+    if path in SEARCH_PATHS:
+        return "search"
+    if path.startswith("/patient/") and method not in READ_METHODS:
+        return "patient_writes"
+    return None
+
+# Bearer token -> user id ("" if it doesn't verify), so each token is decoded once
+# per worker rather than on every request.
+_token_users = TTLCache(maxsize=RATE_LIMIT_MAX_CLIENTS, ttl=60)
+
+def _user_id(headers):
+    authorization = headers.get(b"authorization", b"")
+    if not authorization.startswith(b"Bearer "):
+        return None
+    token = authorization[7:].decode("latin-1")
+    user_id = _token_users.get(token)
+    if user_id is None:
+        from jose import JWTError, jwt
+        from auth import SECRET_KEY, ALGORITHM
+        try:
+            user_id = str(jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("user_id") or "")
+        except JWTError:
+            user_id = ""
+        _token_users.set(token, user_id)
+    return user_id or None
+
+def _reject(status_code, detail, retry_after):
+    return JSONResponse(status_code=status_code, content={"detail": detail},
+                        headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+class Admission:
+    """
+    Decides whether a request may start, before any work is done:
+    - 503 when MAX_CONCURRENT_REQUESTS are already being served (load shedding);
+    - 429 when the client's address has used up RATE_LIMIT_IP;
+    - 429 when the route group's budget (auth, search, patient writes) is used up
+      for the signed-in user, or for the address of anonymous requests.
+    Both answers carry Retry-After. Limits are per worker process, so with N
+    workers a client can get up to N times the budget. Behind a proxy, run
+    uvicorn with --proxy-headers so the client address is the real one.
+    """
+
+    def __init__(self):
+        budget = parse_budget(RATE_LIMIT_IP)
+        self.ip_buckets = TokenBuckets(*budget) if budget else None
+        self.group_buckets = {}
+        for group, spec in (("auth", RATE_LIMIT_AUTH), ("search", RATE_LIMIT_SEARCH),
+                            ("patient_writes", RATE_LIMIT_PATIENT_WRITES)):
+            budget = parse_budget(spec)
+            if budget:
+                self.group_buckets[group] = TokenBuckets(*budget)
+        self.in_flight = 0
+        self.shed = 0
+
+    def check(self, scope, long_lived):
+        """A response to send instead of running the request, or None to let it through."""
+        if MAX_CONCURRENT_REQUESTS and not long_lived and self.in_flight >= MAX_CONCURRENT_REQUESTS:
+            self.shed += 1
+            return _reject(503, "Service is busy, please retry.", SHED_RETRY_AFTER)
+        now = time.monotonic()
+        client = scope.get("client")
+        address = client[0] if client else "unknown"
+        if self.ip_buckets is not None:
+            wait = self.ip_buckets.take(address, now)
+            if wait:
+                return _reject(429, "Too many requests, please slow down.", wait)
+        buckets = self.group_buckets.get(route_group(scope["method"], scope["path"]))
+        if buckets is not None:
+            user_id = _user_id(dict(scope["headers"]))
+            wait = buckets.take(("user", user_id) if user_id else ("ip", address), now)
+            if wait:
+                return _reject(429, "Too many requests, please slow down.", wait)
+        return None
+
+    def stats(self):
+        values = {"in_flight": self.in_flight, "shed": self.shed}
+        if self.ip_buckets is not None:
+            values["rejected_ip"] = self.ip_buckets.rejected
+            values["clients_ip"] = len(self.ip_buckets)
+        for group, buckets in self.group_buckets.items():
+            values[f"rejected_{group}"] = buckets.rejected
+            values[f"clients_{group}"] = len(buckets)
+        return values
+
+admission = Admission()
+
+class AdmissionMiddleware:
+    """Pure ASGI middleware applying `admission` to every HTTP request except CORS preflights and /metrics."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or scope["path"] in EXEMPT_PATHS:
+            return await self.app(scope, receive, send)
+        long_lived = scope["path"] in LONG_LIVED_PATHS
+        rejection = admission.check(scope, long_lived)
+        if rejection is not None:
+            return await rejection(scope, receive, send)
+        if long_lived:
+            return await self.app(scope, receive, send)
+        admission.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            admission.in_flight -= 1
@@ -0,0 +1,119 @@
+import os
+import csv
+import io
+import json
+from contextlib import aclosing
+from datetime import datetime, timezone
+from html import escape
+from dotenv import load_dotenv
+
+from models import PrescriptionExport
+import serialization
+
+load_dotenv()
+
+# --- Configuration ---
+# Prescriptions read from the database per round trip, and written out per chunk.
+RECORDS_EXPORT_BATCH_SIZE = int(os.getenv("RECORDS_EXPORT_BATCH_SIZE", "500"))
+# Prescriptions per printed page of the printable export.
+RECORDS_PER_PRINT_PAGE = int(os.getenv("RECORDS_PER_PRINT_PAGE", "10"))
+
+# Renderers for /patient/my-records/export. Each turns an async iterator of row
+# batches (db.iter_patient_medical_records) into text chunks, one or more per
+# batch, so the response starts with the first batch and memory stays at one
+# batch however long the history is.
+
+CSV_COLUMNS = ("id", "created_at", "doctor_name", "complaint", "diagnosis", "medicines", "tests",
+               "advice", "follow_up_date", "vitals", "appointment_id")
+
+def _iso(value):
+    return value.isoformat() if value is not None else None
+
+async def ndjson(batches):
+    project = serialization.projection(PrescriptionExport)
+    async for rows in batches:
+        yield b"".join(serialization.dumps(project(row)) + b"\n" for row in rows)
+
+async def csv_rows(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    async for rows in batches:
+        for row in rows:
+            writer.writerow([
+                row["id"], _iso(row["created_at"]), row.get("doctor_name"), row.get("complaint"), row.get("diagnosis"),
+                json.dumps(row.get("medicines") or []), "; ".join(row.get("tests") or []), row.get("advice"),
+                _iso(row.get("follow_up_date")), json.dumps(row["vitals"]) if row.get("vitals") else None,
+                row.get("appointment_id"),
+            ])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+PRINT_STYLE = """
+body { font: 11pt/1.4 Georgia, serif; color: #111; margin: 2em; }
+h1 { font-size: 16pt; margin: 0; } .meta { color: #555; margin-bottom: 1.5em; }
+.page { break-after: page; } .page:last-of-type { break-after: auto; }
+.record { border-top: 1px solid #999; padding: .6em 0; break-inside: avoid; }
+.record h2 { font-size: 12pt; margin: 0 0 .3em; } dl { margin: 0; }
+dt { font-weight: bold; float: left; clear: left; width: 9em; } dd { margin: 0 0 .2em 9em; }
+table { border-collapse: collapse; margin: .3em 0; } td, th { border: 1px solid #ccc; padding: .1em .5em; text-align: left; }
+.folio { color: #777; font-size: 9pt; text-align: right; }
+@media screen { .page { border-bottom: 2px dashed #ccc; margin-bottom: 2em; } }
+"""
+
+def _field(label, value):
+    return f"<dt>{label}</dt><dd>{escape(str(value))}</dd>" if value not in (None, "", [], {}) else ""
+
+def _record_html(row):
+    created = row["created_at"].strftime("%d %b %Y, %H:%M") if row.get("created_at") else ""
+    medicines = row.get("medicines") or []
+    medicine_rows = "".join(
+        "<tr>" + "".join(f"<td>{escape(str(m.get(k) or ''))}</td>" for k in ("name", "dosage", "frequency", "duration")) + "</tr>"
+        for m in medicines
+    )
+    medicines_html = (f"<dt>Medicines</dt><dd><table><tr><th>Name</th><th>Dosage</th><th>Frequency</th><th>Duration</th></tr>"
+                      f"{medicine_rows}</table></dd>") if medicines else ""
+    vitals = ", ".join(f"{k}: {v}" for k, v in (row.get("vitals") or {}).items())
+    return (f'<div class="record"><h2>{escape(created)}{" - " + escape(row["doctor_name"]) if row.get("doctor_name") else ""}</h2><dl>'
+            f'{_field("Complaint", row.get("complaint"))}{_field("Diagnosis", row.get("diagnosis"))}{medicines_html}'
+            f'{_field("Tests", ", ".join(row.get("tests") or []))}{_field("Advice", row.get("advice"))}'
+            f'{_field("Follow-up", row.get("follow_up_date"))}{_field("Vitals", vitals)}</dl></div>')
+
+async def printable(batches, patient):
+    """An HTML document paginated for printing (or saving as PDF from the browser)."""
+    generated = datetime.now(timezone.utc).strftime("%d %b %Y %H:%M UTC")
+    yield (f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Medical record - {escape(patient['full_name'])}</title>"
+           f"<style>{PRINT_STYLE}</style></head><body><h1>Medical record: {escape(patient['full_name'])}</h1>"
+           f"<div class=\"meta\">{escape(patient.get('email') or '')} &middot; generated {generated}</div>")
+    page, on_page = 1, 0
+    chunk = ['<section class="page">']
+    async for rows in batches:
+        for row in rows:
+            if on_page == RECORDS_PER_PRINT_PAGE:
+                chunk.append(f'<div class="folio">Page {page}</div></section><section class="page">')
+                page, on_page = page + 1, 0
+            chunk.append(_record_html(row))
+            on_page += 1
+        yield "".join(chunk)
+        chunk = []
+    if page == 1 and on_page == 0:
+        chunk.append("<p>No prescriptions on record.</p>")
+    chunk.append(f'<div class="folio">Page {page}</div></section></body></html>')
+    yield "".join(chunk)
+
+# format -> (renderer, media type, file extension)
+FORMATS = {
+    "ndjson": (ndjson, "application/x-ndjson", "ndjson"),
+    "csv": (csv_rows, "text/csv; charset=utf-8", "csv"),
+    "print": (printable, "text/html; charset=utf-8", "html"),
+}
+
+async def stream(format, batches, patient):
+    """The export of `batches` in `format`. The batches are closed (freeing their
+    database connection) as soon as the response ends, including on disconnect."""
+    render = FORMATS[format][0]
+    async with aclosing(batches):
+        async for chunk in (render(batches, patient) if format == "print" else render(batches)):
+            yield chunk
@@ -0,0 +1,28 @@
+import hashlib
+from fastapi import Request, Response
+
+# Helpers for responses that are rendered once, cached, and served with an
+# ETag so repeat visits can be answered with 304 Not Modified.
+
+class RenderedJSON:
+    """A JSON body serialized once, with its ETag and any extra headers to send with it."""
+    __slots__ = ("body", "etag", "headers")
+
+    def __init__(self, body: bytes, headers=None):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.headers = headers or {}
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+def conditional_response(request: Request, rendered: RenderedJSON, cache_control: str) -> Response:
+    """Returns 304 if the client already has this body, otherwise the cached bytes."""
+    headers = {"ETag": rendered.etag, "Cache-Control": cache_control, **rendered.headers}
+    if etag_matches(request.headers.get("if-none-match"), rendered.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=rendered.body, media_type="application/json", headers=headers)
@@ -0,0 +1,77 @@
+import os
+import asyncio
+from dotenv import load_dotenv
+
+from data_access import db
+from models import DoctorPublic, Pharmacy, Lab
+import cache
+import serialization
+
+load_dotenv()
+
+# --- Configuration ---
+# /search waits this long for all types; any that haven't answered by then are
+# left out and the response is marked partial.
+SEARCH_DEADLINE_MS = float(os.getenv("SEARCH_DEADLINE_MS", "500"))
+MIN_QUERY_LENGTH = 2
+
+# Result type -> (fetch(query, limit, **paging), response model). Every fetch
+# returns rows with a `rank` on the same scale, so results can be merged.
+# Ties between types are broken in this order.
+SOURCES = {
+    "doctor": (lambda query, limit, offset=0, after=None: db.search_doctors(query, limit, offset, after), DoctorPublic),
+    "pharmacy": (lambda query, limit: db.search_pharmacies(query, limit), Pharmacy),
+    "lab": (lambda query, limit: db.search_labs(query, limit), Lab),
+}
+
+def normalize_query(query: str) -> str:
+    # Matching (pg_trgm similarity, ILIKE) ignores case, so "Cardio  " and
+    # "cardio" are the same search and share a cache entry.
+    return " ".join((query or "").split()).lower()
+
+async def search_type(kind: str, query: str, limit: int, **paging):
+    """
+    Rows of one type, best first. This is what the per-type search endpoints
+    serve, from cache.search_results when an identical search ran recently.
+    """
+    query = normalize_query(query)
+    if len(query) < MIN_QUERY_LENGTH:
+        return []
+    fetch, _ = SOURCES[kind]
+    key = (kind, query, limit, *sorted(paging.items()))
+    return await cache.search_results.get(key, lambda: fetch(query, limit, **paging))
+
+async def search(query: str, kinds=None, limit: int = 10, deadline_ms: float = None):
+    """
+    Runs every requested type's search concurrently and merges the results by
+    rank. Types that fail or miss the shared deadline are listed in `missing`
+    rather than failing or holding up the whole response. On the sync driver an
+    abandoned query still runs to completion in its worker thread; only its
+    result is dropped.
+    """
+    kinds = list(kinds or SOURCES)
+    query = normalize_query(query)
+    if len(query) < MIN_QUERY_LENGTH:
+        return {"results": [], "partial": False, "missing": []}
+    tasks = {kind: asyncio.ensure_future(search_type(kind, query, limit)) for kind in kinds}
+    done, pending = await asyncio.wait(tasks.values(), timeout=(deadline_ms or SEARCH_DEADLINE_MS) / 1000)
+    for task in pending:
+        task.cancel()
+
+    results, missing = [], []
+    for kind in SOURCES:
+        task = tasks.get(kind)
+        if task is None:
+            continue
+        if task not in done:
+            missing.append(kind)
+            continue
+        if task.exception() is not None:
+            print(f"Error searching {kind}: {task.exception()}")
+            missing.append(kind)
+            continue
+        project = serialization.projection(SOURCES[kind][1])
+        results.extend({"type": kind, "rank": float(row['rank']), "item": project(row)} for row in task.result())
+    # A stable sort keeps SOURCES order between equally ranked results of different types.
+    results.sort(key=lambda r: -r['rank'])
+    return {"results": results, "partial": bool(missing), "missing": missing}
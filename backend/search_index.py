@@ -0,0 +1,125 @@
+import os
+import asyncio
+import time
+from bisect import bisect_left, insort
+from datetime import timedelta
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Configuration ---
+DOCTOR_PREFIX_INDEX = os.getenv("DOCTOR_PREFIX_INDEX", "false").lower() == "true"
+# How often to pull doctors changed since the last refresh.
+DOCTOR_INDEX_REFRESH_SECONDS = float(os.getenv("DOCTOR_INDEX_REFRESH_SECONDS", "30"))
+# How often to reload everything, which also drops deleted doctors.
+DOCTOR_INDEX_REBUILD_SECONDS = float(os.getenv("DOCTOR_INDEX_REBUILD_SECONDS", "3600"))
+# Incremental refreshes re-read this window so rows committed slightly out of
+# updated_at order are not skipped. Re-applying a row is harmless.
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+def normalize(text: str) -> str:
+    return " ".join((text or "").lower().split())
+
+class DoctorPrefixIndex:
+    """
+    An in-memory, sorted index of doctor names and specialties for typeahead.
+
+    Every doctor is indexed under its full name, each trailing run of name words
+    ("asha mehta", "mehta") and its specialty words, so a prefix lookup is a
+    binary search followed by a short scan. It is refreshed incrementally from
+    doctors.updated_at (see migrations/001_doctor_search.sql).
+    """
+
+    def __init__(self):
+        self._keys = []      # sorted (key, doctor_id)
+        self._doctors = {}   # doctor_id -> {"id", "name", "specialty"}
+        self._watermark = None
+        self._refreshed_at = None
+        self._rebuilt_at = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self):
+        return len(self._doctors)
+
+    @staticmethod
+    def _keys_for(doctor):
+        name_words = normalize(doctor['name']).split()
+        specialty = normalize(doctor['specialty'])
+        keys = {" ".join(name_words[i:]) for i in range(len(name_words))}
+        keys.add(specialty)
+        keys.update(specialty.split())
+        keys.discard("")
+        return keys
+
+    def _remove(self, doctor_id):
+        doctor = self._doctors.pop(doctor_id, None)
+        if not doctor:
+            return
+        for key in self._keys_for(doctor):
+            i = bisect_left(self._keys, (key, doctor_id))
+            if i < len(self._keys) and self._keys[i] == (key, doctor_id):
+                del self._keys[i]
+
+    def _track(self, row):
+        if row.get('updated_at') and (self._watermark is None or row['updated_at'] > self._watermark):
+            self._watermark = row['updated_at']
+
+    def load(self, rows):
+        """Replaces the whole index."""
+        self._doctors = {}
+        keys = []
+        self._watermark = None
+        for row in rows:
+            doctor = {"id": str(row['id']), "name": row['name'], "specialty": row['specialty']}
+            self._doctors[doctor['id']] = doctor
+            keys.extend((key, doctor['id']) for key in self._keys_for(doctor))
+            self._track(row)
+        keys.sort()
+        self._keys = keys
+
+    def apply(self, rows):
+        """Re-indexes the given changed doctors in place."""
+        for row in rows:
+            doctor = {"id": str(row['id']), "name": row['name'], "specialty": row['specialty']}
+            self._remove(doctor['id'])
+            self._doctors[doctor['id']] = doctor
+            for key in self._keys_for(doctor):
+                insort(self._keys, (key, doctor['id']))
+            self._track(row)
+
+    def suggest(self, prefix: str, limit: int = 10):
+        """Doctors with a name or specialty word starting with `prefix`, name matches first."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        matches = {}
+        i = bisect_left(self._keys, (prefix,))
+        while i < len(self._keys) and self._keys[i][0].startswith(prefix):
+            doctor_id = self._keys[i][1]
+            matches.setdefault(doctor_id, self._doctors[doctor_id])
+            i += 1
+        ranked = sorted(
+            matches.values(),
+            key=lambda d: (not normalize(d['name']).startswith(prefix), normalize(d['name']), d['id']),
+        )
+        return ranked[:limit]
+
+    async def refresh(self, fetch_rows):
+        """
+        Brings the index up to date if it is stale. `fetch_rows(since)` is
+        db.get_doctor_index_rows; `since=None` means every doctor.
+        """
+        if self._refreshed_at is not None and time.monotonic() - self._refreshed_at < DOCTOR_INDEX_REFRESH_SECONDS:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            if self._refreshed_at is not None and now - self._refreshed_at < DOCTOR_INDEX_REFRESH_SECONDS:
+                return
+            if self._rebuilt_at is None or self._watermark is None or now - self._rebuilt_at >= DOCTOR_INDEX_REBUILD_SECONDS:
+                self.load(await fetch_rows(None))
+                self._rebuilt_at = now
+            else:
+                self.apply(await fetch_rows(self._watermark - REFRESH_OVERLAP))
+            self._refreshed_at = now
+
+doctors = DoctorPrefixIndex()
@@ -0,0 +1,101 @@
+import os
+from decimal import Decimal
+import orjson
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# --- Configuration ---
+# Opt-in fast path for responses built from database rows: rows are projected onto
+# the response model's fields and encoded with orjson, skipping FastAPI's
+# re-validation and stdlib JSON encoding. The rows are trusted as-is, so types
+# must already match the model (e.g. db_actions turns numeric averages into floats).
+FAST_RESPONSES = os.getenv("FAST_RESPONSES", "false").lower() == "true"
+# Lists longer than this are streamed in chunks instead of encoded in one piece.
+STREAM_RESPONSE_ROWS = int(os.getenv("STREAM_RESPONSE_ROWS", "200"))
+STREAM_CHUNK_ROWS = 100
+
+# UTC datetimes as ...Z, like pydantic's JSON output.
+ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+class Projection:
+    """Copies exactly a model's top-level fields out of a row, filling in defaults for missing ones."""
+
+    def __init__(self, model):
+        self.fields = tuple(
+            (name, None if field.is_required() else field.get_default(call_default_factory=True))
+            for name, field in model.model_fields.items()
+        )
+
+    def __call__(self, row):
+        return {name: row.get(name, default) for name, default in self.fields}
+
+_projections = {}
+
+def projection(model) -> Projection:
+    if model not in _projections:
+        _projections[model] = Projection(model)
+    return _projections[model]
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+def _stream(rows, project):
+    yield b"["
+    for start in range(0, len(rows), STREAM_CHUNK_ROWS):
+        chunk = dumps([project(row) for row in rows[start:start + STREAM_CHUNK_ROWS]])
+        yield (b"," if start else b"") + chunk[1:-1]
+    yield b"]"
+
+def render(content, model, response: Response = None, status_code: int = 200):
+    """
+    Returns `content` (a row or list of rows) as `model` output. With FAST_RESPONSES
+    off this is `content` itself, for FastAPI to validate against the route's
+    response_model as usual. With it on, the rows are encoded directly and any
+    headers already set on the route's injected `response` are carried over.
+    """
+    if not FAST_RESPONSES:
+        return content
+    headers = dict(response.headers) if response is not None else None
+    if headers:
+        headers.pop("content-length", None)
+    project = projection(model)
+    if isinstance(content, list):
+        if len(content) > STREAM_RESPONSE_ROWS:
+            return StreamingResponse(_stream(content, project), status_code=status_code,
+                                     headers=headers, media_type="application/json")
+        return FastJSONResponse([project(row) for row in content], status_code=status_code, headers=headers)
+    return FastJSONResponse(project(content), status_code=status_code, headers=headers)
+
+def render_parts(content: dict, models: dict, response: Response = None):
+    """
+    Like render() for an object whose values are rows or lists of rows, each
+    encoded as `models[key]`. Only the keys present in `content` are output, so
+    with FAST_RESPONSES off the route should set response_model_exclude_unset.
+    """
+    if not FAST_RESPONSES:
+        return content
+    headers = dict(response.headers) if response is not None else None
+    if headers:
+        headers.pop("content-length", None)
+    encoded = {}
+    for key, value in content.items():
+        project = projection(models[key])
+        if isinstance(value, list):
+            encoded[key] = [project(row) for row in value]
+        else:
+            encoded[key] = project(value) if value is not None else None
+    return FastJSONResponse(encoded, headers=headers)
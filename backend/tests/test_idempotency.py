@@ -0,0 +1,136 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+import database
+import idempotency
+
+class Item(BaseModel):
+    id: int
+    note: str
+
+class FakeStore:
+    """idempotency_keys in memory; rows stored inside write_transaction() are dropped if it rolls back."""
+
+    def __init__(self):
+        self.rows = {}
+        self._pending = None
+        self.lookups = 0
+
+    async def get_idempotent_response(self, user_id, key, ttl_seconds):
+        self.lookups += 1
+        return self.rows.get((user_id, key))
+
+    async def store_idempotent_response(self, user_id, key, route, request_hash, status_code, response):
+        if (user_id, key) in self.rows:
+            raise KeyTaken()
+        self._pending[(user_id, key)] = {"route": route, "request_hash": request_hash,
+                                         "status_code": status_code, "response": response}
+
+    @asynccontextmanager
+    async def write_transaction(self):
+        self._pending = {}
+        try:
+            yield
+            self.rows.update(self._pending)
+        finally:
+            self._pending = None
+
+class KeyTaken(Exception):
+    """Stands in for the driver's unique violation on the key's row."""
+    class diag:
+        constraint_name = "idempotency_keys_pkey"
+
+class CountingWrite:
+    def __init__(self, result=None, error=None):
+        self.result, self.error, self.calls = result, error, 0
+
+    async def __call__(self):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+@pytest.fixture
+def store(monkeypatch):
+    store = FakeStore()
+    monkeypatch.setattr(idempotency, "db", store)
+    monkeypatch.setattr(database, "write_transaction", store.write_transaction)
+    return store
+
+def respond(write, key="key-1", request=None, route="POST /patient/items"):
+    return asyncio.run(idempotency.respond(key, 7, route, request or {"note": "hi"}, write, Item, status_code=201))
+
+def test_retry_replays_the_stored_response_without_writing_again(store):
+    write = CountingWrite({"id": 1, "note": "hi", "extra": "not in the model"})
+    first = respond(write)
+    assert first.status_code == 201
+    assert json.loads(first.body) == {"id": 1, "note": "hi"}
+
+    retry = respond(write)
+    assert write.calls == 1
+    assert retry.status_code == 201
+    assert retry.body == first.body
+    assert retry.headers[idempotency.REPLAYED_HEADER] == "true"
+    assert store.lookups == 2
+
+def test_key_reused_for_a_different_request_is_rejected(store):
+    respond(CountingWrite({"id": 1, "note": "hi"}))
+    write = CountingWrite({"id": 2, "note": "bye"})
+    with pytest.raises(HTTPException) as raised:
+        respond(write, request={"note": "bye"})
+    assert raised.value.status_code == 422
+    assert write.calls == 0
+
+def test_key_reused_on_another_route_is_rejected(store):
+    respond(CountingWrite({"id": 1, "note": "hi"}))
+    with pytest.raises(HTTPException) as raised:
+        respond(CountingWrite({"id": 1, "note": "hi"}), route="PUT /patient/items")
+    assert raised.value.status_code == 422
+
+def test_client_error_is_stored_and_replayed(store):
+    write = CountingWrite(error=HTTPException(status_code=409, detail="Slot already booked."))
+    with pytest.raises(HTTPException) as raised:
+        respond(write)
+    assert raised.value.status_code == 409
+    assert store.rows[(7, "key-1")]["status_code"] == 409
+
+    retry = respond(write)
+    assert write.calls == 1
+    assert retry.status_code == 409
+    assert json.loads(retry.body) == {"detail": "Slot already booked."}
+    assert retry.headers[idempotency.REPLAYED_HEADER] == "true"
+
+@pytest.mark.parametrize("error", [HTTPException(status_code=503, detail="Busy."), RuntimeError("connection lost")])
+def test_server_error_is_not_stored_so_the_retry_runs_the_write(store, error):
+    write = CountingWrite(error=error)
+    with pytest.raises(type(error)):
+        respond(write)
+    assert store.rows == {}
+
+    write.error = None
+    write.result = {"id": 1, "note": "hi"}
+    assert respond(write).status_code == 201
+    assert write.calls == 2
+
+def test_concurrent_request_that_stored_first_is_replayed(store):
+    winner = {"route": "POST /patient/items", "request_hash": idempotency.request_hash("POST /patient/items", {"note": "hi"}),
+              "status_code": 201, "response": '{"id":9,"note":"hi"}'}
+
+    async def write():
+        # Another request with the same key commits while this one is writing.
+        store.rows[(7, "key-1")] = winner
+        return {"id": 10, "note": "hi"}
+
+    response = respond(write)
+    assert json.loads(response.body) == {"id": 9, "note": "hi"}
+    assert response.headers[idempotency.REPLAYED_HEADER] == "true"
+
+def test_key_length_is_checked(store):
+    with pytest.raises(HTTPException) as raised:
+        respond(CountingWrite({"id": 1, "note": "hi"}), key="k" * (idempotency.MAX_KEY_LENGTH + 1))
+    assert raised.value.status_code == 400
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+import ratelimit
+
+def test_parse_budget():
+    assert ratelimit.parse_budget("30/60") == (30, 0.5)
+    assert ratelimit.parse_budget("5") == (5, 5)
+    assert ratelimit.parse_budget("0") is None
+    assert ratelimit.parse_budget("") is None
+    with pytest.raises(ValueError):
+        ratelimit.parse_budget("-1/60")
+
+def test_bucket_allows_a_burst_then_refills_at_the_rate():
+    buckets = ratelimit.TokenBuckets(capacity=2, rate=1.0)
+    assert buckets.take("a", now=0.0) == 0
+    assert buckets.take("a", now=0.0) == 0
+    assert buckets.take("a", now=0.0) == pytest.approx(1.0)
+    assert buckets.take("a", now=0.5) == pytest.approx(0.5)
+    assert buckets.take("a", now=1.0) == 0
+    assert buckets.rejected == 2
+
+def test_bucket_refill_is_capped_at_capacity():
+    buckets = ratelimit.TokenBuckets(capacity=2, rate=1.0)
+    buckets.take("a", now=0.0)
+    assert [buckets.take("a", now=100.0) for _ in range(3)] == [0, 0, pytest.approx(1.0)]
+
+def test_keys_have_separate_buckets_and_the_least_recent_is_forgotten():
+    buckets = ratelimit.TokenBuckets(capacity=1, rate=1.0, max_keys=2)
+    assert buckets.take("a", now=0.0) == 0
+    assert buckets.take("b", now=0.0) == 0
+    assert buckets.take("a", now=0.0) > 0
+    buckets.take("c", now=0.0)
+    assert len(buckets) == 2
+    # "b" was seen least recently, so it was dropped and starts full again.
+    assert buckets.take("b", now=0.0) == 0
+
+def scope(path="/doctors", method="GET", address="10.0.0.1"):
+    return {"type": "http", "method": method, "path": path, "client": (address, 5000), "headers": []}
+
+@pytest.fixture
+def budgets(monkeypatch):
+    """Sets the budgets (as env specs) and returns a fresh Admission built from them."""
+    def admission(ip="0", auth="0", search="0", patient_writes="0", max_concurrent=0):
+        monkeypatch.setattr(ratelimit, "RATE_LIMIT_IP", ip)
+        monkeypatch.setattr(ratelimit, "RATE_LIMIT_AUTH", auth)
+        monkeypatch.setattr(ratelimit, "RATE_LIMIT_SEARCH", search)
+        monkeypatch.setattr(ratelimit, "RATE_LIMIT_PATIENT_WRITES", patient_writes)
+        monkeypatch.setattr(ratelimit, "MAX_CONCURRENT_REQUESTS", max_concurrent)
+        return ratelimit.Admission()
+    return admission
+
+def test_address_over_budget_gets_429_with_retry_after(budgets):
+    admission = budgets(ip="2/60")
+    assert admission.check(scope(), long_lived=False) is None
+    assert admission.check(scope(), long_lived=False) is None
+    rejection = admission.check(scope(), long_lived=False)
+    assert rejection.status_code == 429
+    # One token every 30 seconds.
+    assert rejection.headers["retry-after"] == "30"
+    assert admission.check(scope(address="10.0.0.2"), long_lived=False) is None
+    assert admission.stats()["rejected_ip"] == 1
+
+def test_route_group_budget_applies_only_to_its_routes(budgets):
+    admission = budgets(search="1/10")
+    assert admission.check(scope("/search"), long_lived=False) is None
+    assert admission.check(scope("/search"), long_lived=False).status_code == 429
+    assert admission.check(scope("/doctors"), long_lived=False) is None
+    assert admission.stats()["rejected_search"] == 1
+
+def test_retry_after_is_at_least_one_second(budgets):
+    admission = budgets(ip="100/1")
+    for _ in range(100):
+        admission.check(scope(), long_lived=False)
+    assert admission.check(scope(), long_lived=False).headers["retry-after"] == "1"
+
+def test_requests_over_the_concurrency_limit_are_shed(budgets):
+    admission = budgets(max_concurrent=2)
+    admission.in_flight = 2
+    rejection = admission.check(scope(), long_lived=False)
+    assert rejection.status_code == 503
+    assert rejection.headers["retry-after"] == str(ratelimit.SHED_RETRY_AFTER)
+    assert admission.check(scope(), long_lived=True) is None
+    assert admission.stats()["shed"] == 1
+
+def test_middleware_sheds_while_the_limit_is_in_flight(budgets, monkeypatch):
+    monkeypatch.setattr(ratelimit, "admission", budgets(max_concurrent=1))
+
+    async def main():
+        release = asyncio.Event()
+        started = asyncio.Event()
+
+        async def app(scope, receive, send):
+            started.set()
+            await release.wait()
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def call(middleware, path="/doctors"):
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+            await middleware(scope(path), None, send)
+            return sent[0]["status"]
+
+        middleware = ratelimit.AdmissionMiddleware(app)
+        first = asyncio.create_task(call(middleware))
+        await started.wait()
+        shed = await call(middleware)
+        exempt = asyncio.create_task(call(middleware, "/metrics"))
+        await asyncio.sleep(0)
+        release.set()
+        return await first, shed, await exempt
+
+    assert asyncio.run(main()) == (200, 503, 200)
+    assert ratelimit.admission.in_flight == 0
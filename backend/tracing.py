@@ -0,0 +1,300 @@
+import inspect
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+from dotenv import load_dotenv
+
+import cache
+import database
+
+load_dotenv()
+
+# --- Configuration ---
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+# Statements slower than this are logged as they finish.
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# Requests slower than this are logged with every SQL statement they ran.
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+# "true" also logs EXPLAIN (ANALYZE, BUFFERS) for slow statements. The statement is
+# re-run in a read-only transaction on a separate connection, at most once per
+# EXPLAIN_COOLDOWN_SECONDS for the same SQL, so writes are never repeated.
+EXPLAIN_SLOW_QUERIES = os.getenv("EXPLAIN_SLOW_QUERIES", "false").lower() == "true"
+EXPLAIN_COOLDOWN_SECONDS = float(os.getenv("EXPLAIN_COOLDOWN_SECONDS", "300"))
+# Fraction of requests to profile, e.g. 0.01. Profiles are appended to
+# PROFILE_DIR/<handler>.<pid>.folded in the collapsed-stack format read by
+# flamegraph.pl and speedscope.
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+REQUEST_ID_HEADER = "X-Request-ID"
+MAX_SPANS_PER_REQUEST = 200
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+class Trace:
+    """One request's ID and the SQL statements it ran, as (sql, params shape, ms, rows) spans."""
+    __slots__ = ("request_id", "spans", "dropped", "profiled")
+
+    def __init__(self, request_id):
+        self.request_id = request_id
+        self.spans = []
+        self.dropped = 0
+        self.profiled = False
+
+_current = ContextVar("trace", default=None)
+
+def current_request_id():
+    trace = _current.get()
+    return trace.request_id if trace else None
+
+def _compact_sql(query):
+    if not isinstance(query, str):
+        query = str(query)
+    return " ".join(query.split())
+
+def params_shape(params):
+    """Parameter names and types without their values, which may be personal data."""
+    if params is None:
+        return "-"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in params.items()) + "}"
+    if isinstance(params, (list, tuple)):
+        return "(" + ", ".join(type(v).__name__ for v in params) + ")"
+    return type(params).__name__
+
+# --- SQL spans and slow queries ---
+
+def _on_statement(query, params, seconds, rowcount):
+    ms = seconds * 1000
+    trace = _current.get()
+    if trace is not None:
+        if len(trace.spans) < MAX_SPANS_PER_REQUEST:
+            trace.spans.append((query, params_shape(params), ms, rowcount))
+        else:
+            trace.dropped += 1
+    if ms >= SLOW_QUERY_MS:
+        print(f"[slow-query] request={trace.request_id if trace else '-'} {ms:.1f}ms rows={rowcount} "
+              f"params={params_shape(params)} sql={_compact_sql(query)}")
+        if EXPLAIN_SLOW_QUERIES:
+            _explain_later(query, params)
+
+# Statements explained within the cooldown; bounded, so ad-hoc SQL can't grow it forever.
+_explained = cache.TTLCache(maxsize=1024, ttl=EXPLAIN_COOLDOWN_SECONDS)
+_explain_lock = threading.Lock()
+_explain_slots = threading.Semaphore(1)
+
+def _explain_later(query, params):
+    key = _compact_sql(query)
+    # Skips pool health checks (empty statements), our own EXPLAIN runs, prepared
+    # statements (database.execute_prepared), which only exist on their own connection,
+    # and statements carrying a write_transaction's BEGIN.
+    if not key or key.upper().startswith(("EXPLAIN", "PREPARE", "EXECUTE", "BEGIN")):
+        return
+    with _explain_lock:
+        if _explained.get(key):
+            return
+        _explained.set(key, True)
+    if _explain_slots.acquire(blocking=False):
+        threading.Thread(target=_explain, args=(query, params), daemon=True).start()
+
+def _explain(query, params):
+    try:
+        conn = database.get_db_connection()
+        try:
+            conn.set_session(readonly=True)
+            with conn.cursor() as cur:
+                cur.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, params)
+                plan = "\n".join(row[0] for row in cur.fetchall())
+            print(f"[slow-query-plan] sql={_compact_sql(query)}\n{plan}")
+        finally:
+            conn.rollback()
+            conn.close()
+    except Exception as e:
+        print(f"[slow-query-plan] could not explain: {e}")
+    finally:
+        _explain_slots.release()
+
+def _log_slow_request(trace, method, path, status, ms):
+    sql_ms = sum(span[2] for span in trace.spans)
+    print(f"[slow-request] request={trace.request_id} {method} {path} status={status} {ms:.1f}ms "
+          f"sql={len(trace.spans) + trace.dropped} statements/{sql_ms:.1f}ms")
+    for query, shape, span_ms, rows in trace.spans:
+        print(f"  {span_ms:8.1f}ms rows={rows} params={shape} sql={_compact_sql(query)[:500]}")
+    if trace.dropped:
+        print(f"  ... {trace.dropped} more statements")
+
+# --- Sampled profiler ---
+
+class _Profile:
+    __slots__ = ("loop_thread", "scope", "threads", "stacks")
+
+    def __init__(self, loop_thread, scope):
+        self.loop_thread = loop_thread
+        self.scope = scope
+        self.threads = {}  # threadpool thread id -> code object its work starts at
+        self.stacks = Counter()
+
+class _Sampler:
+    """
+    One background thread that, while any profiled request is in flight, samples
+    it every PROFILE_INTERVAL_MS: the event loop thread's stack from the route
+    handler down, plus the stacks of threadpool threads doing data-access work for
+    it (see bind_to_request). Samples where the request is doing neither are
+    counted as "(waiting)", e.g. on the bcrypt worker processes, so sample counts
+    add up to wall time.
+    """
+
+    def __init__(self):
+        self._active = {}  # id(trace) -> _Profile
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def start(self, key, scope):
+        with self._lock:
+            self._active[key] = _Profile(threading.get_ident(), scope)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def stop(self, key):
+        with self._lock:
+            profile = self._active.pop(key)
+        endpoint = profile.scope.get("endpoint")
+        if profile.stacks and endpoint is not None:
+            _write_profile(endpoint.__name__, profile.stacks)
+
+    def add_thread(self, key, root_code):
+        with self._lock:
+            profile = self._active.get(key)
+            if profile is not None:
+                profile.threads[threading.get_ident()] = root_code
+
+    def remove_thread(self, key):
+        with self._lock:
+            profile = self._active.get(key)
+            if profile is not None:
+                profile.threads.pop(threading.get_ident(), None)
+
+    def _run(self):
+        interval = PROFILE_INTERVAL_MS / 1000
+        while True:
+            self._wake.wait()
+            with self._lock:
+                active = [(p, dict(p.threads)) for p in self._active.values()]
+                if not active:
+                    self._wake.clear()
+                    continue
+            frames = sys._current_frames()
+            for profile, threads in active:
+                endpoint = profile.scope.get("endpoint")
+                if endpoint is None:
+                    continue
+                handler = _frame_label(endpoint.__code__)
+                sampled = False
+                loop_stack = _fold(frames.get(profile.loop_thread), endpoint.__code__)
+                if loop_stack:
+                    profile.stacks[loop_stack] += 1
+                    sampled = True
+                for thread_id, root_code in threads.items():
+                    stack = _fold(frames.get(thread_id), root_code)
+                    if stack:
+                        profile.stacks[f"{handler};{stack}"] += 1
+                        sampled = True
+                if not sampled:
+                    profile.stacks[f"{handler};(waiting)"] += 1
+            time.sleep(interval)
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _fold(frame, root_code):
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        if frame.f_code is root_code:
+            return ";".join(reversed(labels))
+        frame = frame.f_back
+    return None
+
+def _write_profile(name, stacks):
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(os.path.join(PROFILE_DIR, f"{name}.{os.getpid()}.folded"), "a") as f:
+            f.writelines(f"{stack} {count}\n" for stack, count in stacks.items())
+    except OSError as e:
+        print(f"Error writing profile: {e}")
+
+_sampler = _Sampler()
+
+def bind_to_request(func):
+    """Wraps a function run on the threadpool so a profiled request's samples include it."""
+    root_code = inspect.unwrap(func).__code__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        trace = _current.get()
+        if trace is None or not trace.profiled:
+            return func(*args, **kwargs)
+        _sampler.add_thread(id(trace), root_code)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _sampler.remove_thread(id(trace))
+    return wrapper
+
+# --- Middleware ---
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware that gives every request an ID (an incoming X-Request-ID
+    is kept if it looks sane), echoes it on the response, collects the request's
+    SQL spans and logs them if the request was slow. A PROFILE_SAMPLE_RATE share
+    of requests is also profiled.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        incoming = dict(scope["headers"]).get(REQUEST_ID_HEADER.lower().encode(), b"").decode("latin-1")
+        trace = Trace(incoming if _VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex)
+        token = _current.set(trace)
+        status = 500
+        streaming = False
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                # Event streams stay open for as long as the client is connected.
+                streaming = any(k == b"content-type" and v.startswith(b"text/event-stream") for k, v in message.get("headers", []))
+                message["headers"] = [*message.get("headers", []), (b"x-request-id", trace.request_id.encode())]
+            await send(message)
+
+        trace.profiled = PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+        if trace.profiled:
+            _sampler.start(id(trace), scope)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if trace.profiled:
+                _sampler.stop(id(trace))
+            _current.reset(token)
+            ms = (time.perf_counter() - start) * 1000
+            if ms >= SLOW_REQUEST_MS and not streaming:
+                _log_slow_request(trace, scope["method"], scope["path"], status, ms)
+
+if TRACING_ENABLED:
+    database.statement_observers.append(_on_statement)
@@ -0,0 +1,103 @@
+import os
+import asyncio
+import time
+from dotenv import load_dotenv
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+import database
+import hashing
+import google_tokens
+import models
+import serialization
+
+load_dotenv()
+
+# --- Configuration ---
+# What the lifespan does before the first request needs it:
+#   off        - nothing; each piece is set up by the first request that uses it.
+#   on         - warm up fully before the server accepts connections.
+#   background - accept connections at once and warm up alongside the first requests.
+WARM_UP = os.getenv("WARM_UP", "off").lower()
+# Connections pre-opened in each pool (the primary's and each replica's).
+WARM_UP_CONNECTIONS = int(os.getenv("WARM_UP_CONNECTIONS", "4"))
+
+# Everything a fresh process otherwise does on its first requests. Each step is
+# optional: a failure is printed and the request that needs it later retries.
+
+async def _connections():
+    if database.DB_DRIVER == "async":
+        await database.warm_async_pools(WARM_UP_CONNECTIONS)
+    else:
+        await run_in_threadpool(database.warm_pools, WARM_UP_CONNECTIONS)
+
+async def _hashing():
+    # Spawns the bcrypt workers, which is most of the first login's latency.
+    await run_in_threadpool(hashing.pool.warm_up)
+
+async def _tokens():
+    # Signing and checking our own JWTs loads jose and its crypto backend.
+    from auth import create_access_token, get_current_token_claims
+    await get_current_token_claims(create_access_token({"sub": "warm-up"}))
+    if google_tokens.GOOGLE_CLIENT_ID:
+        from google.auth import jwt  # noqa: F401
+        try:
+            await run_in_threadpool(google_tokens.google_certs.refresh)
+        except google_tokens.CertsUnavailable:
+            pass
+
+async def _validators(app, prefixes):
+    # FastAPI can defer preparing a router's routes (dependencies, request and
+    # response validators) until a request is first matched against it, which cost
+    # the first request ~70 ms. Matching a path that doesn't exist under each
+    # prefix prepares every route now.
+    for prefix in prefixes:
+        path = prefix.rstrip("/") + "/__warm-up__"
+        scope = {"type": "http", "method": "GET", "path": path, "raw_path": path.encode(), "root_path": "",
+                 "query_string": b"", "headers": [], "scheme": "http", "http_version": "1.1"}
+
+        async def receive():
+            return {"type": "http.request", "body": b"", "more_body": False}
+
+        async def send(message):
+            pass
+
+        await app.router(scope, receive, send)
+    for model in vars(models).values():
+        if isinstance(model, type) and issubclass(model, BaseModel) and model is not BaseModel:
+            serialization.projection(model)
+
+async def _timed(name, step, timings):
+    start = time.perf_counter()
+    try:
+        await step()
+    except Exception as e:
+        print(f"Warm-up step '{name}' failed: {e}")
+    timings[name] = time.perf_counter() - start
+
+async def run(app, prefixes=("",), prime_caches=()):
+    """
+    Runs every warm-up step concurrently, then `prime_caches` (async callables
+    from main.py that fill its hot caches), and prints how long each took.
+    `prefixes` are the prefixes of the routers included in `app`.
+    """
+    timings = {}
+    start = time.perf_counter()
+    await asyncio.gather(*(_timed(name, step, timings) for name, step in (
+        ("connections", _connections), ("hashing", _hashing), ("tokens", _tokens),
+        ("validators", lambda: _validators(app, prefixes)),
+    )))
+    await asyncio.gather(*(_timed(prime.__name__.strip("_"), prime, timings) for prime in prime_caches))
+    steps = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in timings.items())
+    print(f"Warm-up finished in {(time.perf_counter() - start) * 1000:.0f} ms ({steps})")
+
+async def start(app, prefixes=("",), prime_caches=()):
+    """
+    Called from the lifespan before it yields. Returns the background task when
+    WARM_UP=background (the lifespan cancels it on shutdown), otherwise None.
+    """
+    if WARM_UP == "on":
+        await run(app, prefixes, prime_caches)
+    elif WARM_UP == "background":
+        return asyncio.create_task(run(app, prefixes, prime_caches))
+    return None
@@ -6,12 +6,31 @@ export const API_URL = 'https://patient-dashboard-dphd.onrender.com'; // Use you
 
 const getAuthToken = () => localStorage.getItem('appToken');
 
-export const fetchWithAuth = async (endpoint, options = {}) => {
+// Writes that must not happen twice (booking, cancelling, reviewing) pass
+// { idempotent: true }: every attempt carries the same Idempotency-Key, so after a
+// dropped connection or a 503 the call is retried and the API replays the first
+// attempt's result instead of writing again.
+const IDEMPOTENT_ATTEMPTS = 3;
+const sleep = (ms) => new Promise(resolve => setTimeout(resolve, ms));
+
+const requestWithAuth = async (endpoint, { idempotent = false, ...options } = {}) => {
     const token = getAuthToken();
     const headers = { 'Content-Type': 'application/json', ...options.headers };
     if (token) { headers['Authorization'] = `Bearer ${token}`; }
-    
-    const response = await fetch(`${API_URL}${endpoint}`, { ...options, headers });
+    if (idempotent) { headers['Idempotency-Key'] = crypto.randomUUID(); }
+
+    let response;
+    for (let attempt = 1; ; attempt++) {
+        try {
+            response = await fetch(`${API_URL}${endpoint}`, { ...options, headers });
+        } catch (err) {
+            if (!idempotent || attempt >= IDEMPOTENT_ATTEMPTS) throw err;
+            await sleep(1000);
+            continue;
+        }
+        if (!idempotent || response.status !== 503 || attempt >= IDEMPOTENT_ATTEMPTS) break;
+        await sleep(1000 * (Number(response.headers.get('Retry-After')) || 1));
+    }
 
     if (response.status === 401) {
         localStorage.removeItem('appToken');
@@ -22,7 +41,87 @@ export const fetchWithAuth = async (endpoint, options = {}) => {
         const errorData = await response.json();
         throw new Error(errorData.detail || 'An API error occurred.');
     }
+    return response;
+};
+
+export const fetchWithAuth = async (endpoint, options = {}) => {
+    const response = await requestWithAuth(endpoint, options);
     if (response.status === 204) { return; }
     return response.json();
 };
 
+// One page of a keyset-paginated list (my appointments, my records, the article
+// feed): resolves to { items, next }, where `next` is the cursor for the
+// following page (the X-Next-Cursor header) or null after the last one.
+export const fetchPageWithAuth = async (endpoint, cursor = null) => {
+    const url = cursor ? `${endpoint}${endpoint.includes('?') ? '&' : '?'}cursor=${encodeURIComponent(cursor)}` : endpoint;
+    const response = await requestWithAuth(url);
+    return { items: await response.json(), next: response.headers.get('X-Next-Cursor') };
+};
+
+// Every page of a keyset-paginated list, following the cursor until the last one.
+export const fetchAllPagesWithAuth = async (endpoint) => {
+    const items = [];
+    let cursor = null;
+    do {
+        const page = await fetchPageWithAuth(endpoint, cursor);
+        items.push(...page.items);
+        cursor = page.next;
+    } while (cursor);
+    return items;
+};
+
+
+// Fetches a file-like response (e.g. an export) with the Authorization header and
+// returns an object URL for it; revoke it with URL.revokeObjectURL when done.
+export const fetchBlobWithAuth = async (endpoint) => {
+    const token = getAuthToken();
+    const response = await fetch(`${API_URL}${endpoint}`, { headers: token ? { 'Authorization': `Bearer ${token}` } : {} });
+    if (!response.ok) throw new Error(`Download failed (${response.status}).`);
+    return URL.createObjectURL(await response.blob());
+};
+
+// Server-Sent Events over fetch, so the stream can carry the Authorization header
+// (EventSource can't). Calls onEvent(name, data) per message and reconnects after
+// a dropped connection. Returns a function that closes the stream.
+export const subscribeWithAuth = (endpoint, onEvent) => {
+    const controller = new AbortController();
+    let retryMs = 5000;
+
+    const connect = async () => {
+        const token = getAuthToken();
+        const response = await fetch(`${API_URL}${endpoint}`, {
+            headers: { 'Accept': 'text/event-stream', ...(token ? { 'Authorization': `Bearer ${token}` } : {}) },
+            signal: controller.signal,
+        });
+        if (!response.ok || !response.body) throw new Error(`Event stream failed (${response.status}).`);
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let buffer = '';
+        for (;;) {
+            const { value, done } = await reader.read();
+            if (done) return;
+            buffer += value;
+            let end;
+            while ((end = buffer.indexOf('\n\n')) !== -1) {
+                const message = buffer.slice(0, end);
+                buffer = buffer.slice(end + 2);
+                let name = 'message', data = '';
+                for (const line of message.split('\n')) {
+                    if (line.startsWith('event: ')) name = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                    else if (line.startsWith('retry: ')) retryMs = Number(line.slice(7)) || retryMs;
+                }
+                if (data) onEvent(name, JSON.parse(data));
+            }
+        }
+    };
+
+    const run = async () => {
+        while (!controller.signal.aborted) {
+            try { await connect(); } catch (err) { if (controller.signal.aborted) return; }
+            await new Promise(resolve => setTimeout(resolve, retryMs));
+        }
+    };
+    run();
+    return () => controller.abort();
+};
@@ -1,26 +1,53 @@
 import React, { useState, useEffect } from 'react';
-import { fetchWithAuth } from '../api';
+import { fetchWithAuth, fetchPageWithAuth } from '../api';
 import Loader from './Loader';
 
 function BlogFeed() {
   const [articles, setArticles] = useState([]);
   const [loading, setLoading] = useState(true);
+  // Full article bodies, fetched only when a reader expands an article.
+  const [bodies, setBodies] = useState({});
+  // Summaries come a page at a time, newest first; this is the cursor for the next page.
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     const loadArticles = async () => {
       setLoading(true);
-      const data = await fetchWithAuth('/articles'); // Public endpoint
-      setArticles(data);
+      const page = await fetchPageWithAuth('/articles'); // Public endpoint, returns summaries
+      setArticles(page.items);
+      setNextCursor(page.next);
       setLoading(false);
     };
     loadArticles();
   }, []);
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const page = await fetchPageWithAuth('/articles', nextCursor);
+      setArticles(prev => [...prev, ...page.items]);
+      setNextCursor(page.next);
+    } catch (err) {
+      alert("Error: " + err.message);
+    }
+    setLoadingMore(false);
+  };
+
+  const toggleArticle = async (id) => {
+    if (bodies[id]) {
+      setBodies(({ [id]: _, ...rest }) => rest);
+      return;
+    }
+    const article = await fetchWithAuth(`/articles/${id}`);
+    setBodies(prev => ({ ...prev, [id]: article.content }));
+  };
+
   return (
     <div className="space-y-6">
       <h1 className="text-3xl font-bold text-slate-800 dark:text-slate-200">Health Feed</h1>
       <p className="text-lg text-slate-500 dark:text-slate-400">Articles from our expert doctors.</p>
-      
+
       {loading ? <Loader /> : (
         <div className="space-y-6">
           {articles.map(article => (
@@ -29,9 +56,19 @@ function BlogFeed() {
               <p className="text-sm text-slate-500 dark:text-slate-400 mt-1">
                 By {article.author || 'OPD Nexus Team'} on {new Date(article.published_at).toLocaleDateString('en-IN')}
               </p>
-              <p className="text-slate-600 dark:text-slate-300 mt-4">{article.content}</p>
+              <p className="text-slate-600 dark:text-slate-300 mt-4">{bodies[article.id] || article.excerpt}</p>
+              {(bodies[article.id] || article.excerpt.endsWith('…')) && (
+                <button onClick={() => toggleArticle(article.id)} className="mt-2 text-sm font-medium text-blue-600 dark:text-blue-400 hover:underline">
+                  {bodies[article.id] ? 'Show less' : 'Read more'}
+                </button>
+              )}
             </div>
           ))}
+          {nextCursor && (
+            <button onClick={loadMore} disabled={loadingMore} className="px-4 py-2 bg-indigo-100 text-indigo-700 rounded-md text-sm font-medium hover:bg-indigo-200 disabled:opacity-50">
+              {loadingMore ? 'Loading...' : 'Load more articles'}
+            </button>
+          )}
         </div>
       )}
     </div>
@@ -92,6 +92,7 @@ const DoctorCard = ({ doctor }) => {
       // This is a protected action, so we use fetchWithAuth
       await fetchWithAuth('/patient/book-appointment', {
         method: 'POST',
+        idempotent: true,
         body: JSON.stringify({
           doctor_id: doctor.id,
           slot: selectedSlot,
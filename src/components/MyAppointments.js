@@ -1,5 +1,5 @@
 import React, { useState, useEffect, useCallback } from 'react';
-import { fetchWithAuth } from '../api';
+import { fetchWithAuth, fetchPageWithAuth, fetchAllPagesWithAuth, subscribeWithAuth } from '../api';
 import Loader from './Loader';
 import ReviewModal from './ReviewModal'; // <-- We will create this
 
@@ -7,14 +7,21 @@ function MyAppointments() {
   const [appointments, setAppointments] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
+  // Past appointments come a page at a time, newest first; this is the cursor for the next page.
+  const [pastCursor, setPastCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   
   const [selectedApptForReview, setSelectedApptForReview] = useState(null);
 
-  const fetchAppointments = useCallback(async () => {
-    setLoading(true);
+  const fetchAppointments = useCallback(async (showLoader = true) => {
+    if (showLoader) setLoading(true);
     try {
-      const data = await fetchWithAuth('/patient/my-appointments');
-      setAppointments(data);
+      const [upcomingData, pastPage] = await Promise.all([
+        fetchAllPagesWithAuth('/patient/my-appointments?when=upcoming'),
+        fetchPageWithAuth('/patient/my-appointments?when=past'),
+      ]);
+      setAppointments([...upcomingData, ...pastPage.items]);
+      setPastCursor(pastPage.next);
     } catch (err) {
       setError(err.message || "Could not load appointments.");
     }
@@ -25,11 +32,38 @@ function MyAppointments() {
     fetchAppointments();
   }, [fetchAppointments]);
 
+  const loadMorePast = async () => {
+    setLoadingMore(true);
+    try {
+      const page = await fetchPageWithAuth('/patient/my-appointments?when=past', pastCursor);
+      setAppointments(prev => [...prev, ...page.items.filter(a => !prev.some(p => p.id === a.id))]);
+      setPastCursor(page.next);
+    } catch (err) {
+      setError(err.message || "Could not load more appointments.");
+    }
+    setLoadingMore(false);
+  };
+
+  // Merges one appointment (a pushed delta or an API response) into the list.
+  const applyChange = useCallback((change) => {
+    setAppointments(prev => prev.some(a => a.id === change.id)
+      ? prev.map(a => a.id === change.id ? { ...a, ...change } : a)
+      : [change, ...prev]);
+  }, []);
+
+  // Status changes are pushed by the server, including ones made doctor-side.
+  useEffect(() => {
+    return subscribeWithAuth('/patient/appointment-events', (event, data) => {
+      if (event === 'appointment') applyChange(data);
+      else if (event === 'resync') fetchAppointments(false);
+    });
+  }, [applyChange, fetchAppointments]);
+
   const handleCancel = async (apptId) => {
     if (!window.confirm("Are you sure you want to cancel this appointment?")) return;
     try {
-      await fetchWithAuth(`/patient/appointments/${apptId}/cancel`, { method: 'PUT' });
-      fetchAppointments(); // Refresh the list
+      const cancelled = await fetchWithAuth(`/patient/appointments/${apptId}/cancel`, { method: 'PUT', idempotent: true });
+      applyChange({ id: cancelled.id, status: cancelled.status });
     } catch (err) {
       alert("Error: " + err.message);
     }
@@ -64,6 +98,11 @@ function MyAppointments() {
               <AppointmentCard key={appt.id} appt={appt} onReview={setSelectedApptForReview} />
             )) : <p className="text-slate-500 dark:text-slate-400">No past appointments.</p>}
           </div>
+          {pastCursor && (
+            <button onClick={loadMorePast} disabled={loadingMore} className="mt-4 px-4 py-2 bg-indigo-100 text-indigo-700 rounded-md text-sm font-medium hover:bg-indigo-200 disabled:opacity-50">
+              {loadingMore ? 'Loading...' : 'Load older appointments'}
+            </button>
+          )}
         </section>
       </div>
 
@@ -73,8 +112,8 @@ function MyAppointments() {
           appointment={selectedApptForReview}
           onClose={() => setSelectedApptForReview(null)}
           onSuccess={() => {
+            applyChange({ id: selectedApptForReview.id, reviewed: true }); // Hides the "Leave Review" button
             setSelectedApptForReview(null);
-            fetchAppointments(); // Refresh to hide the "Leave Review" button
           }}
         />
       )}
@@ -107,7 +146,7 @@ const AppointmentCard = ({ appt, onCancel, onReview }) => {
             Cancel
           </button>
         )}
-        {isCompleted && onReview && (
+        {isCompleted && !appt.reviewed && onReview && (
           <button onClick={() => onReview(appt)} className="px-3 py-1 bg-yellow-100 text-yellow-700 rounded-md text-sm font-medium hover:bg-yellow-200">
             Leave Review
           </button>
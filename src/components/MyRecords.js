@@ -1,26 +1,67 @@
 import React, { useState, useEffect } from 'react';
-import { fetchWithAuth } from '../api';
+import { fetchPageWithAuth, fetchBlobWithAuth } from '../api';
 import Loader from './Loader';
 import { DocumentIcon } from './Icons'; // Assuming DocumentIcon exists
 
 function MyRecords() {
   const [records, setRecords] = useState([]);
   const [loading, setLoading] = useState(true);
+  // Records come a page at a time, newest first; this is the cursor for the next page.
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     const loadRecords = async () => {
       setLoading(true);
-      const data = await fetchWithAuth('/patient/my-records');
-      setRecords(data);
+      const page = await fetchPageWithAuth('/patient/my-records');
+      setRecords(page.items);
+      setNextCursor(page.next);
       setLoading(false);
     };
     loadRecords();
   }, []);
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const page = await fetchPageWithAuth('/patient/my-records', nextCursor);
+      setRecords(prev => [...prev, ...page.items]);
+      setNextCursor(page.next);
+    } catch (err) {
+      alert("Error: " + err.message);
+    }
+    setLoadingMore(false);
+  };
+
+  // The complete history, for transferring care: a file download, or a printable page.
+  const exportRecords = async (format) => {
+    try {
+      const url = await fetchBlobWithAuth(`/patient/my-records/export?format=${format}`);
+      if (format === 'print') {
+        window.open(url, '_blank');
+      } else {
+        const link = document.createElement('a');
+        link.href = url;
+        link.download = `medical-record.${format}`;
+        link.click();
+      }
+      setTimeout(() => URL.revokeObjectURL(url), 60000);
+    } catch (err) {
+      alert("Error: " + err.message);
+    }
+  };
+
   return (
     <div className="space-y-6">
       <h1 className="text-3xl font-bold text-slate-800 dark:text-slate-200">My Medical Records</h1>
       <p className="text-lg text-slate-500 dark:text-slate-400">A history of all your past consultations.</p>
+      <div className="flex flex-wrap gap-2">
+        {[['print', 'Print full record'], ['csv', 'Download CSV'], ['ndjson', 'Download NDJSON']].map(([format, label]) => (
+          <button key={format} onClick={() => exportRecords(format)} className="px-3 py-1 bg-indigo-100 text-indigo-700 rounded-md text-sm font-medium hover:bg-indigo-200">
+            {label}
+          </button>
+        ))}
+      </div>
       
       {loading ? <Loader /> : (
         <div className="space-y-6">
@@ -58,6 +99,11 @@ function MyRecords() {
               </div>
             </div>
           ))}
+          {nextCursor && (
+            <button onClick={loadMore} disabled={loadingMore} className="px-4 py-2 bg-indigo-100 text-indigo-700 rounded-md text-sm font-medium hover:bg-indigo-200 disabled:opacity-50">
+              {loadingMore ? 'Loading...' : 'Load older records'}
+            </button>
+          )}
         </div>
       )}
     </div>
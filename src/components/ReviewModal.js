@@ -20,6 +20,7 @@ function ReviewModal({ appointment, onClose, onSuccess }) {
     try {
       await fetchWithAuth('/patient/reviews', {
         method: 'POST',
+        idempotent: true,
         body: JSON.stringify({
           doctor_id: appointment.doctor_id,
           appointment_id: appointment.id,